@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""
+build_annotation_index.py
+=========================
+This script takes a snapshot of the annotation tables
+(genes, transcripts and exons) of a cancer_api database
+and saves it as an annotation index file, which can be
+memory-mapped by annotation workers (see AnnotationIndex).
+
+Inputs:
+- Database connection details
+- Output file
+
+Output:
+- Annotation index file
+"""
+
+import argparse
+import getpass
+import logging
+import cancer_api
+
+
+def main():
+
+    # ========================================================================================== #
+    # Argument parsing
+    # ========================================================================================== #
+
+    parser = argparse.ArgumentParser(description="Save annotation tables as an index file.")
+    parser.add_argument("db_host", help="Database server host")
+    parser.add_argument("db_name", help="Name of source database")
+    parser.add_argument("db_user", help="Database user")
+    parser.add_argument("output_file", help="Output annotation index file")
+    parser.add_argument("--db_password", help="Password for user")
+    args = parser.parse_args()
+
+    # ========================================================================================== #
+    # Build index
+    # ========================================================================================== #
+
+    cancer_api.utils.setup_logging()
+    if not args.db_password:
+        args.db_password = getpass.getpass("Database password (may leave blank): ")
+    db_sess = cancer_api.Session(cancer_api.MysqlConnection(
+        args.db_host, args.db_user, args.db_password, args.db_name))
+    logging.info("Building annotation index...")
+    index = cancer_api.AnnotationIndex.from_session(db_sess)
+    index.save(args.output_file)
+    logging.info("Saved index of {} genes, {} transcripts and {} exons.".format(
+        index.num_genes, index.num_transcripts, index.num_exons))
+
+
+if __name__ == '__main__':
+    main()
@@ -8,8 +8,8 @@ and converts it to another supported file type.
 
 Inputs:
 - Input file(s)
-- cancer_api input file type
-- cancer_api parser
+- cancer_api input file type (or "auto" to detect it)
+- cancer_api parser (or "auto" to detect it from the header)
 - cancer_api output file type
 - Output directory (optional)
 
@@ -19,6 +19,8 @@ Output:
 
 import argparse
 import os
+import logging
+import multiprocessing
 import cancer_api
 
 
@@ -29,24 +31,46 @@ def main():
     # ========================================================================================== #
 
     parser = argparse.ArgumentParser(description="Convert between different file types.")
-    parser.add_argument("input_type", nargs=1, help="cancer_api file type for input file(s)")
-    parser.add_argument("input_parser", nargs=1, help="cancer_api parser for input file")
+    parser.add_argument("input_type", nargs=1, help="cancer_api file type for input file(s), "
+                        "or 'auto' to detect it for each file from its extension")
+    parser.add_argument("input_parser", nargs=1, help="cancer_api parser for input file, or "
+                        "'auto' to detect it for each file from its header")
     parser.add_argument("output_type", nargs=1, help="cancer_api file type for output file")
-    parser.add_argument("input_files", nargs="+", help="List of input file(s) (same type)")
+    parser.add_argument("input_files", nargs="+", help="List of input file(s) (same "
+                        "type unless detected)")
     parser.add_argument("--output_dir", help="Output all converted files in this directory")
+    parser.add_argument("--normalize", action="store_true", help="Split multi-allelic records "
+                        "and trim shared bases of SNVs and indels")
+    parser.add_argument("--reference", help="Reference FASTA file for left-aligning indels "
+                        "(implies --normalize)")
+    parser.add_argument("--report_interval", type=float, help="Log throughput metrics "
+                        "(records/s, bytes/s, etc.) every given number of seconds")
+    parser.add_argument("--profile", help="Dump cProfile statistics to this file and log a "
+                        "breakdown of the time spent parsing, writing, etc.")
+    parser.add_argument("--processes", type=int, default=1, help="Number of files converted "
+                        "in parallel (ignored with --profile)")
     args = parser.parse_args()
 
     # ========================================================================================== #
     # Set up variables
     # ========================================================================================== #
 
-    # Retrieve cancer_api objects for file type and parser
-    input_type = getattr(cancer_api, args.input_type[0], None)
-    input_parser = getattr(cancer_api, args.input_parser[0], None)
-    output_type = getattr(cancer_api, args.output_type[0], None)
-    if input_type is None or input_parser is None or output_type is None:
-        raise ValueError("Unsupported file type or parser. Check `cancer_api` for supported "
-                         "file types (`files` submodule) and parsers (`parsers` submodule).")
+    # Retrieve cancer_api objects for file type and parser (None to detect them)
+    input_type = get_cancer_api_obj(args.input_type[0])
+    input_parser = get_cancer_api_obj(args.input_parser[0])
+    output_type = get_cancer_api_obj(args.output_type[0], allow_auto=False)
+
+    # Check reference for normalization if given (building its index once)
+    if args.reference:
+        cancer_api.FastaFile.open(args.reference)
+    normalize = args.normalize or args.reference is not None
+
+    # Set up logging for metrics, profiling and detected parsers
+    if args.report_interval is not None or args.profile or input_type is None or \
+            input_parser is None:
+        cancer_api.utils.setup_logging()
+    if args.report_interval is not None:
+        cancer_api.metrics.enable(report_interval=args.report_interval)
 
     # If output_dir is given, make sure it exists
     if args.output_dir and not os.path.exists(args.output_dir):
@@ -56,21 +80,87 @@ def main():
     # Call convert_file()
     # ========================================================================================== #
 
+    convert_args = []
     for infile in args.input_files:
         if args.output_dir:
             output_dir = args.output_dir
         else:
             output_dir = os.path.dirname(infile)
-        convert_file(input_type, input_parser, output_type, infile, output_dir)
-
-
-def convert_file(intype, inparser, outtype, infile, outdir):
-    """Convert file from one cancer_api-supported type to another"""
+        intype, inparser, header = input_type, input_parser, None
+        if intype is None or inparser is None:
+            intype, inparser, header = cancer_api.default_registry.detect(
+                infile, intype, inparser)
+            logging.info("Detected {} with {} for {}".format(
+                intype.__name__, inparser.__name__, infile))
+        convert_args.append((intype, inparser, output_type, infile, output_dir, normalize,
+                             args.reference, header))
+    if args.profile:
+        with cancer_api.Profiler() as profiler:
+            cancer_api.run_cprofile(args.profile, convert_files, convert_args)
+        profiler.report()
+    else:
+        convert_files(convert_args, args.processes)
+    if cancer_api.metrics.enabled:
+        cancer_api.metrics.report()
+
+
+def get_cancer_api_obj(name, allow_auto=True):
+    """Return cancer_api file type or parser with the given name,
+    or None for 'auto' (i.e. to detect it).
+    """
+    if allow_auto and name == "auto":
+        return None
+    obj = getattr(cancer_api, name, None)
+    if obj is None:
+        raise ValueError("Unsupported file type or parser. Check `cancer_api` for supported "
+                         "file types (`files` submodule) and parsers (`parsers` submodule).")
+    return obj
+
+
+def convert_files(convert_args, processes=1):
+    """Call convert_file for each tuple of arguments,
+    converting files in parallel if processes > 1.
+    """
+    if processes > 1 and len(convert_args) > 1:
+        pool = multiprocessing.Pool(min(processes, len(convert_args)))
+        try:
+            pool.map(convert_file_args, convert_args, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for args in convert_args:
+            convert_file(*args)
+
+
+def convert_file_args(args):
+    """Call convert_file with a tuple of arguments (for pools)."""
+    convert_file(*args)
+
+
+def convert_file(intype, inparser, outtype, infile, outdir, normalize=False,
+                 reference_filepath=None, header=None):
+    """Convert file from one cancer_api-supported type to another,
+    optionally normalizing objects along the way (and left-aligning
+    indels based on the reference FASTA file if given). The header
+    of the input file can be given if it was already read.
+    """
+    reference = cancer_api.FastaFile.open(reference_filepath) if reference_filepath else None
     opened_infile = intype.open(infile, parser_cls=inparser)
+    if header is not None:
+        opened_infile.set_header(header)
     root, ext = opened_infile.split_filename()
     outfilepath = os.path.join(outdir, "{}.{}".format(root, outtype.get_file_extension()))
-    opened_outfile = outtype.convert(outfilepath, opened_infile)
-    opened_outfile.write()
+    if not normalize:
+        opened_outfile = outtype.convert(outfilepath, opened_infile)
+        opened_outfile.write()
+        return
+    opened_outfile = outtype.new(outfilepath, buffersize=10000)
+    if outtype is intype:
+        opened_outfile.set_header(opened_infile.get_header())
+    for obj in cancer_api.iter_normalized(opened_infile, reference):
+        opened_outfile.add_obj(obj)
+    opened_outfile.close()
 
 
 if __name__ == '__main__':
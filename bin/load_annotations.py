@@ -7,7 +7,13 @@ This script downloads reference data from Ensembl and
 loads it into the database. The concerned database tables
 are: gene, transcript, exon, protein and protein_region.
 The script downloads the data using Ensembl's BioMart XML
-Query API.
+Query API. Alternatively, the data can be loaded offline from
+a GTF or GFF3 file (e.g., from Ensembl or GENCODE).
+
+Data is loaded in batches using in-memory maps of Ensembl IDs
+to primary keys. Downloads are cached in the cache directory,
+such that an interrupted load can be restarted from the cache
+(rows already in the database are skipped unless in fast mode).
 
 Known Issues
 ------------
@@ -23,9 +29,10 @@ Known Issues
 import argparse
 import cancer_api
 import os
+import shutil
+import tempfile
 import getpass
 import requests
-from collections import defaultdict
 import logging
 
 BIOMART_API_URL = 'http://grch37.ensembl.org/biomart/martservice/'
@@ -53,11 +60,26 @@ def main():
     parser.add_argument('--fast_mode', '-f', action='store_true',
                         help='Disables check for preexisting entries, which is useful for '
                         'loading empty databases. Ensure that the input has no duplicates.')
+    parser.add_argument('--batch_size', '-b', type=int, default=10000,
+                        help='Number of rows inserted (and committed) at a time')
+    parser.add_argument('--progress_every', '-p', type=int, default=100000,
+                        help='Number of rows between progress reports')
+    parser.add_argument('--annotation_file', '-a',
+                        help='GTF or GFF3 file (optionally gzipped) to load instead of '
+                        'downloading data from BioMart')
+    parser.add_argument('--checkpoint', metavar='NAME',
+                        help='Record the progress of loading the annotation file under this '
+                        'name, such that a failed load resumes where it stopped when rerun')
+    parser.add_argument('--report_interval', type=float,
+                        help='Log throughput metrics (rows/s, flush latency, etc.) every '
+                        'given number of seconds')
     args = parser.parse_args()
 
     # Setup logging
     cancer_api.utils.setup_logging()
     logging.info('Initializing script...')
+    if args.report_interval is not None:
+        cancer_api.metrics.enable(report_interval=args.report_interval)
 
     # Ask for password if not given
     if not args.db_password:
@@ -69,36 +91,58 @@ def main():
         args.db_host, args.db_user, args.db_password, args.db_name))
     db_sess.create_tables()
 
+    # Load data from annotation file if given, otherwise from BioMart
+    try:
+        if args.annotation_file:
+            load_from_annotation_file(db_sess, args)
+        else:
+            load_from_biomart(db_sess, args)
+    finally:
+        db_sess.close()
+    if cancer_api.metrics.enabled:
+        cancer_api.metrics.report()
+
+
+def load_from_annotation_file(db_sess, args):
+    """Loads genes, transcripts, exons and proteins from the
+    GTF or GFF3 file given as argument.
+    """
+    logging.info('Loading annotation file into database...')
+    if '.gff' in os.path.basename(args.annotation_file):
+        annotation_file = cancer_api.Gff3File.open(args.annotation_file)
+    else:
+        annotation_file = cancer_api.GtfFile.open(args.annotation_file)
+    loaders = cancer_api.load_annotation_file(
+        db_sess, annotation_file, batch_size=args.batch_size,
+        skip_existing=not args.fast_mode, progress_every=args.progress_every,
+        checkpoint_name=args.checkpoint)
+    logging.info('Finished loading {} genes, {} transcripts, {} exons and {} proteins into '
+                 'the database.'.format(*[loader.num_rows for loader in loaders]))
+
+
+def load_from_biomart(db_sess, args):
+    """Downloads genes, transcripts, exons and proteins from
+    BioMart (unless cached) and loads them into the database.
+    """
     # Create output directory if doesn't exist
-    if not os.path.exists(args.cache_dir):
+    # If not specified, downloads are stored in a temporary directory
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix='cancer_api_annotations_')
+    if not os.path.exists(cache_dir):
         logging.info('Creating output directory...')
-        os.makedirs(args.cache_dir)
+        os.makedirs(cache_dir)
     else:
         logging.info('Output directory already exists. Will attempt to load data from cache.')
 
     # For gene table
     gene_cache_filename = os.path.join(
-        args.cache_dir, 'ensembl_genes_78.homo_sapiens.GRCh37.tsv')
-    # If cache_dir specified, check there first
-    if args.cache_dir and os.path.exists(gene_cache_filename):
-        logging.info('Loading gene data from cache...')
-        with open(gene_cache_filename) as gene_cache:
-            gene_data = gene_cache.read()
-    # Otherwise, download data from Ensembl
-    else:
-        logging.info('Downloading gene data from Ensembl...')
-        gene_data = query_biomart_api(BIOMART_API_URL, GENE_QUERY)
-        # If the cache_dir was specified, but the data was downloaded,
-        # cache the data
-        if args.cache_dir:
-            logging.info('Caching gene data in output directory...')
-            with open(gene_cache_filename, 'w') as gene_cache:
-                gene_cache.write(gene_data)
+        cache_dir, 'ensembl_genes_78.homo_sapiens.GRCh37.tsv')
+    fetch_data(gene_cache_filename, GENE_QUERY, 'gene')
     # Load data in database
     logging.info('Loading gene data into database...')
-    gene_counter = 0
-    chrono = cancer_api.Chronometer()
-    for row_dict in iter_data(gene_data, GENE_FIELDNAMES):
+    gene_loader = cancer_api.BulkLoader(
+        db_sess, cancer_api.Gene, batch_size=args.batch_size,
+        skip_existing=not args.fast_mode, progress_every=args.progress_every)
+    for row_dict in iter_data(gene_cache_filename, GENE_FIELDNAMES):
         # Each row_dict has the following keys (see GENE_FIELDNAMES)
         # 'ensembl_gene_id', 'hgnc_symbol', 'gene_biotype', 'external_gene_name',
         # 'chromosome_name', 'start_position', 'end_position'
@@ -112,241 +156,206 @@ def main():
             'end_pos': row_dict['end_position'],
             'length': int(row_dict['end_position']) - int(row_dict['start_position']) + 1
         }
-        if args.fast_mode:
-            gene = cancer_api.Gene(**gene_dict)
-            db_sess.add(gene)
-        else:
-            cancer_api.Gene.get_or_create(db_sess, **gene_dict)
-        gene_counter += 1
-        chrono.lap("Loading {}".format(row_dict['ensembl_gene_id']))
-    db_sess.commit()
-    logging.info('Finished loading {} genes into the database.'.format(gene_counter))
-
-    # # For transcript and exon tables
-    # exon_cache_filename = os.path.join(
-    #     args.cache_dir, 'ensembl_transcripts_and_exons_78.homo_sapiens.GRCh37.tsv')
-    # # If cache_dir specified, check there first
-    # if args.cache_dir and os.path.exists(exon_cache_filename):
-    #     logging.info('Loading transcript and exon data from cache...')
-    #     with open(exon_cache_filename) as exon_cache:
-    #         exon_data = exon_cache.read()
-    # # Otherwise, download data from Ensembl
-    # else:
-    #     logging.info('Downloading transcript and exon data from Ensembl...')
-    #     exon_data = query_biomart_api(BIOMART_API_URL, EXON_QUERY)
-    #     # If the cache_dir was specified, but the data was downloaded,
-    #     # cache the data
-    #     if args.cache_dir:
-    #         logging.info('Caching transcript and exon data in output directory...')
-    #         with open(exon_cache_filename, 'w') as exon_cache:
-    #             exon_cache.write(exon_data)
-    # # Load data in database
-    # logging.info('Loading transcript and exon data into database...')
-    # # Organize exons by transcript
-    # transcripts = defaultdict(lambda: {'exons': []})
-    # for row_dict in iter_data(exon_data, EXON_FIELDNAMES):
-    #     # Each row_dict has the following keys (see EXON_FIELDNAMES):
-    #     # 'ensembl_exon_id', 'ensembl_transcript_id', 'ensembl_gene_id', 'strand', 'phase',
-    #     # '5_utr_start', '5_utr_end', 'cdna_coding_start', 'cdna_coding_end', '3_utr_start',
-    #     # '3_utr_end', 'cds_start', 'cds_end', 'genomic_coding_start', 'genomic_coding_end',
-    #     # 'exon_chrom_start', 'exon_chrom_end'
-
-    #     # Add transcript info
-    #     transcripts[row_dict['ensembl_transcript_id']].update({
-    #         'transcript_ensembl_id': row_dict['ensembl_transcript_id'],
-    #         'gene_ensembl_id': row_dict['ensembl_gene_id']
-    #     })
-
-    #     # Calculate some values for the exon depending on UTRs
-    #     # Check if there's a UTR and if so, calculate its length
-    #     # Also, calculate transcript start or end (incl. UTRs)
-    #     utr_length = 0
-    #     exon_length = int(row_dict['exon_chrom_end']) - int(row_dict['exon_chrom_start']) + 1
-    #     # If there is a 5' UTR and coding region in the exon
-    #     if row_dict['5_utr_start'] and row_dict['cdna_coding_start']:
-    #         utr_length = int(row_dict['5_utr_end']) - int(row_dict['5_utr_start']) + 1
-    #         transcript_start = int(row_dict['cdna_coding_start']) - utr_length
-    #         transcript_end = int(row_dict['cdna_coding_end'])
-    #         end_phase = str((int(row_dict['phase']) + exon_length) % 3)
-    #     # If there is only a 5' UTR in the exon
-    #     elif row_dict['5_utr_start'] and not row_dict['cdna_coding_start']:
-    #         continue
-    #     # If there is a coding region and a 3' UTR in the exon
-    #     elif row_dict['3_utr_start'] and row_dict['cdna_coding_start']:
-    #         utr_length = int(row_dict['3_utr_end']) - int(row_dict['3_utr_start']) + 1
-    #         transcript_start = int(row_dict['cdna_coding_start'])
-    #         transcript_end = int(row_dict['cdna_coding_end']) + utr_length
-    #         end_phase = "-1"
-    #     # If there is only a 3' UTR in the exon
-    #     elif row_dict['3_utr_start'] and not row_dict['cdna_coding_start']:
-    #         continue
-    #     # If there is both a 5' UTR, a coding region and a 3' UTR in the exon
-    #     elif (row_dict['5_utr_start'] and row_dict['3_utr_start'] and
-    #             row_dict['cdna_coding_start']):
-    #         utr5_length = int(row_dict['5_utr_end']) - int(row_dict['5_utr_start']) + 1
-    #         utr3_length = int(row_dict['3_utr_end']) - int(row_dict['3_utr_start']) + 1
-    #         transcript_start = int(row_dict['cdna_coding_start']) - utr5_length
-    #         transcript_end = int(row_dict['cdna_coding_end']) + utr3_length
-    #         end_phase = "-1"
-    #     # If there is only a 5' UTR and 3' UTR in the exon
-    #     elif (row_dict['5_utr_start'] and row_dict['3_utr_start'] and
-    #             not row_dict['cdna_coding_start']):
-    #         continue
-    #     # If there is only a coding region
-    #     elif (not row_dict['5_utr_start'] and not row_dict['3_utr_start'] and
-    #             row_dict['cdna_coding_start']):
-    #         transcript_start = int(row_dict['cdna_coding_start'])
-    #         transcript_end = int(row_dict['cdna_coding_end'])
-    #         end_phase = str((int(row_dict['phase']) + exon_length) % 3)
-    #     # If there is no UTR and no coding region
-    #     else:
-    #         continue
-
-    #     # Add exon to list of exons for transcript
-    #     transcripts[row_dict['ensembl_transcript_id']]['exons'].append({
-    #         'exon_ensembl_id': row_dict['ensembl_exon_id'],
-    #         'strand': row_dict['strand'],
-    #         'phase': row_dict['phase'],
-    #         'end_phase': end_phase,
-    #         'length': exon_length,
-    #         'transcript_start_pos': transcript_start,
-    #         'transcript_end_pos': transcript_end,
-    #         'genome_start_pos': row_dict['exon_chrom_start'],
-    #         'genome_end_pos': row_dict['exon_chrom_end'],
-    #         'cdna_coding_start': row_dict['cdna_coding_start'],
-    #         'cdna_coding_end': row_dict['cdna_coding_end']
-    #     })
-    # # Now that all exons are organized by transcript,
-    # # iterate through transcripts, add transcript to database
-    # # and then add all its exons
-    # transcript_counter = 0
-    # all_exons = []
-    # for transcript_dict in transcripts.values():
-    #     # Skip transcripts that contain no exons
-    #     # (Probably because they didn't contain a coding region)
-    #     if len(transcript_dict['exons']) == 0:
-    #         continue
-    #     # Obtain cds_start, cds_end and length from exons and then remove them from dict
-    #     transcript_dict['cds_start_pos'] = min(
-    #         [int(exon['cdna_coding_start']) for exon in transcript_dict['exons']])
-    #     transcript_dict['cds_end_pos'] = max(
-    #         [int(exon['cdna_coding_end']) for exon in transcript_dict['exons']])
-    #     transcript_dict['length'] = sum(
-    #         [int(exon['length']) for exon in transcript_dict['exons']])
-    #     exons = transcript_dict.pop("exons")
-
-    #     # Obtain gene ID for given gene Ensembl ID
-    #     gene_ensembl_id = transcript_dict.pop("gene_ensembl_id")
-    #     gene_id, = db_sess.query(cancer_api.Gene.id).filter_by(
-    #         gene_ensembl_id=gene_ensembl_id).first()
-    #     transcript_dict["gene_id"] = gene_id
-
-    #     # Add transcript to database
-    #     if args.fast_mode:
-    #         transcript = cancer_api.Transcript(**transcript_dict)
-    #         db_sess.add(transcript)
-    #     else:
-    #         transcript = cancer_api.Transcript.get_or_create(**transcript_dict)
-    #     transcript_counter += 1
-
-    #     for exon in exons:
-    #         exon['transcript'] = transcript
-    #         all_exons.append(exon)
-    # # Commit all transcripts in order to get IDs
-    # db_sess.commit()
-    # # Iterate over all_exons and add them to database using transcript ID
-    # # Now that the transcripts have IDs
-    # exon_counter = 0
-    # for exon_dict in all_exons:
-    #     exon_dict.pop("cdna_coding_start")
-    #     exon_dict.pop("cdna_coding_end")
-    #     transcript = exon_dict.pop("transcript")
-    #     exon_dict["transcript_id"] = transcript.id
-    #     exon_dict["gene_id"] = transcript.gene_id
-    #     if args.fast_mode:
-    #         exon = cancer_api.Exon(**exon_dict)
-    #         db_sess.add(exon)
-    #     else:
-    #         exon = cancer_api.Exon.get_or_create(**exon_dict)
-    #     exon_counter += 1
-    # db_sess.commit()
-    # logging.info('Finished loading {} transcripts into the database.'.format(transcript_counter))
-    # logging.info('Finished loading {} exons into the database.'.format(exon_counter))
-
-    # # For protein table
-    # protein_cache_filename = os.path.join(
-    #     args.cache_dir, 'ensembl_proteins_78.homo_sapiens.GRCh37.tsv')
-    # # If cache_dir specified, check there first
-    # if args.cache_dir and os.path.exists(protein_cache_filename):
-    #     logging.info('Loading gene data from cache...')
-    #     with open(protein_cache_filename) as protein_cache:
-    #         protein_data = protein_cache.read()
-    # # Otherwise, download data from Ensembl
-    # else:
-    #     logging.info('Downloading protein data from Ensembl...')
-    #     protein_data = query_biomart_api(BIOMART_API_URL, PROTEIN_QUERY)
-    # # If the cache_dir was specified, but the data was downloaded,
-    # # cache the data
-    #     if args.cache_dir:
-    #         logging.info('Caching protein data in output directory...')
-    #         with open(protein_cache_filename, 'w') as protein_cache:
-    #             protein_cache.write(protein_data)
-    # # Load data in database
-    # logging.info('Loading protein data into database...')
-    # protein_counter = 0
-    # for row_dict in iter_data(protein_data, PROTEIN_FIELDNAMES):
-    #     # Only consider proteins with an Ensembl ID and length
-    #     if row_dict['ensembl_peptide_id'] == '' or row_dict['cds_length'] == '':
-    #         continue
-    #     # Obtain related transcript
-    #     transcript = db_sess.query(cancer_api.Transcript).filter_by(
-    #         transcript_ensembl_id=row_dict['ensembl_transcript_id']).first()
-    #     transcript_id = transcript.id
-    #     gene_id = transcript.gene_id
-    #     protein_dict = {
-    #         'protein_ensembl_id': row_dict['ensembl_peptide_id'],
-    #         'cds_length': int(row_dict['cds_length']),
-    #         'transcript_id': transcript_id,
-    #         'gene_id': gene_id
-    #     }
-    #     if args.fast_mode:
-    #         protein = cancer_api.Protein(**protein_dict)
-    #         db_sess.add(protein)
-    #     else:
-    #         protein = cancer_api.Protein.get_or_create(**protein_dict)
-    #     protein_counter += 1
-    # db_sess.commit()
-    # logging.info('Finished loading {} proteins into the database.'.format(protein_counter))
+        gene_loader.add(gene_dict)
+    gene_loader.close()
+    logging.info('Finished loading {} genes into the database.'.format(gene_loader.num_rows))
+
+    # For transcript and exon tables
+    exon_cache_filename = os.path.join(
+        cache_dir, 'ensembl_transcripts_and_exons_78.homo_sapiens.GRCh37.tsv')
+    fetch_data(exon_cache_filename, EXON_QUERY, 'transcript and exon')
+    # Map Ensembl IDs to primary keys once rather than querying for every row
+    gene_ids = cancer_api.get_id_map(db_sess, cancer_api.Gene, 'gene_ensembl_id')
+    # First pass: aggregate exons by transcript
+    logging.info('Loading transcript data into database...')
+    transcripts = aggregate_transcripts(exon_cache_filename)
+    transcript_loader = cancer_api.BulkLoader(
+        db_sess, cancer_api.Transcript, batch_size=args.batch_size,
+        skip_existing=not args.fast_mode, progress_every=args.progress_every)
+    for transcript_ensembl_id, transcript in transcripts.iteritems():
+        gene_ensembl_id, cds_start_pos, cds_end_pos, length = transcript
+        # Skip transcripts whose gene wasn't loaded
+        if gene_ensembl_id not in gene_ids:
+            continue
+        transcript_loader.add({
+            'transcript_ensembl_id': transcript_ensembl_id,
+            'gene_id': gene_ids[gene_ensembl_id],
+            'cds_start_pos': cds_start_pos,
+            'cds_end_pos': cds_end_pos,
+            'length': length
+        })
+    transcript_loader.close()
+    del transcripts
+    logging.info('Finished loading {} transcripts into the database.'.format(
+        transcript_loader.num_rows))
+    # Second pass: stream exons using the transcript IDs
+    logging.info('Loading exon data into database...')
+    transcript_ids = cancer_api.get_id_map(
+        db_sess, cancer_api.Transcript, 'transcript_ensembl_id')
+    exon_loader = load_exons(db_sess, exon_cache_filename, gene_ids, transcript_ids,
+                             batch_size=args.batch_size, progress_every=args.progress_every)
+    logging.info('Finished loading {} exons into the database.'.format(exon_loader.num_rows))
+
+    # For protein table
+    protein_cache_filename = os.path.join(
+        cache_dir, 'ensembl_proteins_78.homo_sapiens.GRCh37.tsv')
+    fetch_data(protein_cache_filename, PROTEIN_QUERY, 'protein')
+    # Load data in database
+    logging.info('Loading protein data into database...')
+    transcript_gene_ids = dict(db_sess.query(
+        cancer_api.Transcript.transcript_ensembl_id, cancer_api.Transcript.gene_id))
+    protein_loader = cancer_api.BulkLoader(
+        db_sess, cancer_api.Protein, batch_size=args.batch_size,
+        skip_existing=not args.fast_mode, progress_every=args.progress_every)
+    for row_dict in iter_data(protein_cache_filename, PROTEIN_FIELDNAMES):
+        # Only consider proteins with an Ensembl ID and length
+        if row_dict['ensembl_peptide_id'] == '' or row_dict['cds_length'] == '':
+            continue
+        # Skip proteins whose transcripts weren't loaded (e.g., no coding exons)
+        transcript_ensembl_id = row_dict['ensembl_transcript_id']
+        if transcript_ensembl_id not in transcript_ids:
+            continue
+        protein_loader.add({
+            'protein_ensembl_id': row_dict['ensembl_peptide_id'],
+            'cds_length': int(row_dict['cds_length']),
+            'transcript_id': transcript_ids[transcript_ensembl_id],
+            'gene_id': transcript_gene_ids[transcript_ensembl_id]
+        })
+    protein_loader.close()
+    logging.info('Finished loading {} proteins into the database.'.format(
+        protein_loader.num_rows))
 
     # For protein_region table
     logging.warning('Did not load data into the protein_region table. Not implemented yet.')
 
     # Clean up
-    db_sess.close()
+    if not args.cache_dir:
+        shutil.rmtree(cache_dir)
     logging.info('Finished loading Ensembl reference data into database.')
 
 
-def query_biomart_api(biomart_url, xml_query):
+def aggregate_transcripts(exon_cache_filename):
+    """Aggregates the exons of the cached BioMart data by transcript.
+    Only a few values are kept per transcript to keep memory usage
+    low. Returns a dict mapping the Ensembl IDs of transcripts with
+    a coding region to [gene Ensembl ID, CDS start, CDS end, length]
+    lists, where the length is the full cDNA length (incl. exons that
+    only contain UTR regions, like for annotation files).
+    """
+    transcripts = {}
+    for row_dict in iter_data(exon_cache_filename, EXON_FIELDNAMES):
+        transcript_ensembl_id = row_dict['ensembl_transcript_id']
+        if transcript_ensembl_id not in transcripts:
+            transcripts[transcript_ensembl_id] = [row_dict['ensembl_gene_id'], None, None, 0]
+        transcript = transcripts[transcript_ensembl_id]
+        transcript[3] += int(row_dict['exon_chrom_end']) - int(row_dict['exon_chrom_start']) + 1
+        if not row_dict['cdna_coding_start']:
+            continue
+        cdna_coding_start = int(row_dict['cdna_coding_start'])
+        cdna_coding_end = int(row_dict['cdna_coding_end'])
+        if transcript[1] is None:
+            transcript[1], transcript[2] = cdna_coding_start, cdna_coding_end
+        transcript[1] = min(transcript[1], cdna_coding_start)
+        transcript[2] = max(transcript[2], cdna_coding_end)
+    # Transcripts without a coding region are ignored, along with their exons
+    return dict((transcript_ensembl_id, transcript)
+                for transcript_ensembl_id, transcript in transcripts.iteritems()
+                if transcript[1] is not None)
+
+
+def load_exons(db_sess, exon_cache_filename, gene_ids, transcript_ids, batch_size=10000,
+               progress_every=100000):
+    """Loads the exons of the cached BioMart data, given maps of
+    Ensembl IDs to primary keys. Returns the exon loader.
+    """
+    # BioMart returns one row per exon and transcript, but exons are
+    # shared between transcripts, so duplicates are always skipped
+    exon_loader = cancer_api.BulkLoader(
+        db_sess, cancer_api.Exon, batch_size=batch_size, skip_existing=True,
+        progress_every=progress_every)
+    for row_dict in iter_data(exon_cache_filename, EXON_FIELDNAMES):
+        exon_dict = parse_exon_row(row_dict)
+        if exon_dict is None or row_dict['ensembl_transcript_id'] not in transcript_ids:
+            continue
+        exon_dict['gene_id'] = gene_ids[row_dict['ensembl_gene_id']]
+        exon_dict['transcript_id'] = transcript_ids[row_dict['ensembl_transcript_id']]
+        exon_loader.add(exon_dict)
+    exon_loader.close()
+    return exon_loader
+
+
+def parse_exon_row(row_dict):
+    """Calculates exon attributes from a BioMart row, taking
+    UTRs into account. Returns None for exons without a coding
+    region (i.e. exons that only contain UTR regions).
+    """
+    if not row_dict['cdna_coding_start']:
+        return None
+    exon_length = int(row_dict['exon_chrom_end']) - int(row_dict['exon_chrom_start']) + 1
+    # Calculate transcript start and end (incl. UTRs)
+    utr5_length, utr3_length = 0, 0
+    if row_dict['5_utr_start']:
+        utr5_length = int(row_dict['5_utr_end']) - int(row_dict['5_utr_start']) + 1
+    if row_dict['3_utr_start']:
+        utr3_length = int(row_dict['3_utr_end']) - int(row_dict['3_utr_start']) + 1
+    # The reading frame doesn't continue after a 3' UTR
+    if utr3_length:
+        end_phase = '-1'
+    else:
+        end_phase = str((int(row_dict['phase']) + exon_length) % 3)
+    return {
+        'exon_ensembl_id': row_dict['ensembl_exon_id'],
+        'strand': row_dict['strand'],
+        'phase': row_dict['phase'],
+        'end_phase': end_phase,
+        'length': exon_length,
+        'transcript_start_pos': int(row_dict['cdna_coding_start']) - utr5_length,
+        'transcript_end_pos': int(row_dict['cdna_coding_end']) + utr3_length,
+        'genome_start_pos': int(row_dict['exon_chrom_start']),
+        'genome_end_pos': int(row_dict['exon_chrom_end'])
+    }
+
+
+def fetch_data(cache_filename, xml_query, label):
+    """Ensures that the BioMart data is available in the cache file,
+    downloading it from Ensembl if necessary. Downloads are written
+    to a partial file first such that interrupted downloads aren't
+    mistaken for complete cache files.
+    """
+    if os.path.exists(cache_filename):
+        logging.info('Loading {} data from cache...'.format(label))
+        return
+    logging.info('Downloading {} data from Ensembl...'.format(label))
+    partial_filename = cache_filename + '.part'
+    with open(partial_filename, 'wb') as cache_file:
+        query_biomart_api(BIOMART_API_URL, xml_query, cache_file)
+    os.rename(partial_filename, cache_filename)
+
+
+def query_biomart_api(biomart_url, xml_query, outfile, chunk_size=1024 * 1024):
     """Sends an XML query to a specified BioMart web service.
-    Returns body of HTTP response.
+    Streams body of HTTP response into outfile.
     """
-    response = requests.post(biomart_url, data="query={}\n".format(xml_query))
+    response = requests.post(biomart_url, data="query={}\n".format(xml_query), stream=True)
     if response.status_code == 200:
-        return response.text
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            outfile.write(chunk)
     else:
         raise requests.exceptions.HTTPError(
             'Unsuccessful HTTP response (status code {}). Debug the following URL:\n{}'.format(
                 response.status_code, response.url))
 
 
-def iter_data(response, fieldnames):
-    """Parses the BioMart data as a generator."""
-    for line in response.split('\n'):
-        # If line is empty, skip
-        if line == '':
-            continue
-        row_dict = dict(zip(fieldnames, line.split('\t')))
-        yield row_dict
+def iter_data(cache_filename, fieldnames):
+    """Parses the cached BioMart data incrementally as a generator."""
+    with open(cache_filename) as cache_file:
+        for line in cache_file:
+            line = line.rstrip('\n')
+            # If line is empty, skip
+            if line == '':
+                continue
+            row_dict = dict(zip(fieldnames, line.split('\t')))
+            yield row_dict
 
 
 GENE_QUERY = """<?xml version="1.0" encoding="UTF-8"?>
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+merge_files.py
+==============
+This script takes in any number of cancer_api-supported
+files, each sorted by chromosome and position, and merges
+them into a single sorted file.
+
+Inputs:
+- Input files (sorted)
+- cancer_api input file type
+- cancer_api parser
+- Output file
+- cancer_api output file type (optional)
+- Chromosome order (optional)
+
+Output:
+- Merged file
+"""
+
+import argparse
+import cancer_api
+
+
+def main():
+
+    # ========================================================================================== #
+    # Argument parsing
+    # ========================================================================================== #
+
+    parser = argparse.ArgumentParser(description="Merge sorted files into one sorted file.")
+    parser.add_argument("input_type", nargs=1, help="cancer_api file type for input files")
+    parser.add_argument("input_parser", nargs=1, help="cancer_api parser for input files")
+    parser.add_argument("output_file", nargs=1, help="Output file")
+    parser.add_argument("input_files", nargs="+", help="List of sorted input files (same type)")
+    parser.add_argument("--output_type", help="cancer_api file type for output file "
+                        "(defaults to the input file type)")
+    parser.add_argument("--chrom_order", help="Chromosome order, given as either a "
+                        "comma-separated list or a file with chromosome names in the first "
+                        "column (e.g., a FASTA index). Defaults to karyotypic order.")
+    args = parser.parse_args()
+
+    # ========================================================================================== #
+    # Set up variables
+    # ========================================================================================== #
+
+    # Retrieve cancer_api objects for file types and parser
+    input_type = getattr(cancer_api, args.input_type[0], None)
+    input_parser = getattr(cancer_api, args.input_parser[0], None)
+    output_type = getattr(cancer_api, args.output_type or args.input_type[0], None)
+    if input_type is None or input_parser is None or output_type is None:
+        raise ValueError("Unsupported file type or parser. Check `cancer_api` for supported "
+                         "file types (`files` submodule) and parsers (`parsers` submodule).")
+
+    # ========================================================================================== #
+    # Merge files
+    # ========================================================================================== #
+
+    cancer_api.utils.setup_logging()
+    chrom_order = parse_chrom_order(args.chrom_order)
+    input_files = [input_type.open(infile, parser_cls=input_parser)
+                   for infile in args.input_files]
+    output_type.merge(args.output_file[0], input_files, chrom_order=chrom_order)
+
+
+def parse_chrom_order(chrom_order):
+    """Return list of chromosome names from either a comma-separated
+    list or a file with chromosome names in the first column.
+    """
+    if chrom_order is None:
+        return None
+    if "," not in chrom_order:
+        try:
+            with cancer_api.utils.open_file(chrom_order) as infile:
+                return [line.split("\t")[0].strip() for line in infile if line.strip()]
+        except IOError:
+            pass
+    return chrom_order.split(",")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+"""
+refresh_summaries.py
+====================
+This script recomputes the mutation summary table (number of
+mutations per library by type and subtype) of a cancer_api
+database from its mutation tables. Bulk loaders keep the
+summary up to date, so this is only needed after mutations
+are added otherwise or deleted.
+
+Inputs:
+- Database connection details
+- Library IDs (optional)
+
+Output:
+- Refreshed mutation summary table
+"""
+
+import argparse
+import getpass
+import logging
+import cancer_api
+
+
+def main():
+
+    # ========================================================================================== #
+    # Argument parsing
+    # ========================================================================================== #
+
+    parser = argparse.ArgumentParser(description="Recompute the mutation summary table.")
+    parser.add_argument("db_host", help="Database server host")
+    parser.add_argument("db_name", help="Name of target database")
+    parser.add_argument("db_user", help="Database user")
+    parser.add_argument("--db_password", help="Password for user")
+    parser.add_argument("--library_ids", type=int, nargs="+",
+                        help="Only refresh the summary of these libraries")
+    args = parser.parse_args()
+
+    # ========================================================================================== #
+    # Refresh summary
+    # ========================================================================================== #
+
+    cancer_api.utils.setup_logging()
+    if not args.db_password:
+        args.db_password = getpass.getpass("Database password (may leave blank): ")
+    db_sess = cancer_api.Session(cancer_api.MysqlConnection(
+        args.db_host, args.db_user, args.db_password, args.db_name))
+    db_sess.create_tables()
+    logging.info("Refreshing mutation summary...")
+    num_rows = cancer_api.refresh_mutation_summary(db_sess, args.library_ids)
+    logging.info("Wrote {} summary rows.".format(num_rows))
+
+
+if __name__ == '__main__':
+    main()
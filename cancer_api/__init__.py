@@ -2,16 +2,100 @@
 __init__.py
 ===========
 Where it all begins.
+
+Files, parsers, detached records and operations are imported
+right away, whereas the database layer (SQLAlchemy models,
+sessions, loaders, etc.) is imported the first time one of its
+names is accessed (e.g., `cancer_api.Session`), such that
+file-only workloads don't pay for importing SQLAlchemy.
 """
 
-from base import Session
-from connections import *
-from mutations import *
-from effects import *
-from metadata import *
-from annotations import *
+import sys as _sys
+import types as _types
+import importlib as _importlib
+from records import *
+from filters import *
 from files import *
 from parsers import *
+from registry import *
 from utils import *
+from instrumentation import *
+from operations import *
+from pipeline import *
+from genotypes import *
 
 __version__ = "0.2.4"
+
+# Submodules depending on SQLAlchemy (in import order), along with
+# the names they add to the package. Names are listed explicitly
+# such that probing for other names doesn't import SQLAlchemy.
+_ORM_MODULES = [
+    ("base", ["Session"]),
+    ("connections", ["DatabaseConnection", "MysqlConnection", "SqliteConnection"]),
+    ("mutations", ["Mutation", "SingleNucleotideVariant", "Indel", "StructuralVariation",
+                   "CopyNumberVariation"]),
+    ("effects", ["GeneEffect", "ProteinEffect", "CopyNumberEffect", "StructuralEffect"]),
+    ("metadata", ["Patient", "Sample", "Library"]),
+    ("annotations", ["Gene", "Transcript", "Exon", "Protein"]),
+    ("summaries", ["MutationSummary", "get_subtype", "update_mutation_summary",
+                   "refresh_mutation_summary", "get_mutation_summary"]),
+    ("checkpoints", ["LoadCheckpoint", "Checkpointer"]),
+    ("loaders", ["get_id_map", "BulkLoader", "load_file", "load_annotation_file"]),
+    ("indexes", ["AnnotationIndex", "GeneRecord", "TranscriptRecord", "ExonRecord",
+                 "CodingHit"]),
+    ("predictors", ["ProteinEffectPredictor", "iter_small_variants", "predict_protein_effects",
+                    "iter_copy_number_effects", "predict_copy_number_effects"]),
+    ("queries", ["query_cohort", "get_cohort_libraries", "load_by_ids",
+                 "iter_library_mutations", "iter_cohort_mutations", "get_mutation_counts"]),
+    ("profiling", ["Profiler", "run_cprofile"]),
+]
+_ORM_NAMES = set(name for module_name, names in _ORM_MODULES for name in names) | \
+    set(module_name for module_name, names in _ORM_MODULES)
+
+
+class _LazyPackage(_types.ModuleType):
+    """Module type for the package, which imports the database layer
+    on the first access to one of its names or submodules (see
+    _ORM_MODULES). Names that are already defined (e.g., by the file
+    submodules) take precedence. Star imports (i.e. `__all__`) import
+    it as well, but not the modules imported by the package (e.g., sys).
+    """
+
+    _orm_loaded = False
+
+    def __getattr__(self, name):
+        if name == "__all__":
+            self.load_orm()
+            prefix = self.__name__ + "."
+            return [key for key, value in self.__dict__.items() if not key.startswith("_") and
+                    (not isinstance(value, _types.ModuleType) or
+                     value.__name__.startswith(prefix))]
+        if name not in _ORM_NAMES or self._orm_loaded:
+            raise AttributeError("'module' object has no attribute '{}'".format(name))
+        self.load_orm()
+        return getattr(self, name)
+
+    def load_orm(self):
+        """Import the submodules depending on SQLAlchemy."""
+        if self._orm_loaded:
+            return
+        # Set first to avoid recursion while the submodules are imported
+        self._orm_loaded = True
+        try:
+            for module_name, names in _ORM_MODULES:
+                module = _importlib.import_module("{}.{}".format(self.__name__, module_name))
+                for name in names:
+                    if name not in self.__dict__:
+                        setattr(self, name, getattr(module, name))
+        except Exception:
+            # Import again on next access rather than hiding the error
+            self._orm_loaded = False
+            raise
+
+
+# Replace this module by a lazy package, keeping a reference to the
+# original, given that Python 2 clears the globals of deleted modules
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(globals())
+_package._original_module = _sys.modules[__name__]
+_sys.modules[__name__] = _package
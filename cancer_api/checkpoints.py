@@ -0,0 +1,96 @@
+"""
+checkpoints.py
+==============
+This submodule contains a table tracking the progress of loads,
+such that loads of large files can be resumed after a failure
+(see `load_file` and `load_annotation_file`).
+"""
+
+import logging
+from sqlalchemy import Column, Integer, String, Boolean, BigInteger
+from base import Base
+from exceptions import CancerApiException
+
+
+class LoadCheckpoint(Base):
+    """Model for the progress of a load, i.e. the byte offset in the
+    file following the last line whose rows were committed, along
+    with the number of rows committed so far.
+    """
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(length=255))
+    filepath = Column(String(length=1024))
+    offset = Column(BigInteger)
+    num_rows = Column(Integer)
+    is_complete = Column(Boolean)
+
+    unique_on = ["name"]
+
+
+class Checkpointer(object):
+    """Commit the rows of bulk loaders along with the progress of a
+    load, in the same transaction. This way, the rows committed
+    always match the checkpoint, and a load resumed from the last
+    checkpoint (i.e. reading from its offset) neither misses nor
+    duplicates rows.
+
+    The loaders don't flush on their own (i.e. their batch size is
+    ignored); rows are flushed once batch_size rows are buffered
+    across loaders and the caller reaches a safe offset.
+    """
+
+    def __init__(self, session, name, filepath, loaders=None, batch_size=10000):
+        """Retrieve the checkpoint of a previous load with the same
+        name, which must be for the same file, or create one.
+        """
+        self.session = session
+        self.batch_size = batch_size
+        self.loaders = []
+        self.checkpoint = session.query(LoadCheckpoint).filter_by(name=name).first()
+        if self.checkpoint is None:
+            self.checkpoint = LoadCheckpoint(name=name, filepath=filepath, offset=0,
+                                             num_rows=0, is_complete=False)
+            session.add(self.checkpoint)
+            session.commit()
+        elif self.checkpoint.filepath != filepath:
+            raise CancerApiException("Checkpoint `{}` is for another file (i.e. {}).".format(
+                name, self.checkpoint.filepath))
+        elif self.checkpoint.offset:
+            logging.info("Resuming load `{}` from byte {} ({} rows already loaded)".format(
+                name, self.checkpoint.offset, self.checkpoint.num_rows))
+        self._initial_rows = self.checkpoint.num_rows
+        for loader in loaders or []:
+            self.add_loader(loader)
+
+    @property
+    def offset(self):
+        return self.checkpoint.offset
+
+    @property
+    def is_complete(self):
+        return self.checkpoint.is_complete
+
+    def add_loader(self, loader):
+        """Track loader, such that it's flushed along with checkpoints.
+        Loaders are flushed in the order they're added.
+        """
+        loader.batch_size = 0
+        self.loaders.append(loader)
+
+    def maybe_commit(self, offset):
+        """Commit if enough rows are buffered. The offset must follow
+        the last line whose rows were added to the loaders.
+        """
+        if sum(len(loader.buffer) for loader in self.loaders) >= self.batch_size:
+            self.commit(offset)
+
+    def commit(self, offset, is_complete=False):
+        """Insert the buffered rows and update the checkpoint."""
+        for loader in self.loaders:
+            loader.flush(commit=False)
+        self.checkpoint.offset = offset
+        self.checkpoint.num_rows = self._initial_rows + sum(loader.num_rows
+                                                            for loader in self.loaders)
+        self.checkpoint.is_complete = is_complete
+        self.session.commit()
@@ -0,0 +1,755 @@
+"""
+core.py
+=======
+This submodule defines the base classes of cancer_api objects,
+files and parsers, which don't depend on SQLAlchemy. This way,
+file-only workloads don't need to import the database layer
+(see base for the SQLAlchemy Declarative Base).
+"""
+
+import os.path
+import gc
+import heapq
+import shutil
+import tempfile
+import logging
+import time
+from exceptions import CancerApiException
+from utils import open_file, ChromosomeOrder
+from instrumentation import metrics, METRICS_BATCH_SIZE
+from filters import ChromFilter, LineFilter
+
+
+# ============================================================================================== #
+# Base Class for cancer_api Objects
+# ============================================================================================== #
+
+
+class CancerApiObject(object):
+    """
+    Base object to allow for common class methods
+    that apply for table and non-table models.
+    """
+
+    @property
+    def unique_on(self):
+        """List of attributes (as strings) on which each instance should be unique."""
+        if not getattr(self, "_unique_on", None):
+            raise NotImplementedError("The unique_on` attribute hasn't been implemented "
+                                      "for this class (i.e. {}).".format(self.__class__.__name__))
+        return self._unique_on
+
+    @unique_on.setter
+    def unique_on(self, value):
+        if type(value) == str:
+            self._unique_on = [value]
+        else:
+            self._unique_on = value
+
+    def get_key(self):
+        """Return a compact, hashable key identifying the instance.
+        Defaults to the tuple of unique_on attribute values.
+        Subclasses can override this method to canonicalize
+        equivalent representations.
+        """
+        return tuple(getattr(self, attr) for attr in self.unique_on)
+
+    def get_locus(self):
+        """Return (chrom, pos) tuple locating the instance
+        on the genome, which is used for sorting.
+        """
+        raise NotImplementedError("The `get_locus` method hasn't been implemented "
+                                  "for this class (i.e. {}).".format(self.__class__.__name__))
+
+    def get_interval(self):
+        """Return GenomicInterval spanned by the instance,
+        which is used for interval operations.
+        """
+        raise NotImplementedError("The `get_interval` method hasn't been implemented "
+                                  "for this class (i.e. {}).".format(self.__class__.__name__))
+
+    def __eq__(self, other):
+        # If not the same type, return false right away
+        if type(other) is not type(self):
+            return False
+        # Then compare based on keys (unique_on attributes by default)
+        return self.get_key() == other.get_key()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        """Hash consistently with __eq__. Instances without
+        a key fall back on identity-based hashing.
+        """
+        try:
+            key = self.get_key()
+        except NotImplementedError:
+            return object.__hash__(self)
+        return hash((self.__class__.__name__, key))
+
+    def __repr__(self):
+        """Improve representation of cancer_api objects
+        """
+        attrs = []
+        if getattr(self, "__mapper__", None):
+            attr_list = [col[0] for col in self.__mapper__.columns._data.iteritems()]
+        else:
+            attr_list = vars(self).keys()
+        for attr in attr_list:
+            if not attr.startswith("_"):
+                attrs.append("{}: {}".format(attr, getattr(self, attr, None).__repr__()))
+        return "{}(\n\t{}\n)".format(self.__class__.__name__, ",\n\t".join(attrs))
+
+
+# ============================================================================================== #
+# Validators
+# ============================================================================================== #
+
+def validate_int(value):
+    if isinstance(value, basestring):
+        value = int(value)
+    elif value is not None:
+        assert isinstance(value, (int, long))
+    return value
+
+
+# ============================================================================================== #
+# Base Classes for Files and Parsers
+# ============================================================================================== #
+
+
+class BaseFile(object):
+    """Base class for file classes"""
+
+    DEFAULT_HEADER = ""
+    HEADER_PREFIX = "#"
+    FILE_EXTENSIONS = ["txt"]
+    COMPRESSION_EXTENSIONS = ["gz", "bz"]
+    CHROM_INDEX_EXTENSION = "cidx"
+
+    def __init__(self, *args, **kwargs):
+        """Can't initialize directly."""
+        raise CancerApiException("Please use `open`, `convert` or `new` methods instead.")
+
+    @classmethod
+    def _init(cls, filepath=None, parser_cls=None, other_file=None, is_new=False, buffersize=None,
+              library=None, filters=None):
+        """Initialize BaseFile. Any instantiation of BaseFile should
+        go through this method in an attempt to standardize attributes.
+        Meant to be used internally only.
+        """
+        obj = cls.__new__(cls)
+        obj.filepath = filepath
+        obj.parser_cls = parser_cls
+        obj.parser = parser_cls(obj) if parser_cls else cls.DEFAULT_PARSER_CLS(obj)
+        obj.source = obj if not other_file else other_file.source
+        obj.is_new = is_new
+        obj.storelist = []
+        obj.buffersize = buffersize
+        obj.library = library
+        obj.filters = list(filters or [])
+        obj._header = None
+        return obj
+
+    @classmethod
+    def open(cls, filepath, parser_cls=None, buffersize=None, library=None, filters=None):
+        """Instantiate a BaseFile object from an
+        existing file on disk. Lines are only parsed
+        if they pass the given filters (see filters).
+        """
+        obj = cls._init(filepath=filepath, parser_cls=parser_cls, other_file=None, is_new=False,
+                        buffersize=buffersize, library=library, filters=filters)
+        return obj
+
+    @classmethod
+    def convert(cls, filepath, other_file, buffersize=None, library=None):
+        """Instantiate a BaseFile object from another
+        BaseFile object.
+        """
+        if not isinstance(other_file, BaseFile):
+            raise CancerApiException("Must pass cancer_api file object as `other_file`.")
+        obj = cls._init(filepath=filepath, parser_cls=None, other_file=other_file, is_new=True,
+                        buffersize=buffersize, library=library)
+        obj.write()
+        return obj
+
+    @classmethod
+    def new(cls, filepath, buffersize=None, library=None):
+        """Instantiate a BaseFile object from scratch.
+        Useful for adding objects and write them out to disk.
+        """
+        obj = cls._init(filepath=filepath, parser_cls=None, other_file=None, is_new=True,
+                        buffersize=buffersize, library=library)
+        return obj
+
+    @classmethod
+    def merge(cls, filepath, other_files, chrom_order=None, buffersize=None, library=None):
+        """Instantiate a BaseFile object by merging other
+        BaseFile objects, each sorted by chrom and pos,
+        into a single sorted file. The sorted inputs are
+        merged with a heap, such that only one line per
+        input is held in memory at any given time.
+        If the other files are of the same type, their lines
+        are written as is (along with the first file's header).
+        Otherwise, objects are converted using `obj_to_str`.
+        The output file is removed if merging fails.
+        See `utils.ChromosomeOrder` for `chrom_order`.
+        """
+        other_files = list(other_files)
+        if len(other_files) == 0 or not all(isinstance(f, BaseFile) for f in other_files):
+            raise CancerApiException("Must pass cancer_api file objects as `other_files`.")
+        if os.path.exists(filepath):
+            raise CancerApiException("Output file already exists: {}".format(filepath))
+        chrom_order = ChromosomeOrder.get(chrom_order)
+        is_same_type = all(type(f.source) is cls for f in other_files)
+        keyed_lines = [f.source.iterkeyedlines(chrom_order, index)
+                       for index, f in enumerate(other_files)]
+        try:
+            with open_file(filepath, "w") as outfile:
+                logging.info("Merging {} files to disk...".format(len(other_files)))
+                if is_same_type:
+                    outfile.write(other_files[0].source.get_header())
+                else:
+                    outfile.write(cls.DEFAULT_HEADER)
+                for key, index, line in heapq.merge(*keyed_lines):
+                    if is_same_type:
+                        outfile.write(line)
+                        continue
+                    obj = other_files[index].source.parser.parse(line)
+                    line = cls.obj_to_str(obj) if obj else None
+                    if line:
+                        outfile.write(line)
+        except Exception:
+            # Don't leave a partial file behind (e.g., if an input isn't sorted)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            raise
+        parser_cls = other_files[0].source.parser_cls if is_same_type else None
+        obj = cls._init(filepath=filepath, parser_cls=parser_cls, other_file=None, is_new=False,
+                        buffersize=buffersize, library=library)
+        return obj
+
+    def get_header(self):
+        """Return header if already stored in instance.
+        Otherwise, parse file on disk if filepath is specified.
+        If not, return default header for current file type.
+        """
+        if self._header:
+            header = self._header
+        elif self.is_new:
+            # It's a file create with the `new` or `convert` methods
+            header = self.DEFAULT_HEADER
+        else:
+            # It's a file created with the `open` method
+            with self._open() as infile:
+                header = ""
+                for line in infile:
+                    if self.is_header_line(line):
+                        header += line
+                    else:
+                        break
+        return header
+
+    def set_header(self, new_header):
+        """Manually set header of file for next time it is
+        written to disk.
+        """
+        self._header = new_header
+
+    @property
+    def col_names(self):
+        if getattr(self, "_col_names", None):
+            col_names = self._col_names
+        else:
+            header = self.get_header()
+            # Assume that the column names are the
+            # last line in the header
+            last_header_line = header.rstrip("\n").split("\n")[-1]
+            col_names = last_header_line.lstrip(self.HEADER_PREFIX).split("\t")
+            self._col_names = col_names
+        return col_names
+
+    @col_names.setter
+    def col_names(self, value):
+        self._col_names = list(value)
+
+    def split_filename(self):
+        """Returns filename (root, ext) tuple."""
+        filename = os.path.basename(self.filepath)
+        # Make sure that long extensions go first (to match the longest available extension)
+        for ext in ("." + x.lower() for x in sorted(self.FILE_EXTENSIONS, key=len, reverse=True)):
+            if filename.lower().endswith(ext):
+                return (filename[:-len(ext)], ext)
+            for comp_ext in self.COMPRESSION_EXTENSIONS:
+                new_ext = ext + "." + comp_ext
+                if filename.lower().endswith(new_ext):
+                    return (filename[:-len(new_ext)], new_ext)
+        # If none of the class' file extensions match, just use os.path.splitext
+        return os.path.splitext(filename)
+
+    @classmethod
+    def get_file_extension(cls):
+        """Return first extension from cls.FILE_EXTENSIONS.
+        Otherwise, returns an error if not available.
+        """
+        return cls.FILE_EXTENSIONS[0]
+
+    def add_obj(self, obj):
+        """Add object to storelist. Useful to bind objects
+        to files created with the `new` constructor.
+        Returns whether the object was added
+        (always True for now).
+        """
+        if not isinstance(obj, CancerApiObject):
+            raise CancerApiException("`add_obj` only supports cancer_api objects")
+        self.storelist.append(obj)
+        if self.buffersize and len(self.storelist) >= self.buffersize:
+            self.write()
+        return True
+
+    def clear_storelist(self):
+        """Empty storelist"""
+        self.storelist = []
+        # Force garbage collection
+        gc.collect()
+
+    @classmethod
+    def is_header_line(cls, line):
+        """Return whether or not a line is a header line
+        according to the current file type.
+        Defaults to lines starting with '#'
+        (see BaseFile.HEADER_PREFIX).
+        """
+        is_header_line = False
+        if cls.HEADER_PREFIX and line.startswith(cls.HEADER_PREFIX):
+            is_header_line = True
+        return is_header_line
+
+    @classmethod
+    def obj_to_str(cls, obj):
+        """Returns string for representing objects
+        as lines (one or many) in current file type.
+        If object doesn't have a line representation for
+        the current file type, return None.
+        """
+        # Example implementation:
+        # if type(obj) is SingleNucleotideVariant:
+        #     line = "{chrom}\t{pos}\t{ref_allele}\t{alt_allele}\n".format(**vars(obj))
+        # elif type(obj) is StructuralVariation:
+        #     line = "{chrom1}\t{pos1}\t...\n".format(**vars(obj))
+        # else:
+        #     line = None
+        # return line
+        raise NotImplementedError
+
+    def _open(self):
+        """Use the open_file function on self.source.filepath in 'r' mode"""
+        return open_file(self.source.filepath)
+
+    def write(self, outfilepath=None, mode="w"):
+        """Write objects in file to disk.
+        Either you can write to a new file (if outfilepath is given),
+        or you can append what's in storelist to the current filepath.
+        """
+        # If outfilepath is specified, iterate over every object in self
+        # (which might come from something else) and every object in
+        # self.storelist and write them out to disk
+        if outfilepath:
+            with open_file(outfilepath, mode) as outfile:
+                logging.info("Writing to disk...")
+                outfile.write(self.get_header())
+                self._write_objs(outfile, self.source)
+                self._write_objs(outfile, self.storelist)
+            # Clear storelist now that they've been written to disk
+            self.clear_storelist()
+            # Update file attributes (in case of new or converted file)
+            self.source = self
+            self.filepath = outfilepath
+            self.is_new = False
+
+        # If outfilepath is not specified, simply iterate over every
+        # object in self.storelist and append them to the file on disk.
+        else:
+            # If the file is new and the path already exist, do not append
+            if self.is_new and os.path.exists(self.filepath):
+                raise CancerApiException("Output file already exists: {}".format(self.filepath))
+            with open_file(self.filepath, "a+") as outfile:
+                logging.info("Writing to disk...")
+                # If the file is new, start with header
+                if self.is_new:
+                    outfile.write(self.get_header())
+                # If file is new and source is not self (i.e., converted file),
+                # iterate over source
+                if self.is_new and self.source is not self:
+                    self._write_objs(outfile, self.source)
+                # Proceed with iterating over storelist
+                self._write_objs(outfile, self.storelist)
+            # Clear storelist now that they've been written to disk
+            self.clear_storelist()
+            # Update file attributes (in case of new or converted file)
+            self.source = self
+            self.is_new = False
+
+    def _write_objs(self, outfile, objs):
+        """Write objects as lines to an opened file, counting
+        records and bytes if metrics are enabled.
+        """
+        if not metrics.enabled:
+            for obj in objs:
+                line = self.obj_to_str(obj)
+                outfile.write(line)
+            return
+        start_time = time.time()
+        total_records, num_records, num_bytes = 0, 0, 0
+        for obj in objs:
+            line = self.obj_to_str(obj)
+            outfile.write(line)
+            num_records += 1
+            num_bytes += len(line)
+            if num_records == METRICS_BATCH_SIZE:
+                metrics.count("write.records", num_records)
+                metrics.count("write.bytes", num_bytes)
+                total_records += num_records
+                num_records, num_bytes = 0, 0
+                metrics.maybe_report()
+        metrics.count("write.records", num_records)
+        metrics.count("write.bytes", num_bytes)
+        # Time taken to write (and read the source of) the objects
+        if total_records + num_records:
+            metrics.observe("write", time.time() - start_time)
+
+    def close(self):
+        """Ensure that buffer is written out to disk
+        """
+        if len(self.storelist) > 0:
+            self.write()
+
+    def iterlines(self, include_obj=False, filters=None):
+        """Iterate over non-comment lines.
+        Provides option to parse line and return
+        object alongside line as tuple.
+        Only lines passing the filters of the source
+        file and the given ones are returned.
+        """
+        line_filter = self._get_line_filter(filters)
+        if metrics.enabled:
+            for item in self._iterlines_instrumented(include_obj, line_filter):
+                yield item
+            return
+        with self._open() as infile:
+            for line in self._iterraw(infile, line_filter):
+                if self.source.is_header_line(line):
+                    continue
+                if line_filter is not None and not line_filter(line):
+                    continue
+                if include_obj:
+                    obj = self.source.parser.parse(line)
+                    if obj:
+                        yield (line, obj)
+                else:
+                    yield line
+
+    def iteroffsets(self, start_offset=0, filters=None):
+        """Iterate over non-comment lines along with the byte offset
+        following each of them, starting at a given offset (e.g., to
+        resume a load). Offsets refer to the uncompressed data, such
+        that seeking in gzipped files decompresses everything before.
+        """
+        line_filter = self._get_line_filter(filters)
+        blocks = self._get_blocks(line_filter) or [(0, None)]
+        with self._open() as infile:
+            for line, offset in self._iterblocks(infile, blocks, start_offset):
+                if self.source.is_header_line(line):
+                    continue
+                if line_filter is None or line_filter(line):
+                    yield (line, offset)
+
+    def _get_line_filter(self, filters=None):
+        """Return LineFilter combining the filters of the source file
+        and the given ones (None if there aren't any).
+        """
+        filters = self.source.filters + list(filters or [])
+        if not filters:
+            return None
+        return LineFilter(self.source, filters)
+
+    def _iterraw(self, infile, line_filter):
+        """Return iterable over the lines of an opened file, which only
+        includes the blocks of the chromosomes kept by the filter if
+        the file has a chromosome index.
+        """
+        blocks = self._get_blocks(line_filter)
+        if blocks is None:
+            return infile
+        return (line for line, offset in self._iterblocks(infile, blocks))
+
+    def _get_blocks(self, line_filter):
+        """Return (start offset, end offset) tuples for the blocks of the
+        chromosomes kept by the filter, or None if every line needs to
+        be read (i.e. there's no chromosome filter or index).
+        """
+        if line_filter is None or line_filter.chroms is None:
+            return None
+        chrom_index = self.source.read_chrom_index()
+        if chrom_index is None:
+            return None
+        return [(start, end) for chrom, start, end in chrom_index if chrom in line_filter.chroms]
+
+    @staticmethod
+    def _iterblocks(infile, blocks, start_offset=0):
+        """Iterate over the lines of the given blocks (in increasing
+        order), along with the byte offset following each of them.
+        Blocks ending with None extend to the end of the file.
+        """
+        for start, end in blocks:
+            if end is not None and end <= start_offset:
+                continue
+            offset = max(start, start_offset)
+            if offset != infile.tell():
+                infile.seek(offset)
+            while end is None or offset < end:
+                line = infile.readline()
+                if not line:
+                    break
+                offset += len(line)
+                yield (line, offset)
+
+    def get_chrom_index_filepath(self):
+        return "{}.{}".format(self.source.filepath, self.CHROM_INDEX_EXTENSION)
+
+    def build_chrom_index(self):
+        """Write an index of the blocks of consecutive lines on the same
+        chromosome (e.g., in sorted files) next to the file, such that
+        filtering by chromosome (see ChromFilter) skips other blocks.
+        The index lists (chrom, start offset, end offset) tuples,
+        which are returned as well.
+        """
+        chrom_index = ChromFilter([]).bind(self.source)[0]
+        blocks = []
+        with self._open() as infile:
+            offset = 0
+            for line in iter(infile.readline, ""):
+                start, offset = offset, offset + len(line)
+                if self.source.is_header_line(line):
+                    continue
+                chrom = line.split("\t", chrom_index + 1)[chrom_index]
+                if blocks and blocks[-1][0] == chrom and blocks[-1][2] == start:
+                    blocks[-1][2] = offset
+                else:
+                    blocks.append([chrom, start, offset])
+        with open(self.get_chrom_index_filepath(), "w") as outfile:
+            for block in blocks:
+                outfile.write("\t".join(str(value) for value in block) + "\n")
+        return [tuple(block) for block in blocks]
+
+    def read_chrom_index(self):
+        """Return (chrom, start offset, end offset) tuples from the
+        chromosome index, or None if it doesn't exist or if it's older
+        than the file (i.e. likely out of date).
+        """
+        index_filepath = self.get_chrom_index_filepath()
+        if not os.path.exists(index_filepath) or \
+                os.path.getmtime(index_filepath) < os.path.getmtime(self.source.filepath):
+            return None
+        chrom_index = []
+        with open(index_filepath) as infile:
+            for line in infile:
+                chrom, start, end = line.rstrip("\n").split("\t")
+                chrom_index.append((chrom, int(start), int(end)))
+        return chrom_index
+
+    def _iterlines_instrumented(self, include_obj=False, line_filter=None):
+        """Same as iterlines, while counting lines, bytes and
+        records and timing the parser (see metrics). Metrics are
+        updated in batches to keep the overhead per line low.
+        """
+        parser_name = type(self.source.parser).__name__ if include_obj else None
+        counts = [0, 0, 0, 0.0]  # Lines, bytes, records, parse time
+        try:
+            with self._open() as infile:
+                for line in self._iterraw(infile, line_filter):
+                    counts[0] += 1
+                    counts[1] += len(line)
+                    if counts[0] == METRICS_BATCH_SIZE:
+                        self._count_lines(counts, parser_name)
+                        metrics.maybe_report()
+                    if self.source.is_header_line(line):
+                        continue
+                    if line_filter is not None and not line_filter(line):
+                        continue
+                    if include_obj:
+                        start_time = time.time()
+                        obj = self.source.parser.parse(line)
+                        counts[3] += time.time() - start_time
+                        if obj:
+                            counts[2] += 1
+                            yield (line, obj)
+                    else:
+                        yield line
+        finally:
+            self._count_lines(counts, parser_name)
+
+    @staticmethod
+    def _count_lines(counts, parser_name):
+        """Add and reset counts from _iterlines_instrumented."""
+        num_lines, num_bytes, num_records, parse_time = counts
+        metrics.count("read.lines", num_lines)
+        metrics.count("read.bytes", num_bytes)
+        if parser_name and num_records:
+            metrics.count("parse.records", num_records)
+            # Records of a batch are assumed to take the same time
+            metrics.observe("parse.{}".format(parser_name), parse_time / num_records,
+                            num_records)
+        counts[:] = [0, 0, 0, 0.0]
+
+    def iterkeyedlines(self, chrom_order=None, index=0):
+        """Iterate over non-comment lines along with
+        their sort key, i.e. (key, index, line) tuples,
+        where the key is based on chrom and pos and
+        the index is used as a tie-breaker (e.g., to
+        identify the file when merging). Lines that
+        can't be located are skipped. Raises an
+        exception if the file isn't sorted.
+        """
+        return self._iterkeyed(self.iterlines(), chrom_order, index, check_order=True)
+
+    def _iterkeyed(self, lines, chrom_order=None, index=0, check_order=False):
+        """Iterate over (key, index, line) tuples for the given
+        lines using the source parser (see `iterkeyedlines`).
+        """
+        chrom_order = ChromosomeOrder.get(chrom_order)
+        parser = self.source.parser
+        last_key = None
+        for line in lines:
+            locus = parser.parse_locus(line)
+            if locus is None:
+                continue
+            chrom, pos = locus
+            key = (chrom_order.key(chrom), pos)
+            if check_order:
+                if last_key is not None and key < last_key:
+                    raise CancerApiException("File isn't sorted by chrom and pos: {}".format(
+                        self.source.filepath))
+                last_key = key
+            if not line.endswith("\n"):
+                line += "\n"
+            yield (key, index, line)
+
+    def sort(self, outfilepath, chrom_order=None, max_buffer_size=100000000, compress_tmp=False,
+             tmp_dir=None):
+        """Sort file by chrom and pos using an external merge sort
+        and write it to outfilepath. Lines are buffered until their
+        total size reaches max_buffer_size (in bytes), at which point
+        they are sorted and spilled to a temporary file (optionally
+        gzip-compressed). The sorted runs are then merged with a heap.
+        The sort is stable: lines with the same chrom and pos keep
+        their order in the file, regardless of the buffer size.
+        Note that the buffer size is approximate given that it doesn't
+        account for the overhead of Python objects.
+        See `utils.ChromosomeOrder` for `chrom_order`.
+        Returns the sorted file as a new BaseFile object.
+        """
+        if os.path.exists(outfilepath):
+            raise CancerApiException("Output file already exists: {}".format(outfilepath))
+        chrom_order = ChromosomeOrder.get(chrom_order)
+        tmp_dir = tempfile.mkdtemp(prefix="cancer_api_sort_", dir=tmp_dir)
+        try:
+            run_paths = []
+            buffer, buffer_size = [], 0
+            # Lines are tagged with their line number, which breaks ties
+            keyed_lines = self._iterkeyed(self.iterlines(), chrom_order)
+            for line_num, (key, _, line) in enumerate(keyed_lines):
+                buffer.append((key, line_num, line))
+                buffer_size += len(line)
+                if buffer_size >= max_buffer_size:
+                    run_paths.append(self._write_run(buffer, tmp_dir, compress_tmp))
+                    buffer, buffer_size = [], 0
+            # Sort last buffer in memory and merge it with the runs on disk, if any
+            buffer.sort()
+            runs = [self._read_run(path, chrom_order) for path in run_paths]
+            logging.info("Merging {} sorted runs to disk...".format(len(runs) + 1))
+            with open_file(outfilepath, "w") as outfile:
+                outfile.write(self.source.get_header())
+                for key, line_num, line in heapq.merge(*(runs + [iter(buffer)])):
+                    outfile.write(line)
+        finally:
+            shutil.rmtree(tmp_dir)
+        obj = self.__class__._init(filepath=outfilepath, parser_cls=self.source.parser_cls,
+                                   other_file=None, is_new=False, buffersize=self.buffersize,
+                                   library=self.library)
+        return obj
+
+    @staticmethod
+    def _write_run(buffer, tmp_dir, compress=False):
+        """Sort buffer of (key, line number, line) tuples and write
+        the numbered lines to a temporary file. Returns the file path.
+        """
+        buffer.sort()
+        suffix = ".txt.gz" if compress else ".txt"
+        fd, path = tempfile.mkstemp(suffix=suffix, prefix="run_", dir=tmp_dir)
+        os.close(fd)
+        logging.info("Writing sorted run to disk...")
+        with open_file(path, "w") as run_file:
+            for key, line_num, line in buffer:
+                run_file.write("{}\t{}".format(line_num, line))
+        return path
+
+    def _read_run(self, path, chrom_order):
+        """Iterate over (key, line number, line) tuples
+        in temporary file (see `_write_run`).
+        """
+        parser = self.source.parser
+        with open_file(path) as run_file:
+            for line in run_file:
+                line_num, _, line = line.partition("\t")
+                chrom, pos = parser.parse_locus(line)
+                yield ((chrom_order.key(chrom), pos), int(line_num), line)
+
+    def __iter__(self):
+        """Return instances of the objects
+        associated with the current file type.
+        """
+        for line, obj in self.iterlines(include_obj=True):
+            yield obj
+
+
+class BaseParser(object):
+    """Base file parser for defining necessary methods."""
+
+    def __init__(self, file):
+        """Store related file internally."""
+        self.file = file
+
+    def basic_parse(self, line):
+        """The basic_parse method serves to create
+        a dictionary of (column name, value) pairs.
+        This is to provide a common base for all
+        derivative parsers.
+
+        Returns a dict of (column name, value) pairs.
+        """
+        raise NotImplementedError
+
+    def parse(self, line):
+        """The parse method is user-facing and serves
+        to return object instances as opposed to the
+        dictionaries returned by _parse.
+
+        Returns a cancer_api object instance
+        """
+        raise NotImplementedError
+
+    def parse_locus(self, line):
+        """The parse_locus method serves to locate a line
+        on the genome (e.g., for sorting) without necessarily
+        creating an object. Parsers can override this method
+        with a faster implementation.
+
+        Returns a (chrom, pos) tuple or None
+        """
+        obj = self.parse(line)
+        if obj is None:
+            return None
+        chrom, pos = obj.get_locus()
+        return (chrom, int(pos))
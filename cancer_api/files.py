@@ -5,9 +5,13 @@ This submodules contains all classes representing file
 types/formats, which in turn employ the parsers submodule.
 """
 
-from base import BaseFile
+import os
+import mmap
+from core import BaseFile
+from exceptions import CancerApiException
+from utils import open_file, LruCache
 import parsers
-import mutations
+import records
 import misc
 
 
@@ -16,6 +20,20 @@ class VcfFile(BaseFile):
 
     DEFAULT_PARSER_CLS = parsers.VcfParser
     FILE_EXTENSIONS = ["vcf"]
+    DEFAULT_HEADER = "##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+    @classmethod
+    def obj_to_str(cls, obj):
+        """Create minimal VCF line (without annotations)
+        from SNV or indel (record or model) instance.
+        """
+        if isinstance(obj, (records.SingleNucleotideVariantMixin, records.IndelMixin)):
+            line = "{chrom}\t{pos}\t.\t{ref_allele}\t{alt_allele}\t.\t.\t.\n".format(
+                chrom=obj.chrom, pos=obj.pos, ref_allele=obj.ref_allele,
+                alt_allele=obj.alt_allele)
+        else:
+            line = None
+        return line
 
 
 class BedpeFile(BaseFile):
@@ -23,12 +41,12 @@ class BedpeFile(BaseFile):
 
     FILE_EXTENSIONS = ["bedpe"]
     DEFAULT_HEADER = "#chrom1\tstart1\tend1\tchrom2\tstart2\tend2\tname\tscore\tstrand1\tstrand2\n"
-    DEFAULT_PARSER_CLS = parsers.BaseParser  # A BEDPE parser need to be implemented
+    DEFAULT_PARSER_CLS = parsers.BedpeParser
 
     @classmethod
     def obj_to_str(cls, obj):
         """Create line from SV objects."""
-        if type(obj) is mutations.StructuralVariation:
+        if isinstance(obj, records.StructuralVariationMixin):
             template = ("{chrom1}\t{start1}\t{end1}\t{chrom2}\t{start2}\t{end2}\t"
                         "{name}\t{score}\t{strand1}\t{strand2}\n")
             line = template.format(
@@ -43,6 +61,22 @@ class BedpeFile(BaseFile):
                 strand1=obj.strand1,
                 strand2=obj.strand2
             )
+        elif type(obj) is misc.StructuralVariationCluster:
+            # Use the score column for the number of supporting calls
+            template = ("{chrom1}\t{start1}\t{end1}\t{chrom2}\t{start2}\t{end2}\t"
+                        "{name}\t{score}\t{strand1}\t{strand2}\n")
+            line = template.format(
+                chrom1=obj.chrom1,
+                start1=obj.pos1,
+                end1=obj.pos1 + 1,
+                chrom2=obj.chrom2,
+                start2=obj.pos2,
+                end2=obj.pos2 + 1,
+                name="{}_{}_{}_{}".format(obj.chrom1, obj.pos1, obj.chrom2, obj.pos2),
+                score=obj.support,
+                strand1=obj.strand1 or ".",
+                strand2=obj.strand2 or "."
+            )
         else:
             line = None
         return line
@@ -110,3 +144,158 @@ class FacteraFile(BaseFile):
     DEFAULT_PARSER_CLS = parsers.FacteraParser
     HEADER_PREFIX = "Est_Type"
     FILE_EXTENSIONS = ["fusions.txt"]
+
+
+class GtfFile(BaseFile):
+    """Class for representing GTF annotation files."""
+
+    DEFAULT_PARSER_CLS = parsers.GtfParser
+    FILE_EXTENSIONS = ["gtf"]
+
+
+class Gff3File(BaseFile):
+    """Class for representing GFF3 annotation files."""
+
+    DEFAULT_PARSER_CLS = parsers.Gff3Parser
+    FILE_EXTENSIONS = ["gff3", "gff"]
+
+
+class FastaFile(object):
+    """Class for random access to (uncompressed) reference FASTA
+    files. Unlike other files, sequences aren't parsed into objects.
+    Instead, a samtools-style index (.fai) is used to locate regions
+    in the memory-mapped file, which are read in fixed-size blocks.
+    Recently used blocks are cached, such that fetching nearby
+    regions (e.g., for clustered variants) avoids repeated reads.
+    """
+
+    def __init__(self, filepath, block_size=65536, cache_size=64):
+        """Open FASTA file, building its index if it doesn't exist or
+        if it's older than the file (i.e. likely out of date). The
+        block size is given in bases.
+        """
+        if filepath.endswith(".gz"):
+            raise CancerApiException("Compressed FASTA files aren't supported ({}).".format(
+                filepath))
+        self.filepath = filepath
+        self.index_filepath = filepath + ".fai"
+        if not os.path.exists(self.index_filepath) or \
+                os.path.getmtime(self.index_filepath) < os.path.getmtime(filepath):
+            self.build_index(filepath)
+        self.index = self.read_index(self.index_filepath)
+        self.block_size = block_size
+        self.cache = LruCache(cache_size)
+        # Empty files can't be memory-mapped (and have no sequences to fetch)
+        self._mmap = None
+        if os.path.getsize(filepath) > 0:
+            with open(filepath, "rb") as infile:
+                self._mmap = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def open(cls, filepath, block_size=65536, cache_size=64):
+        """Instantiate a FastaFile object from an existing file on disk."""
+        return cls(filepath, block_size, cache_size)
+
+    @staticmethod
+    def build_index(filepath):
+        """Write .fai index for FASTA file, i.e. the name, length,
+        offset, bases per line and bytes per line of each sequence.
+        Lines must have the same length within each sequence
+        (except the last one). Line lengths are 0 for sequences
+        without any bases.
+        """
+        entries = []
+        entry = None
+        offset = 0
+        last_line_length = None
+        with open(filepath, "rb") as infile:
+            for line in infile:
+                line_offset = offset
+                offset += len(line)
+                if line.startswith(">"):
+                    name = line[1:].split()[0]
+                    entry = [name, 0, offset, 0, 0]
+                    entries.append(entry)
+                    last_line_length = None
+                    continue
+                num_bases = len(line.rstrip("\r\n"))
+                if entry is None or num_bases == 0:
+                    continue
+                if last_line_length is not None and (last_line_length != entry[3] or
+                                                     num_bases > entry[3]):
+                    raise CancerApiException("Inconsistent line lengths in sequence {} "
+                                             "(offset {}).".format(entry[0], line_offset))
+                if last_line_length is None:
+                    entry[3], entry[4] = num_bases, len(line)
+                entry[1] += num_bases
+                last_line_length = num_bases
+        with open(filepath + ".fai", "w") as outfile:
+            for entry in entries:
+                outfile.write("\t".join(str(value) for value in entry) + "\n")
+
+    @staticmethod
+    def read_index(index_filepath):
+        """Return dict mapping sequence names to (length, offset,
+        bases per line, bytes per line) tuples from .fai index.
+        """
+        index = {}
+        with open_file(index_filepath) as infile:
+            for line in infile:
+                split_line = line.rstrip("\n").split("\t")
+                if len(split_line) < 5:
+                    continue
+                index[split_line[0]] = tuple(int(value) for value in split_line[1:5])
+        return index
+
+    @property
+    def chroms(self):
+        """Return sequence names in order of appearance."""
+        return sorted(self.index, key=lambda chrom: self.index[chrom][1])
+
+    def get_length(self, chrom):
+        """Return length of a sequence."""
+        if chrom not in self.index:
+            raise CancerApiException("Sequence not found in {}: {}".format(self.filepath, chrom))
+        return self.index[chrom][0]
+
+    def _get_block(self, chrom, block_index):
+        """Return sequence of block (cached)."""
+        key = (chrom, block_index)
+        block = self.cache.get(key)
+        if block is None:
+            length, offset, line_bases, line_width = self.index[chrom]
+            start = block_index * self.block_size
+            end = min(start + self.block_size, length)
+            # Convert base positions to byte offsets, accounting for newlines
+            start_offset = offset + (start // line_bases) * line_width + start % line_bases
+            end_offset = offset + ((end - 1) // line_bases) * line_width + (end - 1) % line_bases
+            block = self._mmap[start_offset:end_offset + 1].replace("\n", "").replace("\r", "")
+            self.cache[key] = block
+        return block
+
+    def fetch(self, chrom, start, end):
+        """Return sequence between 1-based positions (inclusive).
+        Positions beyond the ends of the sequence are ignored.
+        """
+        length = self.get_length(chrom)
+        start, end = max(start, 1) - 1, min(end, length)
+        if start >= end:
+            return ""
+        first_block, last_block = start // self.block_size, (end - 1) // self.block_size
+        blocks = [self._get_block(chrom, block_index)
+                  for block_index in range(first_block, last_block + 1)]
+        sequence = "".join(blocks) if len(blocks) > 1 else blocks[0]
+        offset = first_block * self.block_size
+        return sequence[start - offset:end - offset]
+
+    def close(self):
+        """Close the memory-mapped file."""
+        if self._mmap is not None:
+            self._mmap.close()
+        self.cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,151 @@
+"""
+filters.py
+==========
+This submodule contains declarative filters, which are applied on
+the raw columns of lines before they're parsed into objects (see
+the `filters` argument of `BaseFile.open` and `iterlines`). Lines
+are only split up to the last column used by the filters, such
+that discarded lines cost a fraction of parsing them.
+
+Filtering by chromosome (see ChromFilter) also skips whole blocks
+of lines when the file has a chromosome index (see
+`BaseFile.build_chrom_index`).
+"""
+
+from exceptions import CancerApiException
+
+
+def get_column_index(file, column):
+    """Return the (0-based) index of a column given as an integer or
+    a name, which is looked up in the base columns of the parser
+    (e.g., "qual" for VCF files) and then in the column names of the
+    file (e.g., sample names), ignoring the case and header prefix.
+    """
+    if isinstance(column, (int, long)):
+        return column
+    name = column.lstrip("#").lower()
+    base_columns = getattr(file.parser, "BASE_COLUMNS", [])
+    if name in base_columns:
+        return base_columns.index(name)
+    col_names = [col_name.lstrip("#").lower() for col_name in file.col_names]
+    if name in col_names:
+        return col_names.index(name)
+    raise CancerApiException("Unknown column `{}` for {}.".format(column, type(file).__name__))
+
+
+class Filter(object):
+    """Base class for filters on the raw columns of lines. Filters
+    are bound to a file before use, which resolves column indices.
+    """
+
+    def bind(self, file):
+        """Return (column index, predicate) tuple, where the predicate
+        takes the value of the column and returns whether to keep
+        the line.
+        """
+        raise NotImplementedError
+
+
+class ColumnFilter(Filter):
+    """Keep lines whose column (see get_column_index) is one of the
+    given values and/or within a numeric range (inclusive). Values
+    that aren't numeric (e.g., '.' for a missing QUAL) are out of
+    any range.
+    """
+
+    def __init__(self, column, values=None, min_value=None, max_value=None):
+        self.column = column
+        self.values = set(values) if values is not None else None
+        self.min_value = min_value
+        self.max_value = max_value
+
+    def bind(self, file):
+        return (get_column_index(file, self.column), self.keep)
+
+    def keep(self, value):
+        if self.values is not None and value not in self.values:
+            return False
+        if self.min_value is None and self.max_value is None:
+            return True
+        try:
+            value = float(value)
+        except ValueError:
+            return False
+        return ((self.min_value is None or value >= self.min_value) and
+                (self.max_value is None or value <= self.max_value))
+
+
+class ChromFilter(ColumnFilter):
+    """Keep lines on the given chromosomes, i.e. based on the "chrom"
+    column of the parser (or "chrom1" for paired files, e.g., BEDPE).
+    """
+
+    def __init__(self, chroms):
+        super(ChromFilter, self).__init__(None, values=chroms)
+
+    def bind(self, file):
+        base_columns = getattr(file.parser, "BASE_COLUMNS", [])
+        for column in ("chrom", "chrom1"):
+            if column in base_columns:
+                return (base_columns.index(column), self.keep)
+        raise CancerApiException("Can't filter {} by chromosome.".format(type(file).__name__))
+
+
+class InfoFilter(Filter):
+    """Keep VCF lines whose INFO column has the given key. If values
+    or a range are given, the value of the key must match them (see
+    ColumnFilter). Otherwise, the key can be a flag.
+    """
+
+    def __init__(self, key, values=None, min_value=None, max_value=None):
+        self.key = key
+        self.value_filter = None
+        if values is not None or min_value is not None or max_value is not None:
+            self.value_filter = ColumnFilter(None, values, min_value, max_value)
+
+    def bind(self, file):
+        return (get_column_index(file, "info"), self.keep)
+
+    def keep(self, info):
+        # Avoid splitting the column if the key is absent altogether
+        if self.key not in info:
+            return False
+        for item in info.split(";"):
+            key, sep, value = item.partition("=")
+            if key == self.key:
+                if self.value_filter is None:
+                    return True
+                return sep == "=" and self.value_filter.keep(value)
+        return False
+
+
+class PassFilter(ColumnFilter):
+    """Keep VCF lines passing all filters (i.e. FILTER is PASS)."""
+
+    def __init__(self):
+        super(PassFilter, self).__init__("filter", values=["PASS"])
+
+
+class LineFilter(object):
+    """Combination of filters bound to a file, which is called on
+    raw lines and returns whether all filters keep the line. The
+    chromosomes kept by chromosome filters are stored in `chroms`
+    (None if there's no chromosome filter).
+    """
+
+    def __init__(self, file, filters):
+        self.predicates = [f.bind(file) for f in filters]
+        self.maxsplit = max(index for index, predicate in self.predicates) + 1
+        self.chroms = None
+        for f in filters:
+            if isinstance(f, ChromFilter):
+                self.chroms = f.values if self.chroms is None else self.chroms & f.values
+
+    def __call__(self, line):
+        split_line = line.rstrip("\n").split("\t", self.maxsplit)
+        if len(split_line) < self.maxsplit:
+            return False
+        for index, predicate in self.predicates:
+            if not predicate(split_line[index]):
+                return False
+        return True
@@ -0,0 +1,245 @@
+"""
+genotypes.py
+============
+This submodule contains classes and functions for extracting the
+genotypes (GT), allelic depths (AD) and total depths (DP) of every
+sample from multi-sample VCF files into compact integer arrays,
+as opposed to dicts of strings per sample and record (see
+`VcfParser.basic_parse`). Records are processed in chunks, such
+that cohort VCFs can be streamed.
+"""
+
+from array import array
+from collections import OrderedDict
+from exceptions import CancerApiException
+
+# numpy is optional, but speeds up cohort statistics (see GenotypeChunk)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# Value of missing genotypes and depths
+MISSING = -1
+
+# Number of alternate alleles for common genotypes (see get_dosage)
+GT_DOSAGES = {
+    "0/0": 0, "0/1": 1, "1/0": 1, "1/1": 2, "./.": MISSING,
+    "0|0": 0, "0|1": 1, "1|0": 1, "1|1": 2, ".|.": MISSING,
+    "0": 0, "1": 1, ".": MISSING
+}
+
+
+def get_dosage(gt):
+    """Return the number of alternate alleles in a genotype (e.g.,
+    1 for '0/1' and 2 for '1|2'), or MISSING if any allele is missing.
+    """
+    dosage = GT_DOSAGES.get(gt)
+    if dosage is not None:
+        return dosage
+    alleles = gt.replace("|", "/").split("/")
+    if "." in alleles:
+        return MISSING
+    return sum(1 for allele in alleles if allele != "0")
+
+
+def _to_int(value):
+    """Convert depth to integer, using MISSING for '.' and empty values."""
+    if not value or value == ".":
+        return MISSING
+    return int(value)
+
+
+class GenotypeChunk(object):
+    """Genotypes and depths of a chunk of VCF records for a set of
+    samples, stored as flat arrays in row-major order (i.e. variants
+    by samples), such that the value for variant i and sample j is
+    at index i * num_samples + j (see `get`). Genotypes are stored as
+    dosages (number of alternate alleles) and alternate allele depths
+    as the sum over alternate alleles (missing if any of them is).
+    Missing values are -1.
+    """
+
+    def __init__(self, samples):
+        self.samples = list(samples)
+        self.num_samples = len(self.samples)
+        self.chroms = []
+        self.positions = array("i")
+        self.ref_alleles = []
+        self.alt_alleles = []
+        self.dosages = array("b")
+        self.ref_depths = array("i")
+        self.alt_depths = array("i")
+        self.depths = array("i")
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def num_variants(self):
+        return len(self.positions)
+
+    def get(self, matrix, variant_index, sample_index):
+        """Return value of a matrix (e.g., "dosages") for a variant
+        and sample (given as an index or a name).
+        """
+        if not isinstance(sample_index, (int, long)):
+            sample_index = self.samples.index(sample_index)
+        return getattr(self, matrix)[variant_index * self.num_samples + sample_index]
+
+    def get_row(self, matrix, variant_index):
+        """Return the values of a matrix for a variant (all samples)."""
+        start = variant_index * self.num_samples
+        return getattr(self, matrix)[start:start + self.num_samples]
+
+    def get_allele_frequencies(self):
+        """Return alternate allele frequency of each variant among
+        the samples with a genotype, assuming that they're diploid
+        (None for variants without any genotype). Vectorized with
+        numpy if it's available.
+        """
+        if numpy is not None and len(self):
+            dosages = self.to_numpy()["dosages"]
+            called = dosages != MISSING
+            num_called = called.sum(axis=1).tolist()
+            num_alt = numpy.where(called, dosages, 0).sum(axis=1).tolist()
+            return [alt / (2.0 * num) if num else None for alt, num in zip(num_alt, num_called)]
+        frequencies = []
+        num_samples = self.num_samples
+        dosages = self.dosages
+        for start in xrange(0, len(dosages), num_samples):
+            called = [dosage for dosage in dosages[start:start + num_samples]
+                      if dosage != MISSING]
+            frequencies.append(sum(called) / (2.0 * len(called)) if called else None)
+        return frequencies
+
+    def get_carrier_counts(self):
+        """Return the number of variants carried by each sample
+        (i.e. with at least one alternate allele), e.g. for burden.
+        Vectorized with numpy if it's available.
+        """
+        if numpy is not None and len(self):
+            return (self.to_numpy()["dosages"] > 0).sum(axis=0).tolist()
+        counts = [0] * self.num_samples
+        num_samples = self.num_samples
+        for index, dosage in enumerate(self.dosages):
+            if dosage > 0:
+                counts[index % num_samples] += 1
+        return counts
+
+    def to_numpy(self):
+        """Return dict of 2-D numpy arrays (variants by samples) for
+        the dosages and depths, without copying the data. Requires
+        numpy, which cancer_api doesn't depend on otherwise.
+        """
+        if numpy is None:
+            raise CancerApiException("numpy is required to convert genotypes to numpy arrays.")
+        shape = (self.num_variants, self.num_samples)
+        matrices = {}
+        for name, dtype in [("dosages", numpy.int8), ("ref_depths", numpy.int32),
+                            ("alt_depths", numpy.int32), ("depths", numpy.int32)]:
+            matrices[name] = numpy.frombuffer(getattr(self, name), dtype=dtype).reshape(shape)
+        return matrices
+
+
+class GenotypeReader(object):
+    """Extract genotypes and depths from the lines of a VCF file
+    (see GenotypeChunk), optionally for a subset of samples. The
+    FORMAT column is only parsed once per distinct value.
+    """
+
+    def __init__(self, vcf_file, samples=None):
+        all_samples = vcf_file.source.col_names[9:]
+        if not all_samples:
+            raise CancerApiException("VCF file doesn't have any samples: {}".format(
+                vcf_file.source.filepath))
+        if samples is None:
+            samples = all_samples
+        missing = [sample for sample in samples if sample not in all_samples]
+        if missing:
+            raise CancerApiException("Samples not in VCF file: {}".format(", ".join(missing)))
+        self.vcf_file = vcf_file
+        self.samples = list(samples)
+        # Column index of each sample in split lines
+        self.columns = [9 + all_samples.index(sample) for sample in self.samples]
+        self._format_indices = {}
+
+    def get_format_indices(self, format_str):
+        """Return indices of GT, AD and DP in FORMAT (None if absent)."""
+        indices = self._format_indices.get(format_str)
+        if indices is None:
+            keys = format_str.split(":")
+            indices = tuple(keys.index(key) if key in keys else None
+                            for key in ("GT", "AD", "DP"))
+            self._format_indices[format_str] = indices
+        return indices
+
+    def add_line(self, chunk, line):
+        """Append the genotypes and depths of a VCF line to a chunk."""
+        split_line = line.rstrip("\n").split("\t")
+        chunk.chroms.append(split_line[0])
+        chunk.positions.append(int(split_line[1]))
+        chunk.ref_alleles.append(split_line[3])
+        chunk.alt_alleles.append(split_line[4])
+        gt_index, ad_index, dp_index = self.get_format_indices(split_line[8])
+        dosages, ref_depths, alt_depths, depths = [], [], [], []
+        for column in self.columns:
+            values = split_line[column].split(":")
+            num_values = len(values)
+            # Trailing fields can be dropped (see VCF specification)
+            if gt_index is not None and gt_index < num_values:
+                dosages.append(get_dosage(values[gt_index]))
+            else:
+                dosages.append(MISSING)
+            if ad_index is not None and ad_index < num_values and values[ad_index] != ".":
+                allele_depths = [_to_int(depth) for depth in values[ad_index].split(",")]
+                ref_depths.append(allele_depths[0])
+                # The sum is missing if the depth of any alternate allele is
+                alt_allele_depths = allele_depths[1:]
+                if alt_allele_depths and MISSING not in alt_allele_depths:
+                    alt_depths.append(sum(alt_allele_depths))
+                else:
+                    alt_depths.append(MISSING)
+            else:
+                ref_depths.append(MISSING)
+                alt_depths.append(MISSING)
+            if dp_index is not None and dp_index < num_values:
+                depths.append(_to_int(values[dp_index]))
+            else:
+                depths.append(MISSING)
+        chunk.dosages.extend(dosages)
+        chunk.ref_depths.extend(ref_depths)
+        chunk.alt_depths.extend(alt_depths)
+        chunk.depths.extend(depths)
+
+    def iterchunks(self, chunk_size=1000):
+        """Iterate over GenotypeChunk instances of up to chunk_size
+        records each. Filters of the file apply (see filters).
+        """
+        chunk = GenotypeChunk(self.samples)
+        for line in self.vcf_file.iterlines():
+            self.add_line(chunk, line)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = GenotypeChunk(self.samples)
+        if len(chunk):
+            yield chunk
+
+
+def iter_genotype_chunks(vcf_file, chunk_size=1000, samples=None):
+    """Iterate over chunks of genotypes and depths (see GenotypeChunk)
+    for the samples of a VCF file (or a subset of them).
+    """
+    return GenotypeReader(vcf_file, samples).iterchunks(chunk_size)
+
+
+def get_carrier_counts(vcf_file, chunk_size=1000, samples=None):
+    """Return OrderedDict mapping samples to the number of variants
+    they carry in a VCF file (e.g., for mutation burden).
+    """
+    reader = GenotypeReader(vcf_file, samples)
+    counts = [0] * len(reader.samples)
+    for chunk in reader.iterchunks(chunk_size):
+        counts = [total + count for total, count in zip(counts, chunk.get_carrier_counts())]
+    return OrderedDict(zip(reader.samples, counts))
@@ -0,0 +1,415 @@
+"""
+indexes.py
+==========
+This submodule contains a read-only snapshot of the annotation
+tables (genes, transcripts and exons) for fast position lookups
+without querying the database. Snapshots can be saved to a file
+and memory-mapped, such that many worker processes can share
+the same copy.
+"""
+
+import sys
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from exceptions import CancerApiException
+from annotations import Gene, Transcript, Exon
+
+
+GeneRecord = namedtuple("GeneRecord", [
+    "index", "id", "gene_ensembl_id", "gene_symbol", "biotype", "chrom", "start_pos",
+    "end_pos"])
+
+TranscriptRecord = namedtuple("TranscriptRecord", [
+    "index", "id", "transcript_ensembl_id", "gene_index", "cds_start_pos", "cds_end_pos",
+    "length", "strand"])
+
+ExonRecord = namedtuple("ExonRecord", [
+    "index", "id", "exon_ensembl_id", "gene_index", "transcript_index", "chrom",
+    "genome_start_pos", "genome_end_pos", "transcript_start_pos", "transcript_end_pos",
+    "strand", "phase", "end_phase"])
+
+# Exon overlapping a position within the coding region of its transcript,
+# where cds_pos is the (1-based) position in the coding sequence
+CodingHit = namedtuple("CodingHit", ["exon", "transcript", "cds_pos"])
+
+
+class _MappedArray(object):
+    """Read-only sequence of 32-bit integers stored in a buffer
+    (e.g., a memory-mapped file). Supports indexing and bisect.
+    """
+
+    ITEM = struct.Struct("=i")
+
+    def __init__(self, buf, offset, length):
+        self.buf = buf
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("index out of range")
+        return self.ITEM.unpack_from(self.buf, self.offset + 4 * index)[0]
+
+
+class _StringTable(object):
+    """Read-only sequence of strings stored as a single blob
+    along with the offset of each string. Empty strings are
+    returned as None.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def build(cls, values):
+        """Return string table for a list of strings."""
+        offsets = array("i", [0])
+        chunks = []
+        for value in values:
+            value = value or ""
+            if isinstance(value, unicode):
+                value = value.encode("utf-8")
+            chunks.append(value)
+            offsets.append(offsets[-1] + len(value))
+        return cls(offsets, "".join(chunks))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.blob[self.offsets[index]:self.offsets[index + 1]] or None
+
+
+def _to_int(value, default=0):
+    """Convert value to integer, using default for None."""
+    return default if value is None else int(value)
+
+
+class AnnotationIndex(object):
+    """Snapshot of the gene, transcript and exon tables stored
+    as integer arrays (one per column). Genes and exons are sorted
+    by chromosome and start position, and each chromosome is a
+    range of indices in these arrays. Transcripts and exons refer
+    to each other by index. Missing coordinates are stored as 0.
+
+    Use `from_session` to build an index from the database,
+    `save` to write it to disk and `load` to memory-map it.
+    """
+
+    MAGIC = "CAANNIDX"
+    VERSION = 1
+    HEADER = struct.Struct("=8sII")
+
+    INT_COLUMNS = [
+        "gene.id", "gene.start", "gene.end", "gene.max_end",
+        "transcript.id", "transcript.gene_index", "transcript.cds_start_pos",
+        "transcript.cds_end_pos", "transcript.length", "transcript.strand",
+        "transcript.first_exon", "transcript.num_exons",
+        "exon.id", "exon.start", "exon.end", "exon.max_end", "exon.gene_index",
+        "exon.transcript_index", "exon.transcript_start_pos", "exon.transcript_end_pos",
+        "exon.strand", "exon.phase", "exon.end_phase",
+        "transcript_exon.exon_index"]
+
+    STRING_COLUMNS = [
+        "gene.gene_ensembl_id", "gene.gene_symbol", "gene.biotype",
+        "transcript.transcript_ensembl_id", "exon.exon_ensembl_id"]
+
+    def __init__(self, columns, chrom_ranges, mapped_file=None):
+        """Initialize index from columns (dict of sequences) and
+        chromosome ranges (dict of {chrom: [first, last]} dicts for
+        genes and exons). Use `from_session` or `load` instead.
+        """
+        self.columns = columns
+        self.chrom_ranges = chrom_ranges
+        self.mapped_file = mapped_file
+        # Sorted chromosome ranges for finding the chromosome of an index
+        self._range_starts = {}
+        for kind, ranges in chrom_ranges.iteritems():
+            range_starts = sorted((first, chrom) for chrom, (first, last) in ranges.iteritems())
+            self._range_starts[kind] = ([first for first, _ in range_starts],
+                                        [chrom for _, chrom in range_starts])
+
+    @classmethod
+    def from_session(cls, session, yield_per=10000):
+        """Build index from the annotation tables. Only the needed
+        columns are queried, which avoids creating ORM objects.
+        The chromosome of exons is taken from their gene.
+        """
+        # Genes
+        gene_query = session.query(
+            Gene.id, Gene.gene_ensembl_id, Gene.gene_symbol, Gene.biotype, Gene.chrom,
+            Gene.start_pos, Gene.end_pos)
+        genes = [row for row in gene_query.yield_per(yield_per)
+                 if row[4] is not None and row[5] is not None and row[6] is not None]
+        genes.sort(key=lambda row: (row[4], row[5], row[6]))
+        gene_indices = dict((row[0], index) for index, row in enumerate(genes))
+        # Transcripts
+        transcript_query = session.query(
+            Transcript.id, Transcript.transcript_ensembl_id, Transcript.gene_id,
+            Transcript.cds_start_pos, Transcript.cds_end_pos, Transcript.length)
+        transcripts = [row for row in transcript_query.yield_per(yield_per)
+                       if row[2] in gene_indices]
+        transcript_indices = dict((row[0], index) for index, row in enumerate(transcripts))
+        # Exons
+        exon_query = session.query(
+            Exon.id, Exon.exon_ensembl_id, Exon.gene_id, Exon.transcript_id,
+            Exon.genome_start_pos, Exon.genome_end_pos, Exon.transcript_start_pos,
+            Exon.transcript_end_pos, Exon.strand, Exon.phase, Exon.end_phase)
+        exons = []
+        for row in exon_query.yield_per(yield_per):
+            transcript_index = transcript_indices.get(row[3], -1)
+            gene_index = gene_indices.get(row[2])
+            if gene_index is None and transcript_index != -1:
+                gene_index = gene_indices[transcripts[transcript_index][2]]
+            if gene_index is None or row[4] is None or row[5] is None:
+                continue
+            chrom = str(genes[gene_index][4])
+            exons.append((chrom, row[4], row[5], row, gene_index, transcript_index))
+        exons.sort(key=lambda exon: exon[:3])
+
+        columns = dict((name, array("i")) for name in cls.INT_COLUMNS)
+        strings = dict((name, []) for name in cls.STRING_COLUMNS)
+        chrom_ranges = {"gene": {}, "exon": {}}
+        for index, row in enumerate(genes):
+            cls._add_interval(columns, chrom_ranges, "gene", index, str(row[4]), row[5], row[6])
+            columns["gene.id"].append(row[0])
+            strings["gene.gene_ensembl_id"].append(row[1])
+            strings["gene.gene_symbol"].append(row[2])
+            strings["gene.biotype"].append(row[3])
+        # Exon indices of each transcript, in transcript order
+        transcript_exons = [[] for _ in transcripts]
+        for index, (chrom, start, end, row, gene_index, transcript_index) in enumerate(exons):
+            cls._add_interval(columns, chrom_ranges, "exon", index, chrom, start, end)
+            columns["exon.id"].append(row[0])
+            columns["exon.gene_index"].append(gene_index)
+            columns["exon.transcript_index"].append(transcript_index)
+            columns["exon.transcript_start_pos"].append(_to_int(row[6]))
+            columns["exon.transcript_end_pos"].append(_to_int(row[7]))
+            columns["exon.strand"].append(_to_int(row[8]))
+            columns["exon.phase"].append(_to_int(row[9], -1))
+            columns["exon.end_phase"].append(_to_int(row[10], -1))
+            strings["exon.exon_ensembl_id"].append(row[1])
+            if transcript_index != -1:
+                transcript_exons[transcript_index].append((_to_int(row[6]), index))
+        for index, row in enumerate(transcripts):
+            exon_indices = [exon_index for _, exon_index in sorted(transcript_exons[index])]
+            columns["transcript.id"].append(row[0])
+            columns["transcript.gene_index"].append(gene_indices[row[2]])
+            columns["transcript.cds_start_pos"].append(_to_int(row[3]))
+            columns["transcript.cds_end_pos"].append(_to_int(row[4]))
+            columns["transcript.length"].append(_to_int(row[5]))
+            strand = columns["exon.strand"][exon_indices[0]] if exon_indices else 0
+            columns["transcript.strand"].append(strand)
+            columns["transcript.first_exon"].append(len(columns["transcript_exon.exon_index"]))
+            columns["transcript.num_exons"].append(len(exon_indices))
+            columns["transcript_exon.exon_index"].extend(exon_indices)
+            strings["transcript.transcript_ensembl_id"].append(row[1])
+        for name, values in strings.iteritems():
+            columns[name] = _StringTable.build(values)
+        return cls(columns, chrom_ranges)
+
+    @staticmethod
+    def _add_interval(columns, chrom_ranges, kind, index, chrom, start, end):
+        """Append interval to the position columns of genes or exons,
+        keeping track of the chromosome ranges and the running
+        maximum of end positions (reset for every chromosome).
+        """
+        ranges = chrom_ranges[kind]
+        max_ends = columns[kind + ".max_end"]
+        if chrom not in ranges:
+            ranges[chrom] = [index, index]
+            max_end = end
+        else:
+            max_end = max(max_ends[-1], end)
+        ranges[chrom][1] = index + 1
+        columns[kind + ".start"].append(start)
+        columns[kind + ".end"].append(end)
+        max_ends.append(max_end)
+
+    def save(self, filepath):
+        """Write index to a file that can be memory-mapped
+        (see `load`). Integers are stored in native byte order.
+        """
+        layout = {}
+        data = []
+        offset = 0
+        for name in self.INT_COLUMNS + self.STRING_COLUMNS:
+            column = self.columns[name]
+            if name in self.STRING_COLUMNS:
+                offsets = array("i", column.offsets)
+                blob = str(column.blob)
+                layout[name] = [offset, len(offsets), offset + 4 * len(offsets), len(blob)]
+                chunks = [offsets.tostring(), blob]
+            else:
+                chunks = [array("i", column).tostring()]
+                layout[name] = [offset, len(column)]
+            data.extend(chunks)
+            offset += sum(len(chunk) for chunk in chunks)
+        toc = json.dumps({"byteorder": sys.byteorder, "layout": layout,
+                          "chrom_ranges": self.chrom_ranges})
+        with open(filepath, "wb") as outfile:
+            outfile.write(self.HEADER.pack(self.MAGIC, self.VERSION, len(toc)))
+            outfile.write(toc)
+            for chunk in data:
+                outfile.write(chunk)
+
+    @classmethod
+    def load(cls, filepath):
+        """Memory-map index file written with `save`. The file is
+        shared (read-only) by all processes that load it, and only
+        the pages needed for lookups are read from disk.
+        """
+        with open(filepath, "rb") as infile:
+            buf = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, toc_length = cls.HEADER.unpack_from(buf, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise CancerApiException("Unsupported annotation index file ({}).".format(filepath))
+        toc_start = cls.HEADER.size
+        toc = json.loads(buf[toc_start:toc_start + toc_length])
+        if toc["byteorder"] != sys.byteorder:
+            raise CancerApiException("Annotation index was saved on a platform with a different "
+                                     "byte order ({}).".format(toc["byteorder"]))
+        data_start = toc_start + toc_length
+        columns = {}
+        for name, layout in toc["layout"].iteritems():
+            name = str(name)
+            if name in cls.STRING_COLUMNS:
+                offsets = _MappedArray(buf, data_start + layout[0], layout[1])
+                blob_start = data_start + layout[2]
+                blob = buffer(buf, blob_start, layout[3])
+                columns[name] = _StringTable(offsets, blob)
+            else:
+                columns[name] = _MappedArray(buf, data_start + layout[0], layout[1])
+        chrom_ranges = dict((str(kind), dict((str(chrom), tuple(bounds)) for chrom, bounds in
+                                             ranges.iteritems()))
+                            for kind, ranges in toc["chrom_ranges"].iteritems())
+        return cls(columns, chrom_ranges, mapped_file=buf)
+
+    def close(self):
+        """Close the memory-mapped file, if any."""
+        if self.mapped_file is not None:
+            self.mapped_file.close()
+            self.mapped_file = None
+
+    @property
+    def num_genes(self):
+        return len(self.columns["gene.id"])
+
+    @property
+    def num_transcripts(self):
+        return len(self.columns["transcript.id"])
+
+    @property
+    def num_exons(self):
+        return len(self.columns["exon.id"])
+
+    def _find_overlaps(self, kind, chrom, start, end):
+        """Return indices of the genes or exons overlapping with
+        an interval, in order of start position.
+        """
+        if chrom not in self.chrom_ranges[kind]:
+            return []
+        first, last = self.chrom_ranges[kind][chrom]
+        ends = self.columns[kind + ".end"]
+        max_ends = self.columns[kind + ".max_end"]
+        index = bisect_right(self.columns[kind + ".start"], end, first, last) - 1
+        indices = []
+        # Intervals starting before can only overlap while the running maximum reaches the start
+        while index >= first and max_ends[index] >= start:
+            if ends[index] >= start:
+                indices.append(index)
+            index -= 1
+        indices.reverse()
+        return indices
+
+    def _get_chrom(self, kind, index):
+        """Return chromosome of a gene or exon index."""
+        firsts, chroms = self._range_starts[kind]
+        return chroms[bisect_right(firsts, index) - 1]
+
+    def get_gene(self, index, chrom=None):
+        """Return GeneRecord for a gene index."""
+        columns = self.columns
+        return GeneRecord(
+            index, columns["gene.id"][index], columns["gene.gene_ensembl_id"][index],
+            columns["gene.gene_symbol"][index], columns["gene.biotype"][index],
+            chrom or self._get_chrom("gene", index), columns["gene.start"][index],
+            columns["gene.end"][index])
+
+    def get_transcript(self, index):
+        """Return TranscriptRecord for a transcript index."""
+        columns = self.columns
+        return TranscriptRecord(
+            index, columns["transcript.id"][index],
+            columns["transcript.transcript_ensembl_id"][index],
+            columns["transcript.gene_index"][index], columns["transcript.cds_start_pos"][index],
+            columns["transcript.cds_end_pos"][index], columns["transcript.length"][index],
+            columns["transcript.strand"][index])
+
+    def get_exon(self, index, chrom=None):
+        """Return ExonRecord for an exon index."""
+        columns = self.columns
+        return ExonRecord(
+            index, columns["exon.id"][index], columns["exon.exon_ensembl_id"][index],
+            columns["exon.gene_index"][index], columns["exon.transcript_index"][index],
+            chrom or self._get_chrom("exon", index), columns["exon.start"][index],
+            columns["exon.end"][index], columns["exon.transcript_start_pos"][index],
+            columns["exon.transcript_end_pos"][index], columns["exon.strand"][index],
+            columns["exon.phase"][index], columns["exon.end_phase"][index])
+
+    def get_transcript_exons(self, transcript_index):
+        """Return ExonRecords of a transcript in transcript order."""
+        first = self.columns["transcript.first_exon"][transcript_index]
+        num_exons = self.columns["transcript.num_exons"][transcript_index]
+        exon_indices = self.columns["transcript_exon.exon_index"]
+        return [self.get_exon(exon_indices[index]) for index in range(first, first + num_exons)]
+
+    def iter_genes(self, chrom):
+        """Iterate over the GeneRecords of a chromosome
+        in order of start position.
+        """
+        first, last = self.chrom_ranges["gene"].get(chrom, (0, 0))
+        for index in xrange(first, last):
+            yield self.get_gene(index, chrom)
+
+    def find_genes(self, chrom, start_pos, end_pos=None):
+        """Return GeneRecords overlapping with a position or interval."""
+        end_pos = start_pos if end_pos is None else end_pos
+        return [self.get_gene(index, chrom) for index in
+                self._find_overlaps("gene", chrom, start_pos, end_pos)]
+
+    def find_exons(self, chrom, start_pos, end_pos=None):
+        """Return ExonRecords overlapping with a position or interval."""
+        end_pos = start_pos if end_pos is None else end_pos
+        return [self.get_exon(index, chrom) for index in
+                self._find_overlaps("exon", chrom, start_pos, end_pos)]
+
+    def find_cds(self, chrom, pos):
+        """Return CodingHits for the exons overlapping with a position
+        that lies within the coding region of their transcript.
+        """
+        hits = []
+        for exon in self.find_exons(chrom, pos):
+            if exon.transcript_index == -1:
+                continue
+            transcript = self.get_transcript(exon.transcript_index)
+            if not transcript.cds_start_pos:
+                continue
+            if exon.strand == -1:
+                transcript_pos = exon.transcript_start_pos + exon.genome_end_pos - pos
+            else:
+                transcript_pos = exon.transcript_start_pos + pos - exon.genome_start_pos
+            if transcript.cds_start_pos <= transcript_pos <= transcript.cds_end_pos:
+                hits.append(CodingHit(exon, transcript,
+                                      transcript_pos - transcript.cds_start_pos + 1))
+        return hits
@@ -0,0 +1,207 @@
+"""
+instrumentation.py
+==================
+This submodule contains a lightweight instrumentation layer
+for hot paths (reading, parsing, writing and loading), with
+named counters, timers and histograms. Measurements are
+aggregated in memory and reported periodically (e.g., rows/s
+and flush latencies) rather than logged for every record.
+
+Instrumentation is disabled by default, in which case the
+instrumented code only checks `metrics.enabled` once per file,
+write or flush:
+    cancer_api.metrics.enable(report_interval=60)
+    ...
+    cancer_api.metrics.report()
+"""
+
+import math
+import time
+import logging
+from collections import Counter
+
+
+# Number of records between updates of the metrics in loops
+METRICS_BATCH_SIZE = 10000
+
+
+class Histogram(object):
+    """Summary of observed values (e.g., durations in seconds)
+    in constant memory: count, total, min, max and counts per
+    power-of-two bucket, which are used to approximate percentiles.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = Counter()
+
+    def observe(self, value, count=1):
+        """Add value, optionally as the average of several
+        observations (e.g., the time per record of a batch).
+        """
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        bucket = int(math.floor(math.log(value, 2))) if value > 0 else None
+        self.buckets[bucket] += count
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, fraction):
+        """Return approximate percentile (e.g., 0.95), i.e. the upper
+        bound of the bucket containing it, capped by the maximum.
+        """
+        if not self.count:
+            return None
+        threshold = fraction * self.count
+        seen = 0
+        # Bucket None (zero or negative values) sorts first in Python 2
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= threshold:
+                return 0.0 if bucket is None else min(2.0 ** (bucket + 1), self.max)
+        return self.max
+
+    def summary(self):
+        """Return dict summarizing the observations."""
+        return {"count": self.count, "total": self.total, "mean": self.mean, "min": self.min,
+                "max": self.max, "p50": self.percentile(0.5), "p95": self.percentile(0.95)}
+
+
+class _Timer(object):
+    """Context manager adding its duration to a histogram."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start_time = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.time() - self.start_time)
+        return False
+
+
+class _NullTimer(object):
+    """Context manager doing nothing, used when disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics(object):
+    """Registry of named counters and histograms (timers are
+    histograms of durations). Every method is a no-op while
+    instrumentation is disabled. If a report interval is set,
+    a report is logged by `maybe_report`, which instrumented
+    code calls between batches, at most once per interval.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.report_interval = None
+        self.reset()
+
+    def enable(self, report_interval=None):
+        """Enable instrumentation, reporting every report_interval
+        seconds (or only when `report` is called if None).
+        """
+        self.enabled = True
+        self.report_interval = report_interval
+        self._next_report_time = time.time() + (report_interval or 0)
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Discard all measurements."""
+        self.counters = Counter()
+        self.histograms = {}
+        self.start_time = time.time()
+        self._last_report_time = self.start_time
+        self._last_counters = Counter()
+        self._next_report_time = self.start_time + (self.report_interval or 0)
+
+    def count(self, name, value=1):
+        """Increment counter (e.g., number of records or bytes)."""
+        if self.enabled:
+            self.counters[name] += value
+
+    def observe(self, name, value, count=1):
+        """Add value to histogram (see Histogram.observe)."""
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value, count)
+
+    def timer(self, name):
+        """Return context manager timing its block:
+            with metrics.timer("loader.flush"):
+                ...
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        return _Timer(histogram)
+
+    def snapshot(self):
+        """Return dict of counters and histogram summaries."""
+        return {
+            "elapsed": time.time() - self.start_time,
+            "counters": dict(self.counters),
+            "histograms": dict((name, histogram.summary()) for name, histogram in
+                               self.histograms.iteritems())
+        }
+
+    def maybe_report(self):
+        """Log report if the report interval has elapsed."""
+        if self.enabled and self.report_interval is not None and \
+                time.time() >= self._next_report_time:
+            self.report()
+
+    def report(self):
+        """Log counters (with their rate since the last report)
+        and histograms (as durations in ms).
+        """
+        now = time.time()
+        interval = now - self._last_report_time
+        parts = []
+        for name in sorted(self.counters):
+            value = self.counters[name]
+            rate = (value - self._last_counters[name]) / interval if interval > 0 else 0.0
+            parts.append("{}={:.0f} ({:.0f}/s)".format(name, value, rate))
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            if not histogram.count:
+                continue
+            parts.append("{}: n={} mean={:.3f} ms p95={:.3f} ms max={:.3f} ms".format(
+                name, histogram.count, histogram.mean * 1000, histogram.percentile(0.95) * 1000,
+                histogram.max * 1000))
+        if parts:
+            logging.info("Metrics after {:.1f} sec: {}".format(now - self.start_time,
+                                                               "; ".join(parts)))
+        self._last_report_time = now
+        self._last_counters = Counter(self.counters)
+        self._next_report_time = now + (self.report_interval or 0)
+
+
+# Shared registry used by the instrumented code
+metrics = Metrics()
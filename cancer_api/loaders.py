@@ -0,0 +1,415 @@
+"""
+loaders.py
+==========
+This submodule contains classes and functions for loading
+large numbers of rows into the database efficiently.
+"""
+
+import time
+import logging
+from collections import Counter
+from sqlalchemy import func
+from exceptions import CancerApiException
+from base import validators
+from instrumentation import metrics
+from annotations import Gene, Transcript, Exon, Protein
+from mutations import Mutation
+from summaries import get_subtype, update_mutation_summary
+from pipeline import Pipeline
+from checkpoints import Checkpointer
+
+
+def get_id_map(session, model_cls, attr):
+    """Return dict mapping the values of a given attribute
+    (e.g., Ensembl IDs) to primary keys for every row of a
+    model's table, using a single query. Useful to resolve
+    foreign keys when loading rows in bulk.
+    """
+    query = session.query(getattr(model_cls, attr), model_cls.id)
+    return dict(query)
+
+
+class BulkLoader(object):
+    """Load rows (dicts of attribute-value pairs) into the table(s)
+    of a given model in batches. Each batch is inserted with one
+    executemany statement per table and committed, bypassing the
+    creation of ORM objects. Progress is logged periodically.
+
+    For models using joined table inheritance (e.g., mutations and
+    effects), primary keys are assigned from the current maximum,
+    which assumes that there is only one writer at a time and that
+    no rows are inserted otherwise while rows are buffered. Keys are
+    assigned as rows are added, such that they can be referenced
+    right away (e.g., for foreign keys in other loaders).
+    """
+
+    def __init__(self, session, model_cls, batch_size=10000, skip_existing=False,
+                 progress_every=100000, assign_ids=None, depends_on=None, update_summary=True):
+        """If skip_existing is enabled, rows that already exist in
+        the database (or earlier in the load) according to the
+        model's unique_on attributes are skipped, similar to
+        `get_or_create` but with a single query up front.
+        If assign_ids is enabled, primary keys are assigned for
+        every model (by default, only for inherited models).
+        Loaders listed in depends_on are flushed before this one,
+        which ensures that referenced rows are inserted first.
+        For mutations, the summary table (see MutationSummary) is
+        updated along with every batch if update_summary is enabled.
+        A batch_size of 0 disables automatic flushes.
+        """
+        self.session = session
+        self.model_cls = model_cls
+        self.batch_size = batch_size
+        self.progress_every = progress_every
+        self.mapper = model_cls.__mapper__
+        # Tables from the base class to the model class
+        self.tables = []
+        for mapper in reversed(list(self.mapper.iterate_to_root())):
+            if mapper.local_table not in self.tables:
+                self.tables.append(mapper.local_table)
+        self.is_inherited = len(self.tables) > 1
+        # Columns whose values are converted like model attributes (see base.validators)
+        self.validated_columns = [(column.key, type(column.type)) for table in self.tables
+                                  for column in table.columns if type(column.type) in validators]
+        self.assign_ids = self.is_inherited if assign_ids is None else assign_ids
+        self.depends_on = depends_on or []
+        self.update_summary = update_summary and issubclass(model_cls, Mutation) and \
+            self.mapper.polymorphic_identity is not None
+        self.buffer = []
+        self.num_rows = 0
+        self.num_skipped = 0
+        self.existing_keys = self._get_existing_keys() if skip_existing else None
+        self.start_time = time.time()
+        self._next_report = progress_every
+
+    def _get_existing_keys(self):
+        """Return set of unique_on values already in the database."""
+        unique_on = self.model_cls.unique_on
+        if type(unique_on) is not list:
+            raise CancerApiException("Can't skip existing rows without `unique_on` attributes "
+                                     "(i.e. {}).".format(self.model_cls.__name__))
+        columns = [getattr(self.model_cls, attr) for attr in unique_on]
+        return set(tuple(row) for row in self.session.query(*columns))
+
+    def add(self, row):
+        """Add row to the buffer, which is inserted once it
+        reaches the batch size. Returns whether the row was
+        added (i.e. False if it was skipped). Values are converted
+        by the validators of their column (e.g., integers parsed
+        from strings), as for model attributes.
+        """
+        for key, column_type in self.validated_columns:
+            if key in row:
+                row[key] = validators[column_type](row[key])
+        if self.existing_keys is not None:
+            key = tuple(row[attr] for attr in self.model_cls.unique_on)
+            if key in self.existing_keys:
+                self.num_skipped += 1
+                return False
+            self.existing_keys.add(key)
+        if self.assign_ids:
+            row["id"] = self._get_next_id()
+        self.buffer.append(row)
+        if self.batch_size and len(self.buffer) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self, commit=True):
+        """Insert the rows in the buffer and commit, unless commit is
+        disabled (e.g., to commit along with a checkpoint).
+        """
+        if not self.buffer:
+            return
+        for loader in self.depends_on:
+            loader.flush(commit)
+        rows = self.buffer
+        with metrics.timer("loader.flush"):
+            for table in self.tables:
+                table_rows = self._get_table_rows(table, rows)
+                self.session.execute(table.insert(), table_rows)
+            if self.update_summary:
+                mutation_type = self.mapper.polymorphic_identity
+                counts = Counter((row.get("library_id"), mutation_type,
+                                  get_subtype(mutation_type, row)) for row in rows)
+                update_mutation_summary(self.session, counts)
+            if commit:
+                self.session.commit()
+        self.num_rows += len(rows)
+        self.buffer = []
+        if metrics.enabled:
+            metrics.count("loader.rows", len(rows))
+            metrics.count("loader.{}.rows".format(self.mapper.local_table.name), len(rows))
+            metrics.maybe_report()
+        if self.progress_every and self.num_rows >= self._next_report:
+            self.log_progress()
+            while self._next_report <= self.num_rows:
+                self._next_report += self.progress_every
+
+    def close(self):
+        """Ensure that the buffer is inserted and log summary."""
+        self.flush()
+        self.log_progress()
+
+    def log_progress(self):
+        """Log the number of rows loaded so far and the throughput."""
+        elapsed = time.time() - self.start_time
+        rate = self.num_rows / elapsed if elapsed > 0 else 0.0
+        message = "Loaded {} rows into {} ({:.0f} rows/s)".format(
+            self.num_rows, self.mapper.local_table.name, rate)
+        if self.num_skipped:
+            message += ", skipped {} existing rows".format(self.num_skipped)
+        logging.info(message)
+
+    def _get_next_id(self):
+        """Return next primary key following the current maximum.
+        The counter is shared by loaders using the same session and
+        base table (e.g., SNV and indel loaders share mutation IDs).
+        The maximum is read again at the start of every batch, such
+        that rows inserted in the meantime (e.g., with the ORM) are
+        accounted for, while keys of buffered rows stay reserved.
+        """
+        next_ids = self.session.info.setdefault("next_ids", {})
+        table = self.tables[0]
+        if table.name not in next_ids or not self.buffer:
+            max_id = self.session.query(func.max(table.c.id)).scalar() or 0
+            next_ids[table.name] = max(next_ids.get(table.name, 0), max_id + 1)
+        next_id = next_ids[table.name]
+        next_ids[table.name] += 1
+        return next_id
+
+    def _get_table_rows(self, table, rows):
+        """Return rows restricted to the columns of the given table.
+        Polymorphic identities are filled in automatically.
+        """
+        polymorphic_on = self.mapper.polymorphic_on
+        table_rows = []
+        for row in rows:
+            table_row = {}
+            for column in table.columns:
+                if column.primary_key and not self.assign_ids:
+                    continue
+                if polymorphic_on is not None and column is polymorphic_on:
+                    table_row[column.key] = self.mapper.polymorphic_identity
+                else:
+                    table_row[column.key] = row.get(column.key)
+            table_rows.append(table_row)
+        return table_rows
+
+
+def load_file(session, infile, library=None, defaults=None, batch_size=10000, processes=None,
+              chunk_size=1000, max_chunks=8, progress_every=100000, checkpoint_name=None):
+    """Load the records of a file (e.g., mutations from a VCF file)
+    using bulk loaders, one per model. Reading and parsing run
+    concurrently with the inserts (see Pipeline), which happen in
+    the calling thread (i.e. the one owning the session), with one
+    transaction per batch. If a library is given, its ID is set on
+    every row. Defaults (dict) fill in missing values (e.g., status).
+    If checkpoint_name is given, progress is committed along with
+    every batch (see Checkpointer), and a load with the same name
+    resumes from its last checkpoint (or is skipped if complete).
+    Returns the loaders by model class.
+    """
+    defaults = dict(defaults or {})
+    if library is not None:
+        defaults["library_id"] = library.id
+    loaders = {}
+    checkpointer = None
+    start_offset = None
+    if checkpoint_name is not None:
+        checkpointer = Checkpointer(session, checkpoint_name, infile.source.filepath,
+                                    batch_size=batch_size)
+        if checkpointer.is_complete:
+            logging.info("Load `{}` is already complete".format(checkpoint_name))
+            return loaders
+        start_offset = checkpointer.offset
+    pipeline = Pipeline(infile, processes=processes, chunk_size=chunk_size,
+                        max_chunks=max_chunks, start_offset=start_offset)
+    for chunk in pipeline.iterchunks():
+        for record in chunk:
+            model_cls = record.get_model_cls()
+            loader = loaders.get(model_cls)
+            if loader is None:
+                loader = BulkLoader(session, model_cls, batch_size=batch_size,
+                                    progress_every=progress_every)
+                loaders[model_cls] = loader
+                if checkpointer is not None:
+                    checkpointer.add_loader(loader)
+            row = record.to_dict()
+            for attr, value in defaults.iteritems():
+                if row.get(attr) is None:
+                    row[attr] = value
+            loader.add(row)
+        # Chunks are only checkpointed as a whole
+        if checkpointer is not None:
+            checkpointer.maybe_commit(pipeline.offset)
+    if checkpointer is not None:
+        checkpointer.commit(pipeline.offset, is_complete=True)
+    for loader in loaders.itervalues():
+        loader.close()
+    logging.info("Waited {:.1f}s for reading and {:.1f}s for parsing".format(
+        pipeline.wait_times["read"], pipeline.wait_times["parse"]))
+    return loaders
+
+
+def load_annotation_file(session, annotation_file, batch_size=10000, skip_existing=False,
+                         progress_every=100000, checkpoint_name=None):
+    """Load genes, transcripts, exons and proteins from a GTF or GFF3 file
+    (see GtfFile and Gff3File) using bulk loaders. The file is
+    streamed and only the features of the current transcript are
+    kept in memory, which assumes that they follow the transcript
+    (as in Ensembl and GENCODE files). CDS features are used to
+    calculate the coding region of transcripts, exon phases and
+    protein CDS lengths (including the stop codon).
+    If checkpoint_name is given, progress is committed along with
+    the rows, between transcripts (see `load_file`).
+    Returns the loaders for genes, transcripts, exons and proteins.
+    """
+    parser = annotation_file.source.parser
+    loader_kwargs = {"batch_size": batch_size, "progress_every": progress_every,
+                     "assign_ids": True}
+    gene_loader = BulkLoader(session, Gene, skip_existing=skip_existing, **loader_kwargs)
+    transcript_loader = BulkLoader(session, Transcript, skip_existing=skip_existing,
+                                   depends_on=[gene_loader], **loader_kwargs)
+    # Exons are shared between transcripts, so duplicates are always skipped
+    exon_loader = BulkLoader(session, Exon, skip_existing=True,
+                             depends_on=[gene_loader, transcript_loader], **loader_kwargs)
+    protein_loader = BulkLoader(session, Protein, skip_existing=skip_existing,
+                                depends_on=[gene_loader, transcript_loader], **loader_kwargs)
+    loaders = (gene_loader, transcript_loader, exon_loader, protein_loader)
+    checkpointer = None
+    if checkpoint_name is not None:
+        checkpointer = Checkpointer(session, checkpoint_name, annotation_file.source.filepath,
+                                    loaders, batch_size)
+        if checkpointer.is_complete:
+            logging.info("Load `{}` is already complete".format(checkpoint_name))
+            return loaders
+    # Existing rows (e.g., loaded before the checkpoint) are skipped, so their IDs need to be known
+    use_id_maps = skip_existing or (checkpointer is not None and checkpointer.offset > 0)
+    gene_ids = get_id_map(session, Gene, "gene_ensembl_id") if use_id_maps else {}
+    transcript_ids = get_id_map(session, Transcript, "transcript_ensembl_id") \
+        if use_id_maps else {}
+    if checkpointer is None:
+        lines = ((line, None) for line in annotation_file.iterlines())
+        offset = None
+    else:
+        lines = annotation_file.iteroffsets(checkpointer.offset)
+        offset = checkpointer.offset
+    transcript_attrs, features = None, []
+    for line, end_offset in lines:
+        line_offset, offset = offset, end_offset
+        attrs = parser.basic_parse(line)
+        if attrs is None:
+            continue
+        feature_type = attrs["feature_type"]
+        if feature_type == "gene":
+            row = {
+                "gene_ensembl_id": attrs["gene_id"],
+                "gene_symbol": attrs["gene_name"],
+                "biotype": attrs["biotype"],
+                "chrom": attrs["chrom"],
+                "start_pos": attrs["start_pos"],
+                "end_pos": attrs["end_pos"],
+                "length": attrs["end_pos"] - attrs["start_pos"] + 1
+            }
+            if gene_loader.add(row):
+                gene_ids[row["gene_ensembl_id"]] = row["id"]
+            continue
+        # Features of the previous transcript are loaded once a new one starts
+        if feature_type == "transcript" or transcript_attrs is None or \
+                attrs["transcript_id"] != transcript_attrs["transcript_id"]:
+            if transcript_attrs is not None:
+                _load_transcript(transcript_attrs, features, gene_ids, transcript_ids,
+                                 *loaders[1:])
+                # Every line before the current one has been added to the loaders
+                if checkpointer is not None:
+                    checkpointer.maybe_commit(line_offset)
+            transcript_attrs, features = attrs, []
+        if feature_type != "transcript":
+            features.append(attrs)
+    if transcript_attrs is not None:
+        _load_transcript(transcript_attrs, features, gene_ids, transcript_ids, *loaders[1:])
+    if checkpointer is not None:
+        checkpointer.commit(offset, is_complete=True)
+    for loader in loaders:
+        loader.close()
+    return loaders
+
+
+def _load_transcript(transcript_attrs, features, gene_ids, transcript_ids, transcript_loader,
+                     exon_loader, protein_loader):
+    """Add rows for a transcript, its exons and its protein to the loaders.
+    Transcript coordinates, coding region and exon phases are
+    calculated in the direction of transcription.
+    """
+    gene_id = gene_ids.get(transcript_attrs.get("gene_id"))
+    exons = [f for f in features if f["feature_type"] == "exon"]
+    if gene_id is None or not exons:
+        return
+    is_reverse = exons[0]["strand"] == "-"
+    exons.sort(key=lambda f: f["start_pos"], reverse=is_reverse)
+    cds_features = [f for f in features if f["feature_type"] == "cds"]
+    exon_rows = []
+    transcript_pos = 1
+    cds_start_pos, cds_end_pos = None, None
+    for exon in exons:
+        length = exon["end_pos"] - exon["start_pos"] + 1
+        exon_row = {
+            "exon_ensembl_id": exon["exon_id"],
+            "gene_id": gene_id,
+            "transcript_start_pos": transcript_pos,
+            "transcript_end_pos": transcript_pos + length - 1,
+            "genome_start_pos": exon["start_pos"],
+            "genome_end_pos": exon["end_pos"],
+            "length": length,
+            "strand": "-1" if is_reverse else "1",
+            "phase": "-1",
+            "end_phase": "-1"
+        }
+        coding = [f for f in cds_features if exon["start_pos"] <= f["start_pos"] and
+                  f["end_pos"] <= exon["end_pos"]]
+        if coding:
+            coding_start = min(f["start_pos"] for f in coding)
+            coding_end = max(f["end_pos"] for f in coding)
+            # Offsets of the coding region in the direction of transcription
+            if is_reverse:
+                first_cds = max(coding, key=lambda f: f["end_pos"])
+                offsets = (exon["end_pos"] - coding_end, exon["end_pos"] - coding_start)
+            else:
+                first_cds = min(coding, key=lambda f: f["start_pos"])
+                offsets = (coding_start - exon["start_pos"], coding_end - exon["start_pos"])
+            if cds_start_pos is None:
+                cds_start_pos = transcript_pos + offsets[0]
+            cds_end_pos = transcript_pos + offsets[1]
+            # GTF frames count the bases before the next codon,
+            # whereas phases count the bases from the previous one
+            frame = first_cds["frame"]
+            start_phase = (3 - int(frame)) % 3 if frame.isdigit() else 0
+            if offsets[0] == 0:
+                exon_row["phase"] = str(start_phase)
+            if offsets[1] == length - 1:
+                coding_length = coding_end - coding_start + 1
+                exon_row["end_phase"] = str((start_phase + coding_length) % 3)
+        exon_rows.append(exon_row)
+        transcript_pos += length
+    transcript_row = {
+        "transcript_ensembl_id": transcript_attrs["transcript_id"],
+        "gene_id": gene_id,
+        "cds_start_pos": cds_start_pos,
+        "cds_end_pos": cds_end_pos,
+        "length": transcript_pos - 1
+    }
+    if transcript_loader.add(transcript_row):
+        transcript_id = transcript_row["id"]
+    else:
+        transcript_id = transcript_ids.get(transcript_row["transcript_ensembl_id"])
+    for exon_row in exon_rows:
+        exon_row["transcript_id"] = transcript_id
+        exon_loader.add(exon_row)
+    protein_ids = [f["protein_id"] for f in cds_features if f["protein_id"]]
+    if protein_ids and transcript_id is not None:
+        protein_loader.add({
+            "protein_ensembl_id": protein_ids[0],
+            "cds_length": sum(f["end_pos"] - f["start_pos"] + 1 for f in cds_features),
+            "gene_id": gene_id,
+            "transcript_id": transcript_id
+        })
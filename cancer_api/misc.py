@@ -6,7 +6,7 @@ elsewhere for the moment. Eventually, another submodule
 might be added and classes herein moved there.
 """
 
-from base import CancerApiObject
+from core import CancerApiObject
 
 
 class GenomicInterval(CancerApiObject):
@@ -29,6 +29,12 @@ class GenomicInterval(CancerApiObject):
     def length(self):
         return self.end_pos - self.start_pos + 1
 
+    def get_locus(self):
+        return (self.chrom, self.start_pos)
+
+    def get_interval(self):
+        return self
+
     def is_overlap(self, other, margin=0):
         """Return whether two genomic intervals overlap.
         """
@@ -69,3 +75,31 @@ class RawRead(CancerApiObject):
         self.seq = seq
         self.strand = strand
         self.qual = qual
+
+
+class StructuralVariationCluster(CancerApiObject):
+    """Simple class for representing consensus structural
+    variations obtained by clustering similar SV calls.
+    """
+
+    unique_on = ["chrom1", "pos1", "strand1", "chrom2", "pos2", "strand2", "sv_type"]
+
+    def __init__(self, chrom1, pos1, strand1, chrom2, pos2, strand2, sv_type, support=1,
+                 sources=None):
+        self.chrom1 = str(chrom1)
+        self.pos1 = int(pos1)
+        self.strand1 = strand1
+        self.chrom2 = str(chrom2)
+        self.pos2 = int(pos2)
+        self.strand2 = strand2
+        self.sv_type = sv_type
+        self.support = support
+        self.sources = sources if sources is not None else []
+
+    def get_locus(self):
+        return (self.chrom1, self.pos1)
+
+    def get_interval(self):
+        if self.chrom1 == self.chrom2:
+            return GenomicInterval(self.chrom1, self.pos1, self.pos2)
+        return GenomicInterval(self.chrom1, self.pos1)
@@ -2,16 +2,19 @@
 mutations.py
 ============
 This submodule contains all classes representing mutations
-in cancer, notably SNVs, indels, CNVs and SVs.
+in cancer, notably SNVs, indels, CNVs and SVs. Methods that
+don't depend on the database are defined in mixins shared with
+the detached records (see records).
 """
 
 from sqlalchemy import Column, Integer, String, Text, Float, Enum, ForeignKey
 from sqlalchemy.orm import relationship
 import base
-import misc
+from records import MutationMixin, SingleNucleotideVariantMixin, IndelMixin, \
+    StructuralVariationMixin, CopyNumberVariationMixin
 
 
-class Mutation(base.Base):
+class Mutation(MutationMixin, base.Base):
     """Base class for all mutations"""
 
     id = Column(Integer, primary_key=True)
@@ -23,13 +26,8 @@ class Mutation(base.Base):
 
     library = relationship("Library", backref="mutations")
 
-    def is_overlap(self, chrom, pos1, pos2=None, margin=0):
-        """Return whether given position overlaps with mutation.
-        """
-        raise NotImplementedError()
-
 
-class SingleNucleotideVariant(Mutation):
+class SingleNucleotideVariant(SingleNucleotideVariantMixin, Mutation):
     """Model for single nucleotide variants"""
 
     id = Column(Integer, ForeignKey("mutation.id"), primary_key=True)
@@ -44,15 +42,8 @@ class SingleNucleotideVariant(Mutation):
 
     mutation = relationship("Mutation", backref="snv")
 
-    def is_overlap(self, chrom, pos1, pos2=None, margin=0):
-        """Return whether given position overlaps with SNV.
-        """
-        snv_interval = misc.GenomicInterval(self.chrom, self.pos)
-        query_interval = misc.GenomicInterval(chrom, pos1, pos2)
-        return snv_interval.is_overlap(query_interval, margin)
-
 
-class Indel(Mutation):
+class Indel(IndelMixin, Mutation):
     """Model for indels"""
 
     id = Column(Integer, ForeignKey("mutation.id"), primary_key=True)
@@ -68,7 +59,7 @@ class Indel(Mutation):
     mutation = relationship("Mutation", backref="indel")
 
 
-class StructuralVariation(Mutation):
+class StructuralVariation(StructuralVariationMixin, Mutation):
     """Model for structural variations"""
 
     id = Column(Integer, ForeignKey("mutation.id"), primary_key=True)
@@ -109,25 +100,8 @@ class StructuralVariation(Mutation):
         # Return effects
         return effects
 
-    def is_overlap(self, chrom, pos1, pos2=None, margin=0):
-        """Return whether the given position overlap with
-        the structural variation.
-        The margin defines how close the events can be to
-        be considered overlapping (e.g., within 10 bp).
-        """
-        query_interval = misc.GenomicInterval(chrom, pos1, pos2)
-        if self.chrom1 == self.chrom2:
-            sv_interval = misc.GenomicInterval(self.chrom1, self.pos1, self.pos2)
-            is_overlap = sv_interval.is_overlap(query_interval, margin)
-        else:
-            sv_interval1 = misc.GenomicInterval(self.chrom1, self.pos1)
-            sv_interval2 = misc.GenomicInterval(self.chrom2, self.pos2)
-            is_overlap = (sv_interval1.is_overlap(query_interval, margin) or
-                          sv_interval2.is_overlap(query_interval, margin))
-        return is_overlap
-
-
-class CopyNumberVariation(Mutation):
+
+class CopyNumberVariation(CopyNumberVariationMixin, Mutation):
     """Model for copy number variations"""
 
     id = Column(Integer, ForeignKey("mutation.id"), primary_key=True)
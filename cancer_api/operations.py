@@ -0,0 +1,631 @@
+"""
+operations.py
+=============
+This submodule contains operations that span one or more
+cancer_api files, such as de-duplicating mutations across
+samples or callers, clustering structural variations and
+interval operations (e.g., intersect, closest).
+"""
+
+import os
+import heapq
+import shutil
+import tempfile
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, Counter
+from core import BaseFile
+from exceptions import CancerApiException
+from utils import open_file, ChromosomeOrder
+from records import Record, SingleNucleotideVariantMixin, IndelMixin, StructuralVariationMixin, \
+    SingleNucleotideVariantRecord, IndelRecord
+from misc import StructuralVariationCluster
+from files import BedpeFile
+
+
+def _check_files(files):
+    """Return files as a list after ensuring that
+    they are all cancer_api file objects.
+    """
+    files = list(files)
+    for other_file in files:
+        if not isinstance(other_file, BaseFile):
+            raise CancerApiException("Operations only support cancer_api file objects.")
+    return files
+
+
+# ============================================================================================== #
+# De-duplication
+# ============================================================================================== #
+
+
+def iter_unique(files, num_partitions=1, min_support=1, tmp_dir=None):
+    """Iterate over the unique objects found across cancer_api files.
+    Objects are compared using their keys (see `get_key`).
+    Yields (obj, support) tuples, where support is the list of
+    indices of the files in which the object was found.
+
+    If num_partitions is greater than one, lines are first spilled
+    to temporary partition files according to the hash of their
+    object's key. Only one partition is held in memory at a time,
+    which bounds memory usage for very large inputs.
+    """
+    files = _check_files(files)
+    if num_partitions <= 1:
+        tagged_objs = _iter_tagged_objs(files)
+        for obj, support in _dedup_tagged_objs(tagged_objs, min_support):
+            yield obj, support
+        return
+    tmp_dir = tempfile.mkdtemp(prefix="cancer_api_dedup_", dir=tmp_dir)
+    try:
+        partition_paths = [os.path.join(tmp_dir, "partition_{}.txt".format(i))
+                           for i in range(num_partitions)]
+        _write_partitions(files, partition_paths)
+        for partition_path in partition_paths:
+            tagged_objs = _iter_partition(files, partition_path)
+            for obj, support in _dedup_tagged_objs(tagged_objs, min_support):
+                yield obj, support
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def _iter_tagged_objs(files):
+    """Iterate over (file index, obj) tuples for every file."""
+    for index, other_file in enumerate(files):
+        for obj in other_file:
+            yield index, obj
+
+
+def _write_partitions(files, partition_paths):
+    """Spill the lines of every file into partition files
+    according to the hash of their object's key. Each line
+    is prefixed by the index of the file it came from.
+    """
+    num_partitions = len(partition_paths)
+    partitions = [open_file(path, "w") for path in partition_paths]
+    try:
+        for index, other_file in enumerate(files):
+            for line, obj in other_file.iterlines(include_obj=True):
+                if not line.endswith("\n"):
+                    line += "\n"
+                partition = partitions[hash(obj.get_key()) % num_partitions]
+                partition.write("{}\t{}".format(index, line))
+    finally:
+        for partition in partitions:
+            partition.close()
+
+
+def _iter_partition(files, partition_path):
+    """Iterate over (file index, obj) tuples from a partition
+    file, re-parsing lines with their original file's parser.
+    """
+    with open_file(partition_path) as partition:
+        for line in partition:
+            index, _, line = line.partition("\t")
+            index = int(index)
+            obj = files[index].source.parser.parse(line)
+            if obj:
+                yield index, obj
+
+
+def _dedup_tagged_objs(tagged_objs, min_support):
+    """De-duplicate (file index, obj) tuples in memory.
+    Yields (obj, support) tuples in the order in which
+    objects were first encountered.
+    """
+    unique_objs = OrderedDict()
+    for index, obj in tagged_objs:
+        key = obj.get_key()
+        if key not in unique_objs:
+            unique_objs[key] = (obj, [index])
+        else:
+            support = unique_objs[key][1]
+            if support[-1] != index:
+                support.append(index)
+    for obj, support in unique_objs.itervalues():
+        if len(support) >= min_support:
+            yield obj, support
+
+
+# ============================================================================================== #
+# Structural Variation Clustering
+# ============================================================================================== #
+
+
+def iter_sv_clusters(files, margin=10, buffer_size=1000000, tmp_dir=None):
+    """Cluster structural variations from cancer_api files into
+    consensus events. A call joins a cluster if both of its
+    breakpoints lie within `margin` bp of the first call of the
+    cluster (in sorted order), they have the same SV type and their
+    strands agree (when known). Anchoring the window on the first
+    call bounds the span of clusters, such that chains of nearby
+    calls don't drift into one large cluster.
+    Calls are sorted by breakpoints and swept in order, such that
+    each call is only compared to the clusters within its window.
+    Calls are sorted with an external merge sort, where sorted runs
+    of buffer_size calls are spilled to temporary files.
+    Yields StructuralVariationCluster instances.
+    """
+    files = _check_files(files)
+    tmp_dir = tempfile.mkdtemp(prefix="cancer_api_svs_", dir=tmp_dir)
+    try:
+        calls = _iter_sorted_sv_calls(files, buffer_size, tmp_dir)
+        for cluster in _iter_swept_sv_clusters(calls, margin):
+            yield cluster
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def _iter_sv_calls(files):
+    """Iterate over compact tuples of SV calls with canonically
+    ordered breakpoints, where missing strands (see `get_key`) and SV
+    types are empty strings, such that tuples survive a round-trip
+    to disk.
+    """
+    for index, other_file in enumerate(files):
+        for sv in other_file:
+            if not isinstance(sv, StructuralVariationMixin):
+                continue
+            _, chrom1, pos1, strand1, chrom2, pos2, strand2, sv_type = sv.get_key()
+            yield (chrom1, chrom2, pos1, pos2, strand1, strand2, sv_type or "", index)
+
+
+def _iter_sorted_sv_calls(files, buffer_size, tmp_dir):
+    """Iterate over the SV calls of every file in sorted order
+    (see `iter_sv_clusters`).
+    """
+    run_paths = []
+    buffer = []
+    for call in _iter_sv_calls(files):
+        buffer.append(call)
+        if len(buffer) >= buffer_size:
+            run_paths.append(_write_sv_run(buffer, tmp_dir))
+            buffer = []
+    buffer.sort()
+    runs = [_read_sv_run(path) for path in run_paths]
+    return heapq.merge(iter(buffer), *runs)
+
+
+def _write_sv_run(buffer, tmp_dir):
+    """Sort buffer of SV calls and write them to a temporary
+    file. Returns the file path.
+    """
+    buffer.sort()
+    fd, path = tempfile.mkstemp(suffix=".txt", prefix="run_", dir=tmp_dir)
+    os.close(fd)
+    with open_file(path, "w") as run_file:
+        for call in buffer:
+            run_file.write("\t".join(str(value) for value in call) + "\n")
+    return path
+
+
+def _read_sv_run(path):
+    """Iterate over SV calls in temporary file."""
+    with open_file(path) as run_file:
+        for line in run_file:
+            chrom1, chrom2, pos1, pos2, strand1, strand2, sv_type, index = \
+                line.rstrip("\n").split("\t")
+            yield (chrom1, chrom2, int(pos1), int(pos2), strand1, strand2, sv_type, int(index))
+
+
+def _iter_swept_sv_clusters(calls, margin):
+    """Sweep over sorted SV calls, closing clusters once they fall
+    out of the window. Yields StructuralVariationCluster instances.
+    """
+    active_clusters = []
+    current_chroms = None
+    for chrom1, chrom2, pos1, pos2, strand1, strand2, sv_type, index in calls:
+        if (chrom1, chrom2) != current_chroms:
+            for cluster in active_clusters:
+                yield cluster.get_consensus()
+            active_clusters = []
+            current_chroms = (chrom1, chrom2)
+        still_active = []
+        for cluster in active_clusters:
+            if cluster.first_pos1 + margin < pos1:
+                yield cluster.get_consensus()
+            else:
+                still_active.append(cluster)
+        active_clusters = still_active
+        # Add call to first compatible cluster, or start a new one
+        for cluster in active_clusters:
+            if cluster.is_compatible(pos2, strand1, strand2, sv_type, margin):
+                cluster.add_call(pos1, pos2, strand1, strand2, index)
+                break
+        else:
+            cluster = _SvClusterBuilder(chrom1, chrom2, sv_type)
+            cluster.add_call(pos1, pos2, strand1, strand2, index)
+            active_clusters.append(cluster)
+    for cluster in active_clusters:
+        yield cluster.get_consensus()
+
+
+def merge_svs(filepath, files, margin=10, buffersize=10000, tmp_dir=None):
+    """Cluster structural variations from cancer_api files
+    (see `iter_sv_clusters`) and write the consensus events
+    to a new BEDPE file. Returns the BedpeFile instance.
+    """
+    bedpe_file = BedpeFile.new(filepath, buffersize=buffersize)
+    for cluster in iter_sv_clusters(files, margin, tmp_dir=tmp_dir):
+        bedpe_file.add_obj(cluster)
+    bedpe_file.close()
+    return bedpe_file
+
+
+class _SvClusterBuilder(object):
+    """Accumulate SV calls belonging to the same cluster."""
+
+    def __init__(self, chrom1, chrom2, sv_type):
+        self.chrom1 = chrom1
+        self.chrom2 = chrom2
+        self.sv_type = sv_type
+        self.positions1 = []
+        self.positions2 = []
+        self.strands1 = Counter()
+        self.strands2 = Counter()
+        self.sources = set()
+        self.first_pos1 = None
+        self.first_pos2 = None
+
+    def is_compatible(self, pos2, strand1, strand2, sv_type, margin):
+        """Return whether a call can be added to the cluster, i.e. its
+        second breakpoint is within the margin of the first call. The
+        first breakpoint is assumed to be within the window already.
+        """
+        if sv_type != self.sv_type:
+            return False
+        if abs(pos2 - self.first_pos2) > margin:
+            return False
+        for strand, strands in ((strand1, self.strands1), (strand2, self.strands2)):
+            if strand and strands and strand not in strands:
+                return False
+        return True
+
+    def add_call(self, pos1, pos2, strand1, strand2, index):
+        """Add call to cluster. Calls are added in order of pos1."""
+        if not self.positions1:
+            self.first_pos1 = pos1
+            self.first_pos2 = pos2
+        self.positions1.append(pos1)
+        self.positions2.append(pos2)
+        if strand1:
+            self.strands1[strand1] += 1
+        if strand2:
+            self.strands2[strand2] += 1
+        self.sources.add(index)
+
+    def get_consensus(self):
+        """Return StructuralVariationCluster using median positions
+        and the most common strands.
+        """
+        num_calls = len(self.positions1)
+        positions2 = sorted(self.positions2)
+        strand1 = self.strands1.most_common(1)[0][0] if self.strands1 else None
+        strand2 = self.strands2.most_common(1)[0][0] if self.strands2 else None
+        return StructuralVariationCluster(
+            chrom1=self.chrom1, pos1=self.positions1[(num_calls - 1) // 2], strand1=strand1,
+            chrom2=self.chrom2, pos2=positions2[(num_calls - 1) // 2], strand2=strand2,
+            sv_type=self.sv_type or None, support=num_calls, sources=sorted(self.sources))
+
+
+# ============================================================================================== #
+# Interval Operations
+# ============================================================================================== #
+
+
+def intersect(a_file, b_file, margin=0, is_sorted=False, chrom_order=None):
+    """Iterate over the objects in a_file that overlap with
+    at least one object in b_file (within `margin` bp).
+    If both files are sorted by chrom and pos (according to
+    `chrom_order`), they are streamed with a sweep line.
+    Otherwise, the objects in b_file are indexed in memory.
+    Yields objects from a_file.
+    """
+    for a_obj, b_objs in _iter_overlaps(a_file, b_file, margin, is_sorted, chrom_order):
+        if b_objs:
+            yield a_obj
+
+
+def subtract(a_file, b_file, margin=0, is_sorted=False, chrom_order=None):
+    """Iterate over the objects in a_file that don't overlap
+    with any object in b_file (within `margin` bp).
+    See `intersect` for details. Yields objects from a_file.
+    """
+    for a_obj, b_objs in _iter_overlaps(a_file, b_file, margin, is_sorted, chrom_order):
+        if not b_objs:
+            yield a_obj
+
+
+def window(a_file, b_file, window_size=1000, is_sorted=False, chrom_order=None):
+    """Iterate over every pair of objects from a_file and b_file
+    that are within `window_size` bp of each other.
+    See `intersect` for details. Yields (a_obj, b_obj) tuples.
+    """
+    overlaps = _iter_overlaps(a_file, b_file, window_size, is_sorted, chrom_order)
+    for a_obj, b_objs in overlaps:
+        for b_obj in b_objs:
+            yield a_obj, b_obj
+
+
+def closest(a_file, b_file, is_sorted=False, chrom_order=None):
+    """Iterate over objects in a_file along with the closest
+    object in b_file (on the same chromosome) and the distance
+    between them (zero if they overlap). If there is no object
+    on the same chromosome, the closest object and distance
+    are None. See `intersect` for details.
+    Yields (a_obj, b_obj, distance) tuples.
+    """
+    a_file, b_file = _check_files([a_file, b_file])
+    if is_sorted:
+        results = _iter_closest_sorted(a_file, b_file, ChromosomeOrder.get(chrom_order))
+    else:
+        results = _IntervalIndex(b_file).iter_closest(a_file)
+    for a_obj, b_obj, distance in results:
+        yield a_obj, b_obj, distance
+
+
+def write_results(outfile, results):
+    """Add the results of an operation to a cancer_api file
+    (e.g., created with the `new` method), which must support
+    `obj_to_str`. For operations yielding tuples, the first
+    object (from a_file) is added. Returns the number of
+    objects added.
+    """
+    num_objs = 0
+    for result in results:
+        obj = result[0] if isinstance(result, tuple) else result
+        outfile.add_obj(obj)
+        num_objs += 1
+    outfile.close()
+    return num_objs
+
+
+def _iter_bounds(other_file, chrom_order=None, check_order=False):
+    """Iterate over (chrom key, start, end, obj) tuples for the
+    objects in a file. Raises an exception if check_order is
+    enabled and the file isn't sorted.
+    """
+    last_bounds = None
+    for obj in other_file:
+        interval = obj.get_interval()
+        chrom_key = chrom_order.key(interval.chrom) if chrom_order else interval.chrom
+        bounds = (chrom_key, interval.start_pos, interval.end_pos, obj)
+        if check_order:
+            if last_bounds is not None and bounds[:2] < last_bounds[:2]:
+                raise CancerApiException("File isn't sorted by chrom and pos: {}".format(
+                    other_file.source.filepath))
+            last_bounds = bounds
+        yield bounds
+
+
+def _iter_overlaps(a_file, b_file, margin, is_sorted, chrom_order):
+    """Iterate over (a_obj, overlapping b_objs) tuples."""
+    a_file, b_file = _check_files([a_file, b_file])
+    if is_sorted:
+        results = _iter_overlaps_sorted(a_file, b_file, margin, ChromosomeOrder.get(chrom_order))
+    else:
+        results = _IntervalIndex(b_file).iter_overlaps(a_file, margin)
+    for a_obj, b_objs in results:
+        yield a_obj, b_objs
+
+
+def _iter_overlaps_sorted(a_file, b_file, margin, chrom_order):
+    """Sweep over two sorted files, keeping in memory only the
+    objects from b_file that might overlap with the current
+    object from a_file. Yields (a_obj, overlapping b_objs).
+    """
+    b_bounds = _iter_bounds(b_file, chrom_order, check_order=True)
+    next_b = next(b_bounds, None)
+    active = []
+    for chrom, start, end, a_obj in _iter_bounds(a_file, chrom_order, check_order=True):
+        # Add objects starting before the end of the current object
+        while next_b is not None and next_b[:2] <= (chrom, end + margin):
+            active.append(next_b)
+            next_b = next(b_bounds, None)
+        # Remove objects ending before the start of the current object,
+        # given that they can't overlap with any of the following objects
+        active = [b for b in active if b[0] == chrom and b[2] + margin >= start]
+        b_objs = [b[3] for b in active if b[1] - margin <= end]
+        yield a_obj, b_objs
+
+
+def _iter_closest_sorted(a_file, b_file, chrom_order):
+    """Sweep over two sorted files to find the closest object
+    in b_file for every object in a_file.
+    Yields (a_obj, b_obj, distance) tuples.
+    """
+    b_bounds = _iter_bounds(b_file, chrom_order, check_order=True)
+    next_b = next(b_bounds, None)
+    active = []
+    upstream = None
+    for chrom, start, end, a_obj in _iter_bounds(a_file, chrom_order, check_order=True):
+        while next_b is not None and next_b[:2] <= (chrom, end):
+            active.append(next_b)
+            next_b = next(b_bounds, None)
+        # Keep track of the object ending closest upstream
+        still_active = []
+        for b in active:
+            if b[0] != chrom:
+                continue
+            elif b[2] < start:
+                if upstream is None or upstream[0] != chrom or b[2] > upstream[2]:
+                    upstream = b
+            else:
+                still_active.append(b)
+        active = still_active
+        if upstream is not None and upstream[0] != chrom:
+            upstream = None
+        if active:
+            yield a_obj, active[0][3], 0
+            continue
+        downstream = next_b if next_b is not None and next_b[0] == chrom else None
+        yield (a_obj,) + _pick_closest(start, end, upstream, downstream)
+
+
+def _pick_closest(start, end, upstream, downstream):
+    """Return (b_obj, distance) tuple for the closest of the
+    upstream and downstream bounds (either can be None).
+    """
+    candidates = []
+    if upstream is not None:
+        candidates.append((start - upstream[2], upstream[3]))
+    if downstream is not None:
+        candidates.append((downstream[1] - end, downstream[3]))
+    if not candidates:
+        return (None, None)
+    distance, b_obj = min(candidates, key=lambda c: c[0])
+    return (b_obj, distance)
+
+
+class _IntervalIndex(object):
+    """In-memory index of the objects in a file, which is
+    used for interval operations on unsorted files.
+    Objects are sorted by start position for each chromosome.
+    """
+
+    def __init__(self, other_file):
+        by_chrom = {}
+        for chrom, start, end, obj in _iter_bounds(other_file):
+            by_chrom.setdefault(chrom, []).append((start, end, obj))
+        self.starts = {}
+        self.entries = {}
+        self.max_lengths = {}
+        self.max_ends = {}
+        for chrom, entries in by_chrom.iteritems():
+            entries.sort(key=lambda entry: entry[:2])
+            self.entries[chrom] = entries
+            self.starts[chrom] = [entry[0] for entry in entries]
+            self.max_lengths[chrom] = max(entry[1] - entry[0] for entry in entries)
+            # Running maximum of end positions (with index) for finding upstream objects
+            max_ends = []
+            for index, entry in enumerate(entries):
+                if not max_ends or entry[1] > max_ends[-1][0]:
+                    max_ends.append((entry[1], index))
+                else:
+                    max_ends.append(max_ends[-1])
+            self.max_ends[chrom] = max_ends
+
+    def find_overlaps(self, chrom, start, end, margin=0):
+        """Return objects overlapping with the given interval."""
+        if chrom not in self.entries:
+            return []
+        entries = self.entries[chrom]
+        starts = self.starts[chrom]
+        first = bisect_left(starts, start - margin - self.max_lengths[chrom])
+        last = bisect_right(starts, end + margin)
+        return [entry[2] for entry in entries[first:last]
+                if entry[1] + margin >= start and entry[0] - margin <= end]
+
+    def iter_overlaps(self, a_file, margin=0):
+        """Yields (a_obj, overlapping b_objs) tuples."""
+        for chrom, start, end, a_obj in _iter_bounds(a_file):
+            yield a_obj, self.find_overlaps(chrom, start, end, margin)
+
+    def iter_closest(self, a_file):
+        """Yields (a_obj, b_obj, distance) tuples."""
+        for chrom, start, end, a_obj in _iter_bounds(a_file):
+            b_objs = self.find_overlaps(chrom, start, end)
+            if b_objs:
+                yield a_obj, b_objs[0], 0
+                continue
+            upstream, downstream = None, None
+            if chrom in self.entries:
+                entries = self.entries[chrom]
+                index = bisect_right(self.starts[chrom], end)
+                if index < len(entries):
+                    downstream = (chrom,) + entries[index]
+                if index > 0:
+                    # No overlap, so every object starting before has ended before
+                    max_end, max_index = self.max_ends[chrom][index - 1]
+                    upstream = (chrom,) + entries[max_index]
+            yield (a_obj,) + _pick_closest(start, end, upstream, downstream)
+
+
+# ============================================================================================== #
+# Normalization
+# ============================================================================================== #
+
+
+# Characters found in symbolic or missing alleles (e.g., <DEL>, *, .)
+SYMBOLIC_ALLELE_CHARS = set("<>[]*.")
+
+
+def normalize_alleles(chrom, pos, ref_allele, alt_allele, reference=None):
+    """Return normalized (pos, ref_allele, alt_allele) tuple for a
+    single ALT allele. Bases shared by both alleles are trimmed,
+    keeping one leading (anchor) base for indels as in VCF files.
+    If a reference is given (i.e. any object with a `fetch(chrom,
+    start, end)` method, such as FastaFile), indels are also
+    left-aligned, i.e. shifted to their leftmost equivalent position.
+    """
+    ref_allele, alt_allele = ref_allele.upper(), alt_allele.upper()
+    if ref_allele == alt_allele:
+        return pos, ref_allele, alt_allele
+    if reference is not None:
+        # Trim shared last bases, extending alleles to the left once one is empty
+        while True:
+            if ref_allele and alt_allele and ref_allele[-1] == alt_allele[-1]:
+                ref_allele, alt_allele = ref_allele[:-1], alt_allele[:-1]
+            elif (not ref_allele or not alt_allele) and pos > 1:
+                base = reference.fetch(chrom, pos - 1, pos - 1).upper()
+                ref_allele, alt_allele = base + ref_allele, base + alt_allele
+                pos -= 1
+            else:
+                break
+    else:
+        while len(ref_allele) > 1 and len(alt_allele) > 1 and ref_allele[-1] == alt_allele[-1]:
+            ref_allele, alt_allele = ref_allele[:-1], alt_allele[:-1]
+    while len(ref_allele) > 1 and len(alt_allele) > 1 and ref_allele[0] == alt_allele[0]:
+        ref_allele, alt_allele = ref_allele[1:], alt_allele[1:]
+        pos += 1
+    return pos, ref_allele, alt_allele
+
+
+def normalize(mutation, reference=None):
+    """Return list of normalized mutations for an SNV or indel,
+    i.e. one per ALT allele for multi-allelic records (see
+    `normalize_alleles`). The mutation itself is returned if it's
+    already normalized, as are other objects and symbolic alleles.
+    """
+    if not isinstance(mutation, (SingleNucleotideVariantMixin, IndelMixin)):
+        return [mutation]
+    ref_allele, alt_allele = mutation.ref_allele, mutation.alt_allele
+    # Fast path for (most) SNVs
+    if len(ref_allele) == 1 and len(alt_allele) == 1 and ref_allele.isupper() and \
+            alt_allele.isupper():
+        return [mutation]
+    # Records yield records and models yield models
+    if isinstance(mutation, Record):
+        snv_cls, indel_cls = SingleNucleotideVariantRecord, IndelRecord
+    else:
+        from mutations import SingleNucleotideVariant as snv_cls, Indel as indel_cls
+    pos = int(mutation.pos)
+    mutations = []
+    for alt_allele in alt_allele.split(","):
+        if SYMBOLIC_ALLELE_CHARS.intersection(alt_allele):
+            new_attrs = (pos, ref_allele, alt_allele)
+        else:
+            new_attrs = normalize_alleles(mutation.chrom, pos, ref_allele, alt_allele, reference)
+        new_pos, new_ref_allele, new_alt_allele = new_attrs
+        if len(new_ref_allele) == 1 and len(new_alt_allele) == 1:
+            new_cls = snv_cls
+        else:
+            new_cls = indel_cls
+        if new_attrs == (pos, mutation.ref_allele, mutation.alt_allele) and \
+                new_cls is type(mutation):
+            return [mutation]
+        mutations.append(new_cls(
+            chrom=mutation.chrom, pos=new_pos, ref_allele=new_ref_allele,
+            alt_allele=new_alt_allele, ref_count=mutation.ref_count,
+            alt_count=mutation.alt_count, status=mutation.status, library_id=mutation.library_id))
+    return mutations
+
+
+def iter_normalized(objs, reference=None):
+    """Normalize a stream of objects (e.g., from a cancer_api file)
+    between parsing and writing or loading (see `normalize`).
+    Left-alignment can move indels upstream, so sorted input may
+    yield slightly unsorted output (see `BaseFile.sort`).
+    """
+    for obj in objs:
+        for normalized_obj in normalize(obj, reference):
+            yield normalized_obj
@@ -2,12 +2,15 @@
 parsers.py
 ==========
 This submodule contains all parsers used by the file classes
-in the files submodule.
+in the files submodule. Parsers return detached records (see
+records), which don't require the database layer.
 """
 
+from array import array
 from collections import OrderedDict
-from base import BaseParser
-from mutations import SingleNucleotideVariant, Indel, StructuralVariation
+from core import BaseParser
+from records import SingleNucleotideVariantRecord, IndelRecord, StructuralVariationRecord, \
+    GeneFeature, TranscriptFeature, ExonFeature
 from misc import GenomicInterval, RawRead
 
 
@@ -50,9 +53,16 @@ class VcfParser(BaseParser):
         attrs["info_dict"] = info_dict
         return attrs
 
+    def parse_locus(self, line):
+        """Parse chrom and pos columns only.
+        Returns (chrom, pos) tuple.
+        """
+        chrom, pos, _ = line.split("\t", 2)
+        return (chrom, int(pos))
+
     def parse(self, line):
         """Parse line from VCF file.
-        Returns SingleNucleotideVariant or Indel instance.
+        Returns SingleNucleotideVariantRecord or IndelRecord instance.
         """
         attrs = self.basic_parse(line)
         mutation_dict = {
@@ -65,18 +75,113 @@ class VcfParser(BaseParser):
         }
         if (len(mutation_dict["ref_allele"]) == 1 and
                 len(mutation_dict["alt_allele"]) == 1):
-            mutation = SingleNucleotideVariant(**mutation_dict)
+            mutation = SingleNucleotideVariantRecord(**mutation_dict)
         else:
-            mutation = Indel(**mutation_dict)
+            mutation = IndelRecord(**mutation_dict)
         return mutation
 
 
 class StrelkaVcfParser(VcfParser):
-    """Parser for Strelka SNV and indels files."""
+    """Parser for Strelka somatic SNV and indel files. Read counts
+    are derived from tier 1 counts, i.e. AU, CU, GU and TU for SNVs
+    (reads supporting each base) and TAR and TIR for indels (reads
+    supporting the reference and the indel). The sample columns and
+    FORMAT indices are looked up once rather than for every line.
+    """
+
+    BASE_COUNT_KEYS = {"A": "AU", "C": "CU", "G": "GU", "T": "TU"}
+    COUNT_KEYS = ["AU", "CU", "GU", "TU", "TAR", "TIR"]
+    COUNT_COLUMNS = ["t_ref_count", "t_alt_count", "n_ref_count", "n_alt_count"]
+
+    def __init__(self, file):
+        super(StrelkaVcfParser, self).__init__(file)
+        self._sample_columns = None
+        self._format_indices = {}
+
+    def get_sample_columns(self):
+        """Return (tumour, normal) column indices based on the
+        TUMOR and NORMAL sample names (in this order by default).
+        """
+        if self._sample_columns is None:
+            col_names = [col_name.upper() for col_name in self.file.col_names]
+            if "TUMOR" in col_names and "NORMAL" in col_names:
+                self._sample_columns = (col_names.index("TUMOR"), col_names.index("NORMAL"))
+            else:
+                self._sample_columns = (10, 9)
+        return self._sample_columns
+
+    def get_format_indices(self, format_str):
+        """Return dict mapping count keys (see COUNT_KEYS) in
+        the FORMAT column to their indices.
+        """
+        indices = self._format_indices.get(format_str)
+        if indices is None:
+            keys = format_str.split(":")
+            indices = dict((key, keys.index(key)) for key in self.COUNT_KEYS if key in keys)
+            self._format_indices[format_str] = indices
+        return indices
+
+    def get_counts(self, split_line):
+        """Return (t_ref_count, t_alt_count, n_ref_count, n_alt_count)
+        tuple for a split line, with None for unavailable counts.
+        """
+        if len(split_line) < 11:
+            return (None, None, None, None)
+        indices = self.get_format_indices(split_line[8])
+        ref_allele, alt_allele = split_line[3], split_line[4]
+        if len(ref_allele) == 1 and len(alt_allele) == 1:
+            ref_index = indices.get(self.BASE_COUNT_KEYS.get(ref_allele))
+            alt_index = indices.get(self.BASE_COUNT_KEYS.get(alt_allele))
+        else:
+            ref_index, alt_index = indices.get("TAR"), indices.get("TIR")
+        counts = []
+        for column in self.get_sample_columns():
+            values = split_line[column].split(":")
+            for index in (ref_index, alt_index):
+                if index is None or index >= len(values):
+                    counts.append(None)
+                else:
+                    counts.append(int(values[index].split(",", 1)[0]))
+        return tuple(counts)
 
     def parse(self, line):
-        """Parse line from
+        """Parse line from Strelka VCF file, where the ref_count
+        and alt_count attributes are the tumour counts.
+        Returns SingleNucleotideVariantRecord or IndelRecord instance.
         """
+        split_line = line.rstrip("\n").split("\t")
+        t_ref_count, t_alt_count, n_ref_count, n_alt_count = self.get_counts(split_line)
+        mutation_dict = {
+            "chrom": split_line[0],
+            "pos": split_line[1],
+            "ref_allele": split_line[3],
+            "alt_allele": split_line[4],
+            "ref_count": t_ref_count,
+            "alt_count": t_alt_count,
+            "status": "somatic"
+        }
+        if len(split_line[3]) == 1 and len(split_line[4]) == 1:
+            return SingleNucleotideVariantRecord(**mutation_dict)
+        return IndelRecord(**mutation_dict)
+
+    def parse_counts(self, lines):
+        """Parse the loci and counts of many lines at once (e.g., for
+        columnar export), without creating records.
+        Returns OrderedDict mapping column names (chrom, pos and
+        COUNT_COLUMNS) to lists or integer arrays, where
+        unavailable counts are -1.
+        """
+        columns = OrderedDict([("chrom", []), ("pos", array("i"))])
+        for name in self.COUNT_COLUMNS:
+            columns[name] = array("i")
+        count_arrays = [columns[name] for name in self.COUNT_COLUMNS]
+        for line in lines:
+            split_line = line.rstrip("\n").split("\t")
+            columns["chrom"].append(split_line[0])
+            columns["pos"].append(int(split_line[1]))
+            for count_array, count in zip(count_arrays, self.get_counts(split_line)):
+                count_array.append(-1 if count is None else count)
+        return columns
 
 
 class DellyVcfParser(VcfParser):
@@ -97,7 +202,7 @@ class DellyVcfParser(VcfParser):
 
     def parse(self, line):
         """Parse line from DELLY VCF file.
-        Returns StructuralVariation instance.
+        Returns StructuralVariationRecord instance.
         """
         attrs = self.basic_parse(line)
         info_dict = attrs["info_dict"]
@@ -116,7 +221,7 @@ class DellyVcfParser(VcfParser):
             "strand2": strand2,
             "sv_type": sv_type
         }
-        sv = StructuralVariation(**sv_dict)
+        sv = StructuralVariationRecord(**sv_dict)
         return sv
 
 
@@ -132,7 +237,7 @@ class PavfinderVcfParser(VcfParser):
 
     def parse(self, line):
         """Parse line from PavFinder VCF file.
-        Returns StructuralVariation instance.
+        Returns StructuralVariationRecord instance.
         """
         attrs = self.basic_parse(line)
         info_dict = attrs["info_dict"]
@@ -151,7 +256,7 @@ class PavfinderVcfParser(VcfParser):
             "strand2": None,
             "sv_type": sv_type
         }
-        sv = StructuralVariation(**sv_dict)
+        sv = StructuralVariationRecord(**sv_dict)
         return sv
 
 
@@ -169,6 +274,13 @@ class BedParser(BaseParser):
         attrs = dict(zip(self.BASE_COLUMNS, split_line))
         return attrs
 
+    def parse_locus(self, line):
+        """Parse chrom and start_pos columns only.
+        Returns (chrom, pos) tuple.
+        """
+        chrom, pos = line.rstrip("\n").split("\t", 3)[:2]
+        return (chrom, int(pos))
+
     def parse(self, line):
         """Parse BED file line.
         Returns Interval instances.
@@ -177,6 +289,48 @@ class BedParser(BaseParser):
         return GenomicInterval(**attrs)
 
 
+class BedpeParser(BaseParser):
+    """Basic parser for BEDPE files"""
+
+    BASE_COLUMNS = ["chrom1", "start1", "end1", "chrom2", "start2", "end2", "name", "score",
+                    "strand1", "strand2"]
+
+    def basic_parse(self, line):
+        """Parse basic columns for BEDPE file.
+        Returns dictionary of attributes.
+        """
+        attrs = {}
+        split_line = line.rstrip("\n").split("\t")
+        attrs = dict(zip(self.BASE_COLUMNS, split_line))
+        return attrs
+
+    def parse_locus(self, line):
+        """Parse chrom1 and start1 columns only.
+        Returns (chrom, pos) tuple.
+        """
+        chrom, pos = line.rstrip("\n").split("\t", 2)[:2]
+        return (chrom, int(pos))
+
+    def parse(self, line):
+        """Parse BEDPE file line.
+        Returns StructuralVariationRecord instances.
+        """
+        attrs = self.basic_parse(line)
+        # Strands are optional in BEDPE files
+        strand1 = attrs.get("strand1")
+        strand2 = attrs.get("strand2")
+        sv_dict = {
+            "chrom1": attrs["chrom1"],
+            "pos1": attrs["start1"],
+            "strand1": strand1 if strand1 in ("+", "-") else None,
+            "chrom2": attrs["chrom2"],
+            "pos2": attrs["start2"],
+            "strand2": strand2 if strand2 in ("+", "-") else None,
+            "sv_type": None
+        }
+        return StructuralVariationRecord(**sv_dict)
+
+
 class FastqParser(BaseParser):
     """Basic parser for FASTQ raw read files.
     Assumes quartets (i.e., string of four lines).
@@ -229,9 +383,17 @@ class FacteraParser(BaseParser):
         attrs = dict(zip(self.BASE_COLUMNS, split_line))
         return attrs
 
+    def parse_locus(self, line):
+        """Parse first breakpoint only.
+        Returns (chrom, pos) tuple.
+        """
+        break1 = line.split("\t", 4)[3]
+        chrom, pos = break1.split(":")
+        return (chrom, int(pos))
+
     def parse(self, line):
         """Parse Factera file line.
-        Returns StructuralVariation instances.
+        Returns StructuralVariationRecord instances.
         """
         attrs = self.basic_parse(line)
         # Parse chrom and pos
@@ -255,4 +417,149 @@ class FacteraParser(BaseParser):
             "strand2": strand2,
             "sv_type": sv_type
         }
-        return StructuralVariation(**sv_dict)
+        return StructuralVariationRecord(**sv_dict)
+
+
+class GtfParser(BaseParser):
+    """Parser for GTF annotation files (e.g., from Ensembl or GENCODE).
+    Only the attributes needed for each feature type are extracted
+    from the attributes column, which avoids parsing it entirely.
+    """
+
+    BASE_COLUMNS = ["chrom", "source", "feature", "start_pos", "end_pos", "score", "strand",
+                    "frame", "attributes"]
+
+    FEATURE_TYPES = {
+        "gene": "gene",
+        "transcript": "transcript",
+        "exon": "exon",
+        "CDS": "cds",
+        "stop_codon": "cds"
+    }
+
+    # Attributes to extract for each feature type,
+    # as (attribute name, key in file) pairs
+    FEATURE_ATTRIBUTES = {
+        "gene": [("gene_id", "gene_id"), ("gene_name", "gene_name"),
+                 ("biotype", "gene_type"), ("biotype", "gene_biotype")],
+        "transcript": [("transcript_id", "transcript_id"), ("gene_id", "gene_id")],
+        "exon": [("exon_id", "exon_id"), ("transcript_id", "transcript_id"),
+                 ("gene_id", "gene_id")],
+        "cds": [("transcript_id", "transcript_id"), ("protein_id", "protein_id")]
+    }
+
+    ATTRIBUTE_TEMPLATE = '{} "'
+    ATTRIBUTE_END = '"'
+
+    def get_feature_type(self, feature, attributes):
+        """Return feature type (i.e. gene, transcript, exon, cds)
+        or None for other features.
+        """
+        return self.FEATURE_TYPES.get(feature)
+
+    def get_attribute(self, attributes, key):
+        """Extract the value of a single attribute from the
+        attributes column. Returns None if it's absent.
+        """
+        prefix = self.ATTRIBUTE_TEMPLATE.format(key)
+        start = attributes.find(prefix)
+        # Ensure that the key isn't the suffix of another key
+        while start > 0 and attributes[start - 1] not in " ;":
+            start = attributes.find(prefix, start + 1)
+        if start == -1:
+            return None
+        start += len(prefix)
+        end = attributes.find(self.ATTRIBUTE_END, start)
+        return attributes[start:end] if end != -1 else attributes[start:]
+
+    def basic_parse(self, line):
+        """Parse GTF file line.
+        Returns dict of attribute-value pairs, including the
+        feature type, or None for unsupported features.
+        """
+        split_line = line.rstrip("\n").split("\t")
+        attrs = dict(zip(self.BASE_COLUMNS, split_line))
+        feature_type = self.get_feature_type(attrs["feature"], attrs["attributes"])
+        if feature_type is None:
+            return None
+        attrs["feature_type"] = feature_type
+        attrs["start_pos"] = int(attrs["start_pos"])
+        attrs["end_pos"] = int(attrs["end_pos"])
+        for name, key in self.FEATURE_ATTRIBUTES[feature_type]:
+            if attrs.get(name) is None:
+                attrs[name] = self.get_attribute(attrs["attributes"], key)
+        return attrs
+
+    def parse_locus(self, line):
+        """Parse chrom and start columns only.
+        Returns (chrom, pos) tuple.
+        """
+        split_line = line.split("\t", 4)
+        return (split_line[0], int(split_line[3]))
+
+    def parse(self, line):
+        """Parse GTF file line.
+        Returns GeneFeature, TranscriptFeature or ExonFeature
+        instances (without foreign keys) or None for other features.
+        """
+        attrs = self.basic_parse(line)
+        if attrs is None:
+            return None
+        length = attrs["end_pos"] - attrs["start_pos"] + 1
+        if attrs["feature_type"] == "gene":
+            return GeneFeature(gene_ensembl_id=attrs["gene_id"], gene_symbol=attrs["gene_name"],
+                               biotype=attrs["biotype"], chrom=attrs["chrom"],
+                               start_pos=attrs["start_pos"], end_pos=attrs["end_pos"],
+                               length=length)
+        elif attrs["feature_type"] == "transcript":
+            return TranscriptFeature(transcript_ensembl_id=attrs["transcript_id"])
+        elif attrs["feature_type"] == "exon":
+            return ExonFeature(exon_ensembl_id=attrs["exon_id"],
+                               genome_start_pos=attrs["start_pos"],
+                               genome_end_pos=attrs["end_pos"], length=length,
+                               strand="1" if attrs["strand"] == "+" else "-1")
+        return None
+
+
+class Gff3Parser(GtfParser):
+    """Parser for GFF3 annotation files (e.g., from Ensembl or GENCODE).
+    Ensembl-style IDs (e.g., 'gene:ENSG...') are stripped of their prefix.
+    """
+
+    GENE_FEATURES = ["gene", "ncRNA_gene", "pseudogene"]
+    TRANSCRIPT_FEATURES = ["transcript", "mRNA"]
+
+    FEATURE_ATTRIBUTES = {
+        "gene": [("gene_id", "gene_id"), ("gene_id", "ID"), ("gene_name", "gene_name"),
+                 ("gene_name", "Name"), ("biotype", "gene_type"), ("biotype", "biotype")],
+        "transcript": [("transcript_id", "transcript_id"), ("transcript_id", "ID"),
+                       ("gene_id", "gene_id"), ("gene_id", "Parent")],
+        "exon": [("exon_id", "exon_id"), ("transcript_id", "transcript_id"),
+                 ("transcript_id", "Parent")],
+        "cds": [("transcript_id", "transcript_id"), ("transcript_id", "Parent"),
+                ("protein_id", "protein_id")]
+    }
+
+    ATTRIBUTE_TEMPLATE = "{}="
+    ATTRIBUTE_END = ";"
+
+    def get_feature_type(self, feature, attributes):
+        """Return feature type (i.e. gene, transcript, exon, cds)
+        or None for other features. Ensembl GFF3 files use many
+        transcript feature types, so IDs are also considered.
+        """
+        if feature in self.GENE_FEATURES or attributes.startswith("ID=gene:"):
+            return "gene"
+        elif feature in self.TRANSCRIPT_FEATURES or attributes.startswith("ID=transcript:"):
+            return "transcript"
+        return self.FEATURE_TYPES.get(feature)
+
+    def get_attribute(self, attributes, key):
+        """Extract the value of a single attribute, stripping
+        Ensembl-style prefixes (e.g., 'transcript:').
+        """
+        value = super(Gff3Parser, self).get_attribute(attributes, key)
+        if value is not None and key in ("ID", "Parent"):
+            value = value.split(",")[0]
+            value = value.partition(":")[2] or value
+        return value
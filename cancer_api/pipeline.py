@@ -0,0 +1,204 @@
+"""
+pipeline.py
+===========
+This submodule contains a pipeline for reading and parsing files
+concurrently with the code consuming the parsed objects (e.g.,
+loaders writing to the database). Reading (and decompression) runs
+in a thread and parsing in a pool of processes, with bounded queues
+between the stages such that memory stays constant regardless of
+the size of the file. Throughput is then limited by the slowest
+stage rather than the sum of all of them.
+"""
+
+import sys
+import time
+import threading
+import multiprocessing
+from collections import deque
+from Queue import Queue, Full
+from instrumentation import metrics
+
+
+# Parsed file of the current worker process (see _init_worker)
+_worker_file = None
+
+
+def _init_worker(file_cls, filepath, parser_cls):
+    """Open the file in a worker process, which only parses lines."""
+    global _worker_file
+    _worker_file = file_cls.open(filepath, parser_cls=parser_cls)
+
+
+def _parse_chunk(lines):
+    """Return objects parsed from a chunk of lines, skipping
+    lines for which the parser returns None.
+    """
+    parse = _worker_file.source.parser.parse
+    objs = []
+    for line in lines:
+        obj = parse(line)
+        if obj:
+            objs.append(obj)
+    return objs
+
+
+class _ReaderError(object):
+    """Wrapper for exceptions raised in the reader thread."""
+
+    def __init__(self, exc_info):
+        self.exc_info = exc_info
+
+
+class Pipeline(object):
+    """Iterate over the objects of a file in chunks, which are read
+    (and decompressed) in a background thread and parsed by a pool
+    of processes, while the caller consumes earlier chunks.
+
+    Backpressure comes from bounding the number of chunks at every
+    stage: the reader blocks once max_chunks chunks are waiting to
+    be parsed and no more than max_chunks chunks are parsed at once,
+    such that at most about 2 * max_chunks * chunk_size lines are in
+    memory. Chunks are returned in the same order as in the file.
+
+    If processes is 0, lines are parsed in the calling thread, which
+    still overlaps reading with parsing and consuming. Parsers used
+    in worker processes must be picklable (by reference), and are
+    neither instrumented (see metrics) nor profiled (see Profiler).
+
+    If start_offset is given, reading starts at this byte offset (see
+    iteroffsets) and `offset` follows the last line of the chunks
+    returned so far (e.g., for checkpoints).
+    """
+
+    def __init__(self, infile, processes=None, chunk_size=1000, max_chunks=8,
+                 start_offset=None):
+        """Processes defaults to the number of CPUs minus one (for
+        the reader and the consumer), with at least one process.
+        """
+        self.infile = infile
+        if processes is None:
+            processes = max(multiprocessing.cpu_count() - 1, 1)
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        self.start_offset = start_offset
+        self.offset = start_offset
+        self.num_lines = 0
+        self.num_objs = 0
+        # Time the consumer spent waiting for each stage (in seconds)
+        self.wait_times = {"read": 0.0, "parse": 0.0}
+
+    def __iter__(self):
+        for chunk in self.iterchunks():
+            for obj in chunk:
+                yield obj
+
+    def iterchunks(self):
+        """Iterate over lists of parsed objects. The reader thread and
+        worker processes are stopped once the iteration ends (including
+        if it's interrupted or if an exception is raised).
+        """
+        queue = Queue(maxsize=self.max_chunks)
+        stop_event = threading.Event()
+        reader = threading.Thread(target=self._read, args=(queue, stop_event))
+        reader.daemon = True
+        pool = None
+        if self.processes > 0:
+            source = self.infile.source
+            pool = multiprocessing.Pool(self.processes, _init_worker,
+                                        (type(source), source.filepath, type(source.parser)))
+        reader.start()
+        try:
+            pending = deque()
+            for lines, end_offset in self._iterqueue(queue):
+                self.num_lines += len(lines)
+                if pool is not None:
+                    lines = pool.apply_async(_parse_chunk, (lines,))
+                pending.append((lines, end_offset))
+                if len(pending) >= self.max_chunks:
+                    yield self._get_parsed(*pending.popleft())
+            while pending:
+                yield self._get_parsed(*pending.popleft())
+        finally:
+            stop_event.set()
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            reader.join()
+            if metrics.enabled:
+                for stage, wait_time in self.wait_times.iteritems():
+                    metrics.observe("pipeline.{}_wait".format(stage), wait_time)
+
+    def _read(self, queue, stop_event):
+        """Put chunks of lines along with the offset following them (or
+        an exception) in the queue, followed by None. Runs in the reader
+        thread until the end of the file or until the stop event is set.
+        """
+        try:
+            if self.start_offset is None:
+                lines = ((line, None) for line in self.infile.iterlines())
+            else:
+                lines = self.infile.iteroffsets(self.start_offset)
+            chunk, end_offset = [], None
+            for line, end_offset in lines:
+                chunk.append(line)
+                if len(chunk) == self.chunk_size:
+                    if not self._put(queue, (chunk, end_offset), stop_event):
+                        return
+                    chunk = []
+            if chunk and not self._put(queue, (chunk, end_offset), stop_event):
+                return
+        except Exception:
+            self._put(queue, _ReaderError(sys.exc_info()), stop_event)
+        self._put(queue, None, stop_event)
+
+    @staticmethod
+    def _put(queue, item, stop_event):
+        """Put item in the queue, blocking while it's full unless the
+        stop event is set. Returns whether the item was added.
+        """
+        while not stop_event.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _iterqueue(self, queue):
+        """Iterate over the chunks of lines (and offsets) put in the
+        queue, re-raising exceptions from the reader thread.
+        """
+        while True:
+            start_time = time.time()
+            item = queue.get()
+            self.wait_times["read"] += time.time() - start_time
+            if item is None:
+                return
+            if isinstance(item, _ReaderError):
+                raise item.exc_info[0], item.exc_info[1], item.exc_info[2]
+            yield item
+
+    def _get_parsed(self, pending_chunk, end_offset):
+        """Return parsed objects for a pending chunk, i.e. either a
+        list of lines or the result of a worker process.
+        """
+        start_time = time.time()
+        if isinstance(pending_chunk, list):
+            parse = self.infile.source.parser.parse
+            objs = [obj for obj in (parse(line) for line in pending_chunk) if obj]
+        else:
+            # Timeout such that the wait can be interrupted (e.g., with Ctrl-C)
+            objs = pending_chunk.get(sys.maxint)
+        self.wait_times["parse"] += time.time() - start_time
+        self.num_objs += len(objs)
+        if end_offset is not None:
+            self.offset = end_offset
+        return objs
+
+
+def iter_pipelined(infile, processes=None, chunk_size=1000, max_chunks=8, start_offset=None):
+    """Iterate over the objects of a file like `iter(infile)`, but
+    reading and parsing concurrently (see Pipeline).
+    """
+    return iter(Pipeline(infile, processes, chunk_size, max_chunks, start_offset))
@@ -0,0 +1,379 @@
+"""
+predictors.py
+=============
+This submodule contains classes and functions for predicting
+the effects of mutations on genes in bulk, using an annotation
+index rather than querying the database for every mutation.
+"""
+
+import logging
+from sqlalchemy import or_
+from exceptions import CancerApiException
+from utils import ChromosomeOrder
+from mutations import SingleNucleotideVariant, Indel, CopyNumberVariation
+from effects import ProteinEffect, CopyNumberEffect
+from loaders import BulkLoader
+
+
+COMPLEMENTS = {"A": "T", "C": "G", "G": "C", "T": "A", "N": "N"}
+
+# Standard genetic code, with codons ordered by base (T, C, A, G)
+AMINO_ACIDS = "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"
+CODON_TABLE = dict((b1 + b2 + b3, AMINO_ACIDS[16 * i + 4 * j + k])
+                   for i, b1 in enumerate("TCAG") for j, b2 in enumerate("TCAG")
+                   for k, b3 in enumerate("TCAG"))
+
+
+class ProteinEffectPredictor(object):
+    """Predict protein effects (see ProteinEffect) of SNVs and indels
+    from an AnnotationIndex. Each mutation yields at most one effect
+    per gene, i.e. the most severe across the gene's transcripts.
+
+    Without a reference, only frameshift and splice-site effects
+    can be predicted, since SNVs require the sequence of their codon.
+    The reference can be any object with a `fetch(chrom, start, end)`
+    method returning the sequence between 1-based positions
+    (inclusive), such as FastaFile. Synonymous SNVs and in-frame
+    indels have no protein effect type and are ignored.
+
+    Exons shared between transcripts are only loaded once, linked to
+    the first transcript (see `load_annotation_file`), so transcripts
+    can lack some of their exons. SNVs whose codon spans into such an
+    exon are skipped and counted in num_unresolved, like reference
+    mismatches in num_mismatches.
+    """
+
+    SEVERITY = ["nonsense", "frameshift", "splice-site", "nonstop", "missense"]
+
+    def __init__(self, index, reference=None, splice_margin=2):
+        """The splice margin is the number of intronic bases on
+        each side of an exon considered part of the splice site.
+        """
+        self.index = index
+        self.reference = reference
+        self.splice_margin = splice_margin
+        self.num_mismatches = 0
+        self.num_unresolved = 0
+        self._transcript_exons = {}
+
+    @staticmethod
+    def _trim_alleles(pos, ref_allele, alt_allele):
+        """Remove shared leading bases (e.g., VCF anchor bases).
+        Returns (pos, ref_allele, alt_allele) with '-' as empty.
+        """
+        ref_allele = "" if ref_allele in (None, "-") else ref_allele.upper()
+        alt_allele = "" if alt_allele in (None, "-") else alt_allele.upper()
+        while ref_allele and alt_allele and ref_allele[0] == alt_allele[0]:
+            ref_allele, alt_allele = ref_allele[1:], alt_allele[1:]
+            pos += 1
+        return pos, ref_allele, alt_allele
+
+    def predict(self, chrom, pos, ref_allele, alt_allele):
+        """Return list of (gene_index, effect_type) tuples
+        for a single SNV or indel.
+        """
+        pos, ref_allele, alt_allele = self._trim_alleles(int(pos), ref_allele, alt_allele)
+        effects = {}
+        if len(ref_allele) == 1 and len(alt_allele) == 1:
+            start_pos, end_pos = pos, pos
+            if self.reference is not None:
+                for hit in self.index.find_cds(chrom, pos):
+                    effect_type = self._predict_codon_change(chrom, pos, ref_allele, alt_allele,
+                                                             hit)
+                    self._add_effect(effects, hit.exon.gene_index, effect_type)
+        else:
+            if ref_allele:
+                start_pos, end_pos = pos, pos + len(ref_allele) - 1
+            else:
+                # Insertions are located between two bases
+                start_pos, end_pos = pos - 1, pos
+            if (len(alt_allele) - len(ref_allele)) % 3 != 0:
+                for exon, transcript in self._iter_coding_exons(chrom, start_pos, end_pos):
+                    coding_range = self._get_coding_range(exon, transcript)
+                    if coding_range and coding_range[0] <= end_pos and \
+                            start_pos <= coding_range[1]:
+                        self._add_effect(effects, exon.gene_index, "frameshift")
+        margin = self.splice_margin
+        for exon, transcript in self._iter_coding_exons(chrom, start_pos - margin,
+                                                        end_pos + margin):
+            for site_start, site_end in self._get_splice_sites(exon, transcript):
+                if site_start <= end_pos and start_pos <= site_end:
+                    self._add_effect(effects, exon.gene_index, "splice-site")
+        return effects.items()
+
+    def _add_effect(self, effects, gene_index, effect_type):
+        """Store effect for gene unless a more severe one exists."""
+        if effect_type is None:
+            return
+        current = effects.get(gene_index)
+        if current is None or self.SEVERITY.index(effect_type) < self.SEVERITY.index(current):
+            effects[gene_index] = effect_type
+
+    def _iter_coding_exons(self, chrom, start_pos, end_pos):
+        """Yield (exon, transcript) tuples for exons of coding
+        transcripts overlapping with an interval.
+        """
+        for exon in self.index.find_exons(chrom, start_pos, end_pos):
+            if exon.transcript_index == -1:
+                continue
+            transcript = self.index.get_transcript(exon.transcript_index)
+            if transcript.cds_start_pos:
+                yield exon, transcript
+
+    @staticmethod
+    def _get_coding_range(exon, transcript):
+        """Return genomic interval of the coding part of an exon,
+        or None if the exon is entirely untranslated.
+        """
+        start = max(exon.transcript_start_pos, transcript.cds_start_pos)
+        end = min(exon.transcript_end_pos, transcript.cds_end_pos)
+        if start > end:
+            return None
+        if exon.strand == -1:
+            return (exon.genome_end_pos - (end - exon.transcript_start_pos),
+                    exon.genome_end_pos - (start - exon.transcript_start_pos))
+        return (exon.genome_start_pos + (start - exon.transcript_start_pos),
+                exon.genome_start_pos + (end - exon.transcript_start_pos))
+
+    def _get_splice_sites(self, exon, transcript):
+        """Return genomic intervals of the intronic splice sites
+        flanking an exon (none beyond the ends of the transcript).
+        """
+        is_first = exon.transcript_start_pos == 1
+        is_last = exon.transcript_end_pos == transcript.length
+        if exon.strand == -1:
+            is_first, is_last = is_last, is_first
+        sites = []
+        margin = self.splice_margin
+        if not is_first:
+            sites.append((exon.genome_start_pos - margin, exon.genome_start_pos - 1))
+        if not is_last:
+            sites.append((exon.genome_end_pos + 1, exon.genome_end_pos + margin))
+        return sites
+
+    def _get_genome_pos(self, transcript, cds_pos):
+        """Return genomic position of a position in the coding
+        sequence of a transcript, or None if it's not in an exon.
+        """
+        exons = self._transcript_exons.get(transcript.index)
+        if exons is None:
+            # Mutations are usually sorted, so only recent transcripts are kept
+            if len(self._transcript_exons) >= 1000:
+                self._transcript_exons.clear()
+            exons = self.index.get_transcript_exons(transcript.index)
+            self._transcript_exons[transcript.index] = exons
+        transcript_pos = transcript.cds_start_pos + cds_pos - 1
+        for exon in exons:
+            if exon.transcript_start_pos <= transcript_pos <= exon.transcript_end_pos:
+                offset = transcript_pos - exon.transcript_start_pos
+                if exon.strand == -1:
+                    return exon.genome_end_pos - offset
+                return exon.genome_start_pos + offset
+        return None
+
+    def _predict_codon_change(self, chrom, pos, ref_allele, alt_allele, hit):
+        """Return effect type of an SNV on the codon it hits,
+        or None for synonymous changes.
+        """
+        codon_start = hit.cds_pos - (hit.cds_pos - 1) % 3
+        positions = [self._get_genome_pos(hit.transcript, cds_pos)
+                     for cds_pos in range(codon_start, codon_start + 3)]
+        if None in positions:
+            # Codon spanning into an exon linked to another transcript
+            self.num_unresolved += 1
+            return None
+        if max(positions) - min(positions) == 2:
+            sequence = self.reference.fetch(chrom, min(positions), max(positions)).upper()
+            bases = [sequence[p - min(positions)] for p in positions]
+        else:
+            # Codon spanning two exons
+            bases = [self.reference.fetch(chrom, p, p).upper() for p in positions]
+        offset = hit.cds_pos - codon_start
+        if bases[offset] != ref_allele:
+            self.num_mismatches += 1
+            return None
+        if hit.exon.strand == -1:
+            bases = [COMPLEMENTS.get(base, "N") for base in bases]
+            alt_allele = COMPLEMENTS[alt_allele]
+        ref_codon = "".join(bases)
+        alt_codon = ref_codon[:offset] + alt_allele + ref_codon[offset + 1:]
+        ref_amino_acid = CODON_TABLE.get(ref_codon)
+        alt_amino_acid = CODON_TABLE.get(alt_codon)
+        if ref_amino_acid is None or alt_amino_acid is None or ref_amino_acid == alt_amino_acid:
+            return None
+        elif alt_amino_acid == "*":
+            return "nonsense"
+        elif ref_amino_acid == "*":
+            return "nonstop"
+        return "missense"
+
+    def iter_effects(self, mutations):
+        """Yield (mutation, gene_id, effect_type) tuples for a stream
+        of SNVs and indels (or any objects with chrom, pos, ref_allele
+        and alt_allele attributes, such as query rows).
+        """
+        gene_ids = self.index.columns["gene.id"]
+        for mutation in mutations:
+            for gene_index, effect_type in self.predict(
+                    mutation.chrom, mutation.pos, mutation.ref_allele, mutation.alt_allele):
+                yield mutation, gene_ids[gene_index], effect_type
+
+    def load_effects(self, session, mutations, batch_size=10000, progress_every=100000):
+        """Predict effects for a stream of mutations already in the
+        database and insert them as ProteinEffect rows in bulk.
+        Returns the BulkLoader used (e.g., for its row counts).
+        """
+        loader = BulkLoader(session, ProteinEffect, batch_size=batch_size,
+                            progress_every=progress_every)
+        for mutation, gene_id, effect_type in self.iter_effects(mutations):
+            if mutation.id is None:
+                raise CancerApiException("Mutations must be in the database (i.e. have an ID) "
+                                         "to load their effects.")
+            loader.add({"mutation_id": mutation.id, "gene_id": gene_id, "type": effect_type})
+        loader.close()
+        if self.num_unresolved:
+            logging.warning("Skipped {} SNV hits whose codon spans into exons linked to another "
+                            "transcript".format(self.num_unresolved))
+        return loader
+
+
+def iter_small_variants(session, library_ids=None, page_size=10000):
+    """Yield query rows (with id, chrom, pos, ref_allele and
+    alt_allele attributes) for the SNVs and indels in the database,
+    optionally restricted to some libraries. Only these columns
+    are queried, which avoids creating ORM objects. Rows are fetched
+    in pages ordered by ID, such that the session can be committed
+    (e.g., by a BulkLoader) between pages.
+    """
+    for model_cls in (SingleNucleotideVariant, Indel):
+        query = session.query(model_cls.id, model_cls.chrom, model_cls.pos,
+                              model_cls.ref_allele, model_cls.alt_allele)
+        if library_ids is not None:
+            query = query.filter(model_cls.library_id.in_(list(library_ids)))
+        last_id = 0
+        while True:
+            rows = query.filter(model_cls.id > last_id).order_by(model_cls.id) \
+                .limit(page_size).all()
+            for row in rows:
+                yield row
+            if len(rows) < page_size:
+                break
+            last_id = rows[-1].id
+
+
+def predict_protein_effects(session, index, reference=None, library_ids=None, batch_size=10000,
+                            progress_every=100000):
+    """Predict protein effects for the SNVs and indels in the
+    database (optionally restricted to some libraries) and load
+    them in bulk. Returns the BulkLoader used.
+    """
+    predictor = ProteinEffectPredictor(index, reference)
+    mutations = iter_small_variants(session, library_ids)
+    return predictor.load_effects(session, mutations, batch_size, progress_every)
+
+
+def iter_copy_number_effects(segments, genes, ploidy=2, loh_states=None, min_fraction=0.5,
+                             chrom_order=None):
+    """Join CNV segments with genes in a single sweep, where both
+    are sorted by chromosome (see ChromosomeOrder) and start position.
+    Segments are objects with id, library_id, chrom, start_pos, end_pos
+    and copy_state attributes (e.g., CopyNumberVariation or query rows)
+    and genes are objects with id, chrom, start_pos and end_pos
+    attributes (e.g., Gene or GeneRecord).
+
+    Copy states above or below the ploidy are gains and losses,
+    respectively, whereas those in loh_states are LOH. Other segments
+    are skipped. For each gene and library, the aberrant segment with
+    the largest overlap is used if it covers at least min_fraction of
+    the gene. Yields (segment, gene, cn_type) tuples.
+    """
+    chrom_order = ChromosomeOrder.get(chrom_order)
+    loh_states = set(loh_states or [])
+
+    def get_cn_type(copy_state):
+        if copy_state in loh_states:
+            return "loh"
+        elif copy_state > ploidy:
+            return "gain"
+        elif copy_state < ploidy:
+            return "loss"
+        return None
+
+    def iter_aberrant_segments():
+        last_key = None
+        for segment in segments:
+            key = (chrom_order.key(segment.chrom), segment.start_pos)
+            if last_key is not None and key < last_key:
+                raise CancerApiException("Segments aren't sorted by chrom and pos.")
+            last_key = key
+            if segment.copy_state is not None and get_cn_type(segment.copy_state):
+                yield key, segment
+
+    aberrant_segments = iter_aberrant_segments()
+    next_segment = next(aberrant_segments, None)
+    active = []
+    last_gene_key = None
+    for gene in genes:
+        chrom_key = chrom_order.key(gene.chrom)
+        gene_key = (chrom_key, gene.start_pos)
+        if last_gene_key is not None and gene_key < last_gene_key:
+            raise CancerApiException("Genes aren't sorted by chrom and pos.")
+        last_gene_key = gene_key
+        # Activate segments starting before the end of the gene
+        while next_segment is not None and next_segment[0] <= (chrom_key, gene.end_pos):
+            active.append(next_segment[1])
+            next_segment = next(aberrant_segments, None)
+        # Genes are sorted by start, so segments ending before this one are done
+        active = [segment for segment in active
+                  if (chrom_order.key(segment.chrom), segment.end_pos) >= gene_key]
+        dominant = {}
+        for segment in active:
+            overlap = min(segment.end_pos, gene.end_pos) - max(segment.start_pos,
+                                                               gene.start_pos) + 1
+            if segment.library_id not in dominant or overlap > dominant[segment.library_id][0]:
+                dominant[segment.library_id] = (overlap, segment)
+        gene_length = gene.end_pos - gene.start_pos + 1
+        for library_id in sorted(dominant):
+            overlap, segment = dominant[library_id]
+            if overlap >= min_fraction * gene_length:
+                yield segment, gene, get_cn_type(segment.copy_state)
+
+
+def predict_copy_number_effects(session, index, library_ids=None, ploidy=2, loh_states=None,
+                                min_fraction=0.5, batch_size=10000, progress_every=100000):
+    """Compute copy number effects for the CNVs in the database
+    (optionally restricted to some libraries) against the genes
+    of an AnnotationIndex, and load them as CopyNumberEffect rows
+    in bulk. Only aberrant segments are queried, one chromosome
+    at a time. Returns the BulkLoader used.
+    """
+    loh_states = list(loh_states or [])
+    chroms = sorted(index.chrom_ranges["gene"], key=ChromosomeOrder().key)
+    cnv = CopyNumberVariation
+
+    def iter_segments():
+        query = session.query(cnv.id, cnv.library_id, cnv.chrom, cnv.start_pos, cnv.end_pos,
+                              cnv.copy_state)
+        aberrant = [cnv.copy_state != ploidy]
+        if loh_states:
+            aberrant.append(cnv.copy_state.in_(loh_states))
+        query = query.filter(or_(*aberrant))
+        if library_ids is not None:
+            query = query.filter(cnv.library_id.in_(list(library_ids)))
+        for chrom in chroms:
+            for row in query.filter(cnv.chrom == chrom).order_by(cnv.start_pos).all():
+                yield row
+
+    def iter_genes():
+        for chrom in chroms:
+            for gene in index.iter_genes(chrom):
+                yield gene
+
+    loader = BulkLoader(session, CopyNumberEffect, batch_size=batch_size,
+                        progress_every=progress_every)
+    for segment, gene, cn_type in iter_copy_number_effects(
+            iter_segments(), iter_genes(), ploidy, loh_states, min_fraction, chroms):
+        loader.add({"mutation_id": segment.id, "gene_id": gene.id, "cn_type": cn_type,
+                    "num_copies": segment.copy_state})
+    loader.close()
+    return loader
@@ -0,0 +1,235 @@
+"""
+profiling.py
+============
+This submodule contains opt-in profiling hooks, which break
+down the time spent loading or converting files into stages
+(parsing, model instantiation, validation, formatting, session
+flushes and SQL statements), along with a helper for dumping
+cProfile output.
+
+Unlike the metrics (see instrumentation), the hooks wrap methods
+and listen to SQLAlchemy events while the profiler is running,
+which slows things down. Typical usage:
+    with cancer_api.Profiler() as profiler:
+        ...
+    profiler.report()
+"""
+
+import time
+import heapq
+import logging
+import cProfile
+import pstats
+from StringIO import StringIO
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from base import Base, BaseFile, BaseParser, Session, validators
+from records import Record
+
+
+class Profiler(object):
+    """Collect time spent per stage while running. Stages are:
+    - parse.<Parser>: `parse` calls of every parser class
+    - init.<Model>: instantiation of mapped classes (which
+        includes the validation of attributes) and records
+    - validate: attribute validators (see base.validators)
+    - format.<File>: `obj_to_str` calls (i.e. writing objects)
+    - flush: session flushes (which includes their SQL)
+    - sql: execution of SQL statements (by any engine)
+    Stages can be nested (e.g., parsing includes instantiation),
+    but nested calls of the same kind (e.g., a parser calling the
+    `parse` method of its parent class) are only counted once.
+    The slowest SQL statements are kept as well.
+    """
+
+    def __init__(self, num_statements=10):
+        self.num_statements = num_statements
+        self.is_running = False
+        self.reset()
+
+    def reset(self):
+        """Discard collected times."""
+        self.calls = Counter()
+        self.times = Counter()
+        self.statements = []
+        self.elapsed = 0.0
+        self._depths = Counter()
+        self._flush_starts = []
+        self._patches = []
+
+    def add(self, stage, seconds):
+        """Add the time of one call to a stage."""
+        self.calls[stage] += 1
+        self.times[stage] += seconds
+
+    def _wrap(self, func, kind, get_stage):
+        """Return wrapper timing the outermost calls of a kind."""
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            if profiler._depths[kind]:
+                return func(*args, **kwargs)
+            profiler._depths[kind] += 1
+            start_time = time.time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler._depths[kind] -= 1
+                profiler.add(get_stage(*args), time.time() - start_time)
+        return wrapper
+
+    def _patch(self, obj, attr, wrapper):
+        """Replace attribute, keeping the original to restore it."""
+        self._patches.append((obj, attr, obj.__dict__[attr], False))
+        setattr(obj, attr, wrapper)
+
+    def _patch_item(self, obj, key, wrapper):
+        """Replace dict item, keeping the original to restore it."""
+        self._patches.append((obj, key, obj[key], True))
+        obj[key] = wrapper
+
+    def start(self):
+        """Install hooks and start the clock."""
+        if self.is_running:
+            return
+        # Parsers
+        parser_classes = [BaseParser]
+        for parser_cls in parser_classes:
+            parser_classes.extend(parser_cls.__subclasses__())
+            if "parse" in parser_cls.__dict__:
+                self._patch(parser_cls, "parse", self._wrap(
+                    parser_cls.__dict__["parse"], "parse",
+                    lambda parser, *args: "parse." + type(parser).__name__))
+        # File formatters (class methods)
+        file_classes = [BaseFile]
+        for file_cls in file_classes:
+            file_classes.extend(file_cls.__subclasses__())
+            if "obj_to_str" in file_cls.__dict__:
+                self._patch(file_cls, "obj_to_str", classmethod(self._wrap(
+                    file_cls.__dict__["obj_to_str"].__func__, "format",
+                    lambda cls, *args: "format." + cls.__name__)))
+        # Models (the instrumented constructor calls original_init)
+        for model_cls in Base._decl_class_registry.values():
+            manager = getattr(model_cls, "_sa_class_manager", None)
+            if manager is not None:
+                self._patch(manager, "original_init", self._wrap(
+                    manager.original_init, "init",
+                    lambda instance, *args: "init." + type(instance).__name__))
+        # Detached records (i.e. what parsers return)
+        self._patch(Record, "__init__", self._wrap(
+            Record.__dict__["__init__"], "init",
+            lambda record, *args, **kwargs: "init." + type(record).__name__))
+        # Validators
+        for column_type, validator in validators.items():
+            self._patch_item(validators, column_type, self._wrap(
+                validator, "validate", lambda *args: "validate"))
+        # Flushes and SQL statements
+        event.listen(Session, "before_flush", self._before_flush)
+        event.listen(Session, "after_flush_postexec", self._after_flush)
+        event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+        self.is_running = True
+        self._start_time = time.time()
+
+    def stop(self):
+        """Remove hooks and stop the clock."""
+        if not self.is_running:
+            return
+        self.elapsed += time.time() - self._start_time
+        for obj, attr, original, is_item in reversed(self._patches):
+            if is_item:
+                obj[attr] = original
+            else:
+                setattr(obj, attr, original)
+        self._patches = []
+        event.remove(Session, "before_flush", self._before_flush)
+        event.remove(Session, "after_flush_postexec", self._after_flush)
+        event.remove(Engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", self._after_cursor_execute)
+        self.is_running = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+
+    def _before_flush(self, session, flush_context, instances):
+        self._flush_starts.append(time.time())
+
+    def _after_flush(self, session, flush_context):
+        if self._flush_starts:
+            self.add("flush", time.time() - self._flush_starts.pop())
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context,
+                               executemany):
+        conn.info.setdefault("profiler_start_times", []).append(time.time())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context,
+                              executemany):
+        start_times = conn.info.get("profiler_start_times")
+        if not start_times:
+            return
+        seconds = time.time() - start_times.pop()
+        self.add("sql", seconds)
+        num_rows = len(parameters) if executemany else 1
+        entry = (seconds, " ".join(statement.split()), num_rows)
+        if len(self.statements) < self.num_statements:
+            heapq.heappush(self.statements, entry)
+        else:
+            heapq.heappushpop(self.statements, entry)
+
+    def get_elapsed(self):
+        """Return total time spent running (in seconds)."""
+        if self.is_running:
+            return self.elapsed + time.time() - self._start_time
+        return self.elapsed
+
+    def get_breakdown(self):
+        """Return list of (stage, calls, seconds, fraction of the
+        profiled time) tuples, slowest stages first.
+        """
+        total = self.get_elapsed()
+        breakdown = []
+        for stage, seconds in self.times.most_common():
+            fraction = seconds / total if total > 0 else 0.0
+            breakdown.append((stage, self.calls[stage], seconds, fraction))
+        return breakdown
+
+    def get_slowest_statements(self):
+        """Return list of (seconds, statement, number of rows)
+        tuples for the slowest SQL statements, slowest first.
+        """
+        return sorted(self.statements, reverse=True)
+
+    def report(self):
+        """Log time breakdown and slowest SQL statements."""
+        logging.info("Profiled {:.3f} sec:".format(self.get_elapsed()))
+        for stage, calls, seconds, fraction in self.get_breakdown():
+            logging.info("  {:<30} {:>10} calls {:>10.3f} sec {:>6.1%}".format(
+                stage, calls, seconds, fraction))
+        for seconds, statement, num_rows in self.get_slowest_statements():
+            logging.info("  {:.6f} sec ({} rows): {}".format(seconds, num_rows,
+                                                           statement[:200]))
+
+
+def run_cprofile(outfilepath, func, *args, **kwargs):
+    """Call a function (e.g., a file conversion) under cProfile,
+    dump the statistics to a file (which can be opened with the
+    pstats module or visualization tools) and log the functions
+    with the highest cumulative times. Returns the function's
+    return value.
+    """
+    profile = cProfile.Profile()
+    try:
+        result = profile.runcall(func, *args, **kwargs)
+    finally:
+        profile.dump_stats(outfilepath)
+    stream = StringIO()
+    stats = pstats.Stats(outfilepath, stream=stream)
+    stats.sort_stats("cumulative").print_stats(20)
+    logging.info("Wrote profile to {}:\n{}".format(outfilepath, stream.getvalue()))
+    return result
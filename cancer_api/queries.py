@@ -0,0 +1,90 @@
+"""
+queries.py
+==========
+This submodule contains helpers for querying cohorts (patients,
+samples, libraries and their mutations) in a few queries, using
+eager loading rather than the lazy relationships of the models.
+"""
+
+from sqlalchemy import func
+from sqlalchemy.orm import subqueryload, with_polymorphic
+from metadata import Patient
+from mutations import Mutation
+
+
+def query_cohort(session, patient_ids=None):
+    """Return query for patients along with their samples and
+    libraries, which are loaded with one extra query each
+    (instead of one per patient and sample).
+    """
+    query = session.query(Patient).options(
+        subqueryload("samples").subqueryload("libraries"))
+    if patient_ids is not None:
+        query = query.filter(Patient.id.in_(list(patient_ids)))
+    return query.order_by(Patient.id)
+
+
+def get_cohort_libraries(session, patient_ids=None):
+    """Return list of (patient, sample, library) tuples for a
+    cohort, loaded in three queries.
+    """
+    libraries = []
+    for patient in query_cohort(session, patient_ids):
+        for sample in patient.samples:
+            for library in sample.libraries:
+                libraries.append((patient, sample, library))
+    return libraries
+
+
+def load_by_ids(session, model_cls, ids, batch_size=500):
+    """Return dict mapping IDs to instances of a model, which
+    are loaded in batches using IN clauses (one query per batch).
+    """
+    ids = sorted(set(ids))
+    instances = {}
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size]
+        for instance in session.query(model_cls).filter(model_cls.id.in_(batch_ids)):
+            instances[instance.id] = instance
+    return instances
+
+
+def iter_library_mutations(session, library_ids, mutation_cls=Mutation, yield_per=1000):
+    """Stream the mutations of some libraries, ordered by library,
+    using a single query. Subclass columns are loaded along with
+    the base table (i.e. polymorphic loading), so querying Mutation
+    doesn't trigger a query per mutation. Yields mutations.
+    """
+    polymorphic_cls = with_polymorphic(mutation_cls, "*")
+    query = session.query(polymorphic_cls).filter(
+        polymorphic_cls.library_id.in_(list(library_ids)))
+    query = query.order_by(polymorphic_cls.library_id, polymorphic_cls.id)
+    for mutation in query.yield_per(yield_per):
+        yield mutation
+
+
+def iter_cohort_mutations(session, patient_ids=None, mutation_cls=Mutation, yield_per=1000):
+    """Stream the mutations of a cohort along with their metadata.
+    Yields (patient, sample, library, mutation) tuples using four
+    queries in total, regardless of the size of the cohort.
+    """
+    libraries = dict((library.id, (patient, sample, library)) for patient, sample, library in
+                     get_cohort_libraries(session, patient_ids))
+    if not libraries:
+        return
+    for mutation in iter_library_mutations(session, libraries.keys(), mutation_cls, yield_per):
+        yield libraries[mutation.library_id] + (mutation,)
+
+
+def get_mutation_counts(session, library_ids=None):
+    """Return dict mapping library IDs to {mutation_type: count}
+    dicts, computed with a single grouped query.
+    """
+    query = session.query(Mutation.library_id, Mutation.mutation_type, func.count(Mutation.id))
+    if library_ids is not None:
+        query = query.filter(Mutation.library_id.in_(list(library_ids)))
+    counts = {}
+    for library_id, mutation_type, count in query.group_by(Mutation.library_id,
+                                                           Mutation.mutation_type):
+        counts.setdefault(library_id, {})[mutation_type] = count
+    return counts
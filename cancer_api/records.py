@@ -0,0 +1,247 @@
+"""
+records.py
+==========
+This submodule contains detached record types, i.e. plain Python
+counterparts of the models for mutations and annotations, which
+parsers return instead of model instances. Records don't depend on
+SQLAlchemy, such that file-only workloads (e.g., conversions) don't
+need to import or configure the database layer. Records can be
+converted into model instances with `to_model`.
+
+The behaviour shared by records and models (e.g., `get_locus` and
+`is_overlap`) is defined in mixins, which the models inherit from.
+"""
+
+import importlib
+from core import CancerApiObject, validate_int
+import misc
+
+
+# ============================================================================================== #
+# Mixins Shared by Records and Models
+# ============================================================================================== #
+
+class MutationMixin(object):
+    """Methods shared by all mutations"""
+
+    def is_overlap(self, chrom, pos1, pos2=None, margin=0):
+        """Return whether given position overlaps with mutation.
+        """
+        raise NotImplementedError()
+
+
+class SingleNucleotideVariantMixin(MutationMixin):
+    """Methods shared by SNV records and models"""
+
+    def get_key(self):
+        """Return compact key for de-duplicating SNVs."""
+        return ("snv", self.chrom, self.pos, self.ref_allele, self.alt_allele)
+
+    def get_locus(self):
+        return (self.chrom, self.pos)
+
+    def get_interval(self):
+        return misc.GenomicInterval(self.chrom, self.pos)
+
+    def is_overlap(self, chrom, pos1, pos2=None, margin=0):
+        """Return whether given position overlaps with SNV.
+        """
+        snv_interval = misc.GenomicInterval(self.chrom, self.pos)
+        query_interval = misc.GenomicInterval(chrom, pos1, pos2)
+        return snv_interval.is_overlap(query_interval, margin)
+
+
+class IndelMixin(MutationMixin):
+    """Methods shared by indel records and models"""
+
+    def get_key(self):
+        """Return compact key for de-duplicating indels."""
+        return ("indel", self.chrom, self.pos, self.ref_allele, self.alt_allele)
+
+    def get_locus(self):
+        return (self.chrom, self.pos)
+
+    def get_interval(self):
+        """Return interval spanned by the reference allele."""
+        end_pos = int(self.pos) + max(len(self.ref_allele), 1) - 1
+        return misc.GenomicInterval(self.chrom, self.pos, end_pos)
+
+
+class StructuralVariationMixin(MutationMixin):
+    """Methods shared by SV records and models"""
+
+    def get_key(self):
+        """Return compact key for de-duplicating SVs.
+        Breakpoints are ordered canonically (along with their
+        strands) such that the same SV reported from either
+        breakpoint yields the same key. Missing strands are
+        empty strings, such that they compare with known ones.
+        """
+        breakpoint1 = (self.chrom1, self.pos1, self.strand1 or "")
+        breakpoint2 = (self.chrom2, self.pos2, self.strand2 or "")
+        if breakpoint2 < breakpoint1:
+            breakpoint1, breakpoint2 = breakpoint2, breakpoint1
+        return ("sv",) + breakpoint1 + breakpoint2 + (self.sv_type,)
+
+    def get_locus(self):
+        return (self.chrom1, self.pos1)
+
+    def get_interval(self):
+        """Return interval between the breakpoints for intra-chromosomal
+        SVs. Otherwise, return the first breakpoint.
+        """
+        if self.chrom1 == self.chrom2:
+            return misc.GenomicInterval(self.chrom1, self.pos1, self.pos2)
+        return misc.GenomicInterval(self.chrom1, self.pos1)
+
+    def is_overlap(self, chrom, pos1, pos2=None, margin=0):
+        """Return whether the given position overlap with
+        the structural variation.
+        The margin defines how close the events can be to
+        be considered overlapping (e.g., within 10 bp).
+        """
+        query_interval = misc.GenomicInterval(chrom, pos1, pos2)
+        if self.chrom1 == self.chrom2:
+            sv_interval = misc.GenomicInterval(self.chrom1, self.pos1, self.pos2)
+            is_overlap = sv_interval.is_overlap(query_interval, margin)
+        else:
+            sv_interval1 = misc.GenomicInterval(self.chrom1, self.pos1)
+            sv_interval2 = misc.GenomicInterval(self.chrom2, self.pos2)
+            is_overlap = (sv_interval1.is_overlap(query_interval, margin) or
+                          sv_interval2.is_overlap(query_interval, margin))
+        return is_overlap
+
+
+class CopyNumberVariationMixin(MutationMixin):
+    """Methods shared by CNV records and models"""
+
+    def get_key(self):
+        """Return compact key for de-duplicating CNVs."""
+        return ("cnv", self.chrom, self.start_pos, self.end_pos, self.copy_state)
+
+    def get_locus(self):
+        return (self.chrom, self.start_pos)
+
+    def get_interval(self):
+        return misc.GenomicInterval(self.chrom, self.start_pos, self.end_pos)
+
+
+# ============================================================================================== #
+# Records
+# ============================================================================================== #
+
+class Record(CancerApiObject):
+    """Base class for detached records. Attributes listed in FIELDS
+    default to None and those in INT_FIELDS are converted to integers
+    (like the validators of models). MODEL is the (submodule, class)
+    pair of the corresponding model.
+    """
+
+    FIELDS = []
+    INT_FIELDS = []
+    MODEL = None
+
+    def __init__(self, **kwargs):
+        for field in self.FIELDS:
+            value = kwargs.pop(field, None)
+            if field in self.INT_FIELDS:
+                value = validate_int(value)
+            setattr(self, field, value)
+        if kwargs:
+            raise TypeError("{} has no fields named {}".format(
+                type(self).__name__, ", ".join(sorted(kwargs))))
+
+    def to_dict(self):
+        """Return dict of field-value pairs (e.g., for bulk loaders)."""
+        return dict((field, getattr(self, field)) for field in self.FIELDS)
+
+    @classmethod
+    def get_model_cls(cls):
+        """Return the corresponding model class, which imports
+        the database layer if needed.
+        """
+        module_name, cls_name = cls.MODEL
+        return getattr(importlib.import_module("cancer_api." + module_name), cls_name)
+
+    def to_model(self):
+        """Return a new (transient) instance of the corresponding model."""
+        model_cls = self.get_model_cls()
+        return model_cls(**dict((field, value) for field, value in self.to_dict().iteritems()
+                                if value is not None))
+
+
+MUTATION_FIELDS = ["library_id", "status"]
+
+
+class SingleNucleotideVariantRecord(SingleNucleotideVariantMixin, Record):
+    """Detached record for single nucleotide variants"""
+
+    FIELDS = MUTATION_FIELDS + ["chrom", "pos", "ref_allele", "alt_allele", "ref_count",
+                                "alt_count"]
+    INT_FIELDS = ["library_id", "pos", "ref_count", "alt_count"]
+    MODEL = ("mutations", "SingleNucleotideVariant")
+    mutation_type = "snv"
+
+
+class IndelRecord(IndelMixin, Record):
+    """Detached record for indels"""
+
+    FIELDS = SingleNucleotideVariantRecord.FIELDS
+    INT_FIELDS = SingleNucleotideVariantRecord.INT_FIELDS
+    MODEL = ("mutations", "Indel")
+    mutation_type = "indel"
+
+
+class StructuralVariationRecord(StructuralVariationMixin, Record):
+    """Detached record for structural variations"""
+
+    COUNT_FIELDS = ["t_ref_count", "n_ref_count", "t_alt_count", "n_alt_count",
+                    "t_ref_spanning_reads", "n_ref_spanning_reads", "t_ref_read_pairs",
+                    "n_ref_read_pairs", "t_alt_spanning_reads", "n_alt_spanning_reads",
+                    "t_alt_read_pairs", "n_alt_read_pairs"]
+    FIELDS = MUTATION_FIELDS + ["chrom1", "pos1", "strand1", "chrom2", "pos2", "strand2",
+                                "sv_type"] + COUNT_FIELDS
+    INT_FIELDS = ["library_id", "pos1", "pos2"] + COUNT_FIELDS
+    MODEL = ("mutations", "StructuralVariation")
+    mutation_type = "sv"
+
+
+class CopyNumberVariationRecord(CopyNumberVariationMixin, Record):
+    """Detached record for copy number variations"""
+
+    FIELDS = MUTATION_FIELDS + ["chrom", "start_pos", "end_pos", "size", "fold_change",
+                                "copy_state"]
+    INT_FIELDS = ["library_id", "start_pos", "end_pos", "size", "copy_state"]
+    MODEL = ("mutations", "CopyNumberVariation")
+    mutation_type = "cnv"
+
+
+class GeneFeature(Record):
+    """Detached record for gene annotations (e.g., from GTF files)"""
+
+    FIELDS = ["gene_ensembl_id", "gene_symbol", "biotype", "chrom", "start_pos", "end_pos",
+              "length"]
+    INT_FIELDS = ["start_pos", "end_pos", "length"]
+    MODEL = ("annotations", "Gene")
+    unique_on = ["gene_ensembl_id"]
+
+
+class TranscriptFeature(Record):
+    """Detached record for transcript annotations"""
+
+    FIELDS = ["transcript_ensembl_id", "gene_id", "cds_start_pos", "cds_end_pos", "length"]
+    INT_FIELDS = ["gene_id", "cds_start_pos", "cds_end_pos", "length"]
+    MODEL = ("annotations", "Transcript")
+    unique_on = ["transcript_ensembl_id"]
+
+
+class ExonFeature(Record):
+    """Detached record for exon annotations"""
+
+    FIELDS = ["exon_ensembl_id", "gene_id", "transcript_id", "transcript_start_pos",
+              "transcript_end_pos", "genome_start_pos", "genome_end_pos", "length", "strand",
+              "phase", "end_phase"]
+    INT_FIELDS = ["gene_id", "transcript_id", "transcript_start_pos", "transcript_end_pos",
+                  "genome_start_pos", "genome_end_pos", "length"]
+    MODEL = ("annotations", "Exon")
+    unique_on = ["exon_ensembl_id"]
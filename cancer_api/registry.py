@@ -0,0 +1,144 @@
+"""
+registry.py
+===========
+This submodule contains a registry of file types and parsers, which
+detects the type of a file from its extension and the parser from
+its header (e.g., the `##source=` line or INFO definitions of VCF
+files), such that files from different tools (e.g., Strelka and
+DELLY VCF files) can be opened without naming their parser.
+"""
+
+import re
+from exceptions import CancerApiException
+import files
+import parsers
+
+
+class HeaderRule(object):
+    """Rule matching file headers whose source (i.e. `##source=`
+    lines) contains one of the given names (case-insensitive) and/or
+    which define all of the given INFO IDs.
+    """
+
+    SOURCE_REGEX = re.compile(r"^##source=(.*)$", re.MULTILINE)
+    INFO_REGEX = re.compile(r"^##INFO=<ID=([^,>]+)", re.MULTILINE)
+
+    def __init__(self, sources=None, info_ids=None):
+        self.sources = [source.lower() for source in sources or []]
+        self.info_ids = set(info_ids or [])
+
+    def matches(self, header):
+        if self.sources:
+            header_sources = [source.lower() for source in self.SOURCE_REGEX.findall(header)]
+            if not any(name in source for name in self.sources for source in header_sources):
+                return False
+        if self.info_ids:
+            if not self.info_ids.issubset(self.INFO_REGEX.findall(header)):
+                return False
+        return bool(self.sources or self.info_ids)
+
+
+class ParserRegistry(object):
+    """Registry of file types and of the parsers that apply to them,
+    along with the header rules identifying each parser. Parsers are
+    tried in the order they're registered, falling back on the default
+    parser of the file type if no rule matches.
+    """
+
+    def __init__(self):
+        self.file_types = []
+        self.parser_rules = []
+
+    def register_file_type(self, file_cls):
+        """Register file type, which is detected by extension."""
+        if file_cls not in self.file_types:
+            self.file_types.append(file_cls)
+
+    def register_parser(self, file_cls, parser_cls, *rules):
+        """Register parser for a file type, which is picked if the
+        header matches any of the rules (see HeaderRule).
+        """
+        self.register_file_type(file_cls)
+        self.parser_rules.append((file_cls, parser_cls, rules))
+
+    def get_file_type(self, filepath):
+        """Return file type matching the extension of the given file
+        (optionally compressed), preferring longer extensions.
+        """
+        filename = filepath.lower()
+        for ext in files.BaseFile.COMPRESSION_EXTENSIONS:
+            if filename.endswith("." + ext):
+                filename = filename[:-len(ext) - 1]
+        matches = [(len(ext), file_cls) for file_cls in self.file_types
+                   for ext in file_cls.FILE_EXTENSIONS if filename.endswith("." + ext.lower())]
+        if not matches:
+            raise CancerApiException("Unknown file type: {}".format(filepath))
+        return max(matches, key=lambda match: match[0])[1]
+
+    def get_parser(self, file_cls, header):
+        """Return parser for a file type given the header."""
+        for rule_file_cls, parser_cls, rules in self.parser_rules:
+            if rule_file_cls is file_cls and any(rule.matches(header) for rule in rules):
+                return parser_cls
+        return file_cls.DEFAULT_PARSER_CLS
+
+    def detect(self, filepath, file_cls=None, parser_cls=None):
+        """Return (file type, parser, header) tuple for the given file,
+        detecting the file type and parser unless they're given. The
+        header is returned such that it's only read once (see
+        `BaseFile.set_header`).
+        """
+        file_cls = file_cls or self.get_file_type(filepath)
+        header = file_cls.open(filepath).get_header()
+        return (file_cls, parser_cls or self.get_parser(file_cls, header), header)
+
+    def sniff(self, filepath):
+        """Return (file type, parser) tuple for the given file."""
+        return self.detect(filepath)[:2]
+
+    def open(self, filepath, **kwargs):
+        """Open file with the detected file type and parser. The header
+        is only read once. Other arguments are passed to `open`.
+        """
+        file_cls = self.get_file_type(filepath)
+        opened_file = file_cls.open(filepath, **kwargs)
+        header = opened_file.get_header()
+        parser_cls = self.get_parser(file_cls, header)
+        if type(opened_file.parser) is not parser_cls:
+            opened_file = file_cls.open(filepath, parser_cls=parser_cls, **kwargs)
+        opened_file.set_header(header)
+        return opened_file
+
+
+def _get_default_registry():
+    """Return registry of the file types and parsers of cancer_api."""
+    parser_registry = ParserRegistry()
+    for file_cls in (files.VcfFile, files.BedpeFile, files.BedFile, files.FastqFile,
+                     files.FacteraFile, files.GtfFile, files.Gff3File):
+        parser_registry.register_file_type(file_cls)
+    parser_registry.register_parser(
+        files.VcfFile, parsers.StrelkaVcfParser, HeaderRule(sources=["strelka"]),
+        HeaderRule(info_ids=["QSS"]), HeaderRule(info_ids=["QSI"]))
+    parser_registry.register_parser(
+        files.VcfFile, parsers.DellyVcfParser, HeaderRule(sources=["delly"]),
+        HeaderRule(info_ids=["CT", "CHR2"]))
+    parser_registry.register_parser(
+        files.VcfFile, parsers.PavfinderVcfParser, HeaderRule(sources=["pavfinder"]))
+    return parser_registry
+
+
+default_registry = _get_default_registry()
+
+
+def sniff(filepath):
+    """Return (file type, parser) tuple for the given file using
+    the default registry.
+    """
+    return default_registry.sniff(filepath)
+
+
+def open_auto(filepath, **kwargs):
+    """Open file with the file type and parser detected by the
+    default registry (see `ParserRegistry.open`).
+    """
+    return default_registry.open(filepath, **kwargs)
@@ -0,0 +1,116 @@
+"""
+summaries.py
+============
+This submodule contains tables summarizing other tables, such
+as the number of mutations of each type per library, which are
+kept up to date by the bulk loaders and can be recomputed.
+"""
+
+from collections import Counter
+from sqlalchemy import Column, Integer, String, ForeignKey, func
+from sqlalchemy.orm import relationship
+from base import Base
+from mutations import Mutation, StructuralVariation, CopyNumberVariation
+
+
+class MutationSummary(Base):
+    """Model for the number of mutations per library, by mutation
+    type and subtype (i.e. the SV type for SVs and the copy state
+    for CNVs; empty otherwise).
+    """
+
+    id = Column(Integer, primary_key=True)
+    library_id = Column(Integer, ForeignKey("library.id"))
+    mutation_type = Column(String(length=50))
+    subtype = Column(String(length=50))
+    count = Column(Integer)
+
+    library = relationship("Library", backref="mutation_summaries")
+
+    unique_on = ["library_id", "mutation_type", "subtype"]
+
+
+def get_subtype(mutation_type, row):
+    """Return summary subtype for a mutation, given as a dict
+    or object with the subclass attributes.
+    """
+    if mutation_type == "sv":
+        attr = "sv_type"
+    elif mutation_type == "cnv":
+        attr = "copy_state"
+    else:
+        return ""
+    value = row.get(attr) if isinstance(row, dict) else getattr(row, attr, None)
+    return "" if value is None else str(value)
+
+
+def update_mutation_summary(session, counts):
+    """Add counts (dict mapping (library_id, mutation_type, subtype)
+    tuples to numbers of new mutations) to the summary table.
+    The session isn't committed, such that updates can be part
+    of the same transaction as the insertion of the mutations.
+    """
+    table = MutationSummary.__table__
+    for (library_id, mutation_type, subtype), count in counts.iteritems():
+        criteria = ((table.c.library_id == library_id) &
+                    (table.c.mutation_type == mutation_type) & (table.c.subtype == subtype))
+        result = session.execute(table.update().where(criteria).values(
+            count=table.c.count + count))
+        if result.rowcount == 0:
+            session.execute(table.insert().values(
+                library_id=library_id, mutation_type=mutation_type, subtype=subtype,
+                count=count))
+
+
+def refresh_mutation_summary(session, library_ids=None):
+    """Recompute the summary table from the mutation tables
+    (optionally for some libraries only) with grouped queries.
+    Useful after mutations are added without bulk loaders or
+    deleted. Returns the number of summary rows.
+    """
+    counts = Counter()
+    queries = [
+        session.query(Mutation.library_id, Mutation.mutation_type, func.count(Mutation.id))
+        .filter(~Mutation.mutation_type.in_(["sv", "cnv"]))
+        .group_by(Mutation.library_id, Mutation.mutation_type),
+        session.query(StructuralVariation.library_id, StructuralVariation.sv_type,
+                      func.count(StructuralVariation.id))
+        .group_by(StructuralVariation.library_id, StructuralVariation.sv_type),
+        session.query(CopyNumberVariation.library_id, CopyNumberVariation.copy_state,
+                      func.count(CopyNumberVariation.id))
+        .group_by(CopyNumberVariation.library_id, CopyNumberVariation.copy_state)]
+    for mutation_type, query in zip([None, "sv", "cnv"], queries):
+        if library_ids is not None:
+            query = query.filter(Mutation.library_id.in_(list(library_ids)))
+        for library_id, value, count in query:
+            if mutation_type is None:
+                counts[(library_id, value, "")] += count
+            else:
+                subtype = "" if value is None else str(value)
+                counts[(library_id, mutation_type, subtype)] += count
+    table = MutationSummary.__table__
+    delete = table.delete()
+    if library_ids is not None:
+        delete = delete.where(table.c.library_id.in_(list(library_ids)))
+    session.execute(delete)
+    if counts:
+        session.execute(table.insert(), [
+            {"library_id": library_id, "mutation_type": mutation_type, "subtype": subtype,
+             "count": count}
+            for (library_id, mutation_type, subtype), count in counts.iteritems()])
+    session.commit()
+    return len(counts)
+
+
+def get_mutation_summary(session, library_ids=None):
+    """Return dict mapping library IDs to {(mutation_type, subtype):
+    count} dicts from the summary table.
+    """
+    query = session.query(MutationSummary.library_id, MutationSummary.mutation_type,
+                          MutationSummary.subtype, MutationSummary.count)
+    if library_ids is not None:
+        query = query.filter(MutationSummary.library_id.in_(list(library_ids)))
+    summary = {}
+    for library_id, mutation_type, subtype, count in query:
+        summary.setdefault(library_id, {})[(mutation_type, subtype)] = count
+    return summary
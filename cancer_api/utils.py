@@ -10,6 +10,9 @@ import sys
 import logging
 import time
 import gzip
+import warnings
+from collections import OrderedDict
+from instrumentation import metrics
 
 
 def setup_logging():
@@ -44,29 +47,119 @@ def open_file(filepath, mode="r", *args, **kwargs):
     return opened_file
 
 
+class ChromosomeOrder(object):
+    """Convenience class for ordering chromosomes. By default,
+    chromosomes are sorted in karyotypic order (i.e., 1, 2, ...,
+    22, X, Y, M) regardless of a 'chr' prefix, followed by any
+    other chromosome in lexicographic order. Alternatively, a
+    list of chromosome names can be given to define the order,
+    in which case unlisted chromosomes are placed at the end.
+    """
+
+    SPECIAL_CHROMS = ["X", "Y", "M", "MT"]
+
+    def __init__(self, chroms=None):
+        self.chroms = list(chroms) if chroms else None
+        self._ranks = {}
+        if self.chroms:
+            for rank, chrom in enumerate(self.chroms):
+                self._ranks[chrom] = (0, rank)
+
+    @classmethod
+    def get(cls, chrom_order=None):
+        """Return ChromosomeOrder instance from either None,
+        a list of chromosome names or a ChromosomeOrder.
+        """
+        if isinstance(chrom_order, cls):
+            return chrom_order
+        return cls(chrom_order)
+
+    def karyotypic_key(self, chrom):
+        """Return sort key for chromosome in karyotypic order."""
+        name = chrom[3:] if chrom.lower().startswith("chr") else chrom
+        if name.isdigit():
+            return (0, int(name), "")
+        elif name.upper() in self.SPECIAL_CHROMS:
+            return (1, self.SPECIAL_CHROMS.index(name.upper()), "")
+        else:
+            return (2, 0, name)
+
+    def key(self, chrom):
+        """Return sort key for chromosome. Keys are cached
+        given that they are computed for every record.
+        """
+        rank = self._ranks.get(chrom)
+        if rank is None:
+            rank = (1,) + self.karyotypic_key(chrom)
+            self._ranks[chrom] = rank
+        return rank
+
+
+class LruCache(object):
+    """Convenience class for caching a limited number of items.
+    Once full, the least recently used item is discarded.
+    """
+
+    def __init__(self, max_size=128):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        """Return cached value (marking it as recently used)
+        or default if the key isn't cached.
+        """
+        if key not in self._items:
+            self.misses += 1
+            return default
+        self.hits += 1
+        value = self._items.pop(key)
+        self._items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._items.pop(key, None)
+        self._items[key] = value
+        if len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        self._items.clear()
+
+
 class Chronometer(object):
     """Convenience class for profiling code.
-    Uses the logging module to output times.
+    Deprecated in favour of `metrics.timer` (see instrumentation).
+    Laps are timed with metrics.timer("chronometer.lap") while
+    metrics are enabled, and only logged at the debug level.
     """
 
     def __init__(self):
         """Set start time"""
-        self.start_time = time.time()
-        self.last_time = self.start_time
-        zero_time = time.time() - time.time()
-        self.laps = [("start time", zero_time)]
+        warnings.warn("Chronometer is deprecated; use metrics.timer instead.",
+                      DeprecationWarning, stacklevel=2)
+        self.reset()
 
     def reset(self):
         """Reset start time"""
         self.start_time = time.time()
         self.last_time = self.start_time
+        self._timer = metrics.timer("chronometer.lap").__enter__()
 
     def lap(self, label=""):
-        """Record and print time"""
+        """Record time since the last lap and log it (debug level)"""
+        self._timer.__exit__(None, None, None)
         current_time = time.time()
         delta = current_time - self.last_time
-        self.laps.append((label, delta))
         # Set template according to whether a label is specified
         template = "{delta} sec" if label is "" else "{label}: {delta:.8f} sec"
-        logging.info(template.format(label=label, delta=delta))
+        logging.debug(template.format(label=label, delta=delta))
         self.last_time = current_time
+        self._timer = metrics.timer("chronometer.lap").__enter__()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+
+"""
+benchmarks.py
+=============
+Benchmark suite for the performance-sensitive parts of cancer_api
+(parsers, writers, overlaps and database loading). Synthetic inputs
+are generated with a fixed seed, such that results are comparable
+between runs. Not collected by the test runner.
+
+Usage (from the repository root):
+    python -m tests.benchmarks --size 10000 --output results.json
+    python -m tests.benchmarks --compare results.json
+
+In comparison mode, benchmarks whose time per item increased by more
+than the threshold (10% by default) are reported as regressions and
+the script exits with a non-zero status.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import cancer_api as ca
+
+
+# ============================================================================================== #
+# Synthetic inputs
+# ============================================================================================== #
+
+CHROMS = [str(chrom) for chrom in range(1, 23)] + ["X", "Y"]
+BASES = "ACGT"
+VCF_HEADER = "##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+
+def random_locus(rand):
+    return rand.choice(CHROMS), rand.randint(1, 100000000)
+
+
+def generate_vcf(rand, size):
+    lines = [VCF_HEADER]
+    for _ in range(size):
+        chrom, pos = random_locus(rand)
+        ref = rand.choice(BASES)
+        alt = rand.choice(BASES.replace(ref, ""))
+        if rand.random() < 0.1:
+            alt = ref + "".join(rand.choice(BASES) for _ in range(rand.randint(1, 10)))
+        lines.append("{}\t{}\t.\t{}\t{}\t50\tPASS\tDP={}\n".format(
+            chrom, pos, ref, alt, rand.randint(10, 100)))
+    return "".join(lines)
+
+
+def generate_delly_vcf(rand, size):
+    lines = [VCF_HEADER]
+    for i in range(size):
+        chrom1, pos1 = random_locus(rand)
+        sv_type = rand.choice(["DEL", "DUP", "INV", "TRA"])
+        if sv_type == "TRA":
+            chrom2, pos2 = random_locus(rand)
+        else:
+            chrom2, pos2 = chrom1, pos1 + rand.randint(100, 100000)
+        lines.append("{}\t{}\tsv{}\tN\t<{}>\t.\tPASS\tSVTYPE={};CHR2={};END={};CT={}\n".format(
+            chrom1, pos1, i, sv_type, sv_type, chrom2, pos2,
+            rand.choice(["3to5", "5to3", "3to3", "5to5"])))
+    return "".join(lines)
+
+
+def generate_bed(rand, size):
+    lines = []
+    for i in range(size):
+        chrom, start = random_locus(rand)
+        lines.append("{}\t{}\t{}\tregion{}\n".format(chrom, start, start + rand.randint(1, 5000),
+                                                      i))
+    return "".join(lines)
+
+
+def generate_bedpe(rand, size):
+    lines = [ca.BedpeFile.DEFAULT_HEADER]
+    for i in range(size):
+        (chrom1, pos1), (chrom2, pos2) = random_locus(rand), random_locus(rand)
+        lines.append("{}\t{}\t{}\t{}\t{}\t{}\tsv{}\t.\t{}\t{}\n".format(
+            chrom1, pos1 - 1, pos1, chrom2, pos2 - 1, pos2, i, rand.choice("+-"),
+            rand.choice("+-")))
+    return "".join(lines)
+
+
+def generate_fastq(rand, size, read_length=100):
+    lines = []
+    for i in range(size):
+        seq = "".join(rand.choice(BASES) for _ in range(read_length))
+        qual = "".join(rand.choice("#<@BFGHIJ") for _ in range(read_length))
+        lines.append("@read{}/1\n{}\n+\n{}\n".format(i, seq, qual))
+    return "".join(lines)
+
+
+def generate_factera(rand, size):
+    columns = ["Est_Type"] + ca.FacteraParser.BASE_COLUMNS[1:]
+    lines = ["\t".join(columns) + "\n"]
+    for _ in range(size):
+        (chrom1, pos1), (chrom2, pos2) = random_locus(rand), random_locus(rand)
+        values = [rand.choice(["DEL", "INV", "TRA"]), "region1", "region2",
+                  "{}:{}".format(chrom1, pos1), "{}:{}".format(chrom2, pos2)]
+        values += [str(rand.randint(1, 50)) for _ in range(2)] + ["0", "(+)(-)", "1", "2"]
+        values += [str(rand.randint(1, 100)) for _ in range(6)] + ["ACGTACGT", "."]
+        lines.append("\t".join(values) + "\n")
+    return "".join(lines)
+
+
+GENERATORS = {
+    "vcf": ("variants.vcf", generate_vcf),
+    "delly": ("delly.vcf", generate_delly_vcf),
+    "bed": ("regions.bed", generate_bed),
+    "bedpe": ("svs.bedpe", generate_bedpe),
+    "fastq": ("reads.fastq", generate_fastq),
+    "factera": ("fusions.txt", generate_factera),
+}
+
+
+def generate_inputs(tmp_dir, size, seed):
+    """Write synthetic input files and return their paths."""
+    rand = random.Random(seed)
+    filepaths = {}
+    for name, (filename, generator) in sorted(GENERATORS.items()):
+        filepaths[name] = os.path.join(tmp_dir, filename)
+        with open(filepaths[name], "w") as outfile:
+            outfile.write(generator(rand, size))
+    return filepaths
+
+
+# ============================================================================================== #
+# Benchmarks
+# ============================================================================================== #
+
+# Each benchmark takes the input file paths and the size, runs the
+# timed code and returns the number of items processed
+
+
+def bench_vcf_parser(filepaths, size):
+    return sum(1 for _ in ca.VcfFile.open(filepaths["vcf"]))
+
+
+def bench_delly_vcf_parser(filepaths, size):
+    return sum(1 for _ in ca.VcfFile.open(filepaths["delly"], parser_cls=ca.DellyVcfParser))
+
+
+def bench_bed_parser(filepaths, size):
+    return sum(1 for _ in ca.BedFile.open(filepaths["bed"]))
+
+
+def bench_factera_parser(filepaths, size):
+    return sum(1 for _ in ca.FacteraFile.open(filepaths["factera"]))
+
+
+def bench_fastq_iter(filepaths, size):
+    return sum(1 for _ in ca.FastqFile.open(filepaths["fastq"]))
+
+
+def bench_bedpe_obj_to_str(filepaths, size):
+    svs = list(ca.BedpeFile.open(filepaths["bedpe"]))
+    start_time = time.time()
+    for sv in svs:
+        ca.BedpeFile.obj_to_str(sv)
+    # Only the conversion is timed
+    return len(svs), time.time() - start_time
+
+
+def bench_interval_overlap(filepaths, size):
+    rand = random.Random(size)
+    intervals = []
+    for _ in range(size):
+        chrom, start = rand.choice(CHROMS[:2]), rand.randint(1, 100000)
+        intervals.append(ca.GenomicInterval(chrom, start, start + rand.randint(0, 1000)))
+    start_time = time.time()
+    for interval1, interval2 in zip(intervals, reversed(intervals)):
+        interval1.is_overlap(interval2, margin=10)
+    return len(intervals), time.time() - start_time
+
+
+def bench_get_or_create(filepaths, size):
+    session = ca.Session(ca.SqliteConnection())
+    session.create_tables()
+    # Database loading is much slower, so fewer items are used
+    num_genes = max(size // 10, 1)
+    for i in range(num_genes):
+        # Every other gene already exists
+        ca.Gene.get_or_create(session, gene_ensembl_id="ENSG{:011d}".format(i // 2), chrom="1",
+                              start_pos=i, end_pos=i + 100, length=101)
+        session.flush()
+    session.commit()
+    session.close()
+    return num_genes
+
+
+BENCHMARKS = [
+    ("vcf_parser", bench_vcf_parser),
+    ("delly_vcf_parser", bench_delly_vcf_parser),
+    ("bed_parser", bench_bed_parser),
+    ("factera_parser", bench_factera_parser),
+    ("fastq_iter", bench_fastq_iter),
+    ("bedpe_obj_to_str", bench_bedpe_obj_to_str),
+    ("interval_overlap", bench_interval_overlap),
+    ("get_or_create", bench_get_or_create),
+]
+
+
+def run_benchmark(func, filepaths, size, repeats):
+    """Return result dict with the best and median times over
+    a number of repeats. Benchmarks can time part of their code
+    by returning (num_items, seconds) instead of num_items.
+    """
+    times = []
+    for _ in range(repeats):
+        start_time = time.time()
+        result = func(filepaths, size)
+        elapsed = time.time() - start_time
+        if isinstance(result, tuple):
+            num_items, elapsed = result
+        else:
+            num_items = result
+        times.append(elapsed)
+    times.sort()
+    best = times[0]
+    return {
+        "items": num_items,
+        "best_seconds": best,
+        "median_seconds": times[len(times) // 2],
+        "seconds_per_item": best / num_items if num_items else None,
+        "items_per_second": num_items / best if best > 0 else None
+    }
+
+
+def run_benchmarks(size, repeats, seed, names=None):
+    """Run benchmarks on synthetic inputs and return results dict."""
+    tmp_dir = tempfile.mkdtemp(prefix="cancer_api_benchmarks_")
+    try:
+        filepaths = generate_inputs(tmp_dir, size, seed)
+        results = {}
+        for name, func in BENCHMARKS:
+            if names and name not in names:
+                continue
+            results[name] = run_benchmark(func, filepaths, size, repeats)
+            sys.stderr.write("{:<20} {:>12.0f} items/s\n".format(
+                name, results[name]["items_per_second"] or 0))
+    finally:
+        shutil.rmtree(tmp_dir)
+    metadata = {
+        "cancer_api_version": ca.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "size": size,
+        "repeats": repeats,
+        "seed": seed
+    }
+    return {"metadata": metadata, "results": results}
+
+
+def compare_results(baseline, current, threshold):
+    """Return list of (name, baseline, current, ratio, is_regression)
+    tuples comparing the time per item of common benchmarks.
+    """
+    comparisons = []
+    for name in sorted(current["results"]):
+        if name not in baseline["results"]:
+            continue
+        old = baseline["results"][name]["seconds_per_item"]
+        new = current["results"][name]["seconds_per_item"]
+        if not old or not new:
+            continue
+        ratio = new / old
+        comparisons.append((name, old, new, ratio, ratio > 1 + threshold))
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run cancer_api benchmarks.")
+    parser.add_argument("--size", type=int, default=10000,
+                        help="Number of records in synthetic inputs")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of runs per benchmark")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for synthetic inputs")
+    parser.add_argument("--only", nargs="+", help="Only run these benchmarks")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    parser.add_argument("--compare", help="Compare results with a baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Slowdown (fraction) reported as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.size, args.repeats, args.seed, args.only)
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+    elif not args.compare:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+    if args.compare:
+        with open(args.compare) as infile:
+            baseline = json.load(infile)
+        comparisons = compare_results(baseline, results, args.threshold)
+        print "{:<20} {:>14} {:>14} {:>8}".format("benchmark", "baseline (us)", "current (us)",
+                                                  "ratio")
+        for name, old, new, ratio, is_regression in comparisons:
+            print "{:<20} {:>14.3f} {:>14.3f} {:>8.2f}{}".format(
+                name, old * 1e6, new * 1e6, ratio, "  REGRESSION" if is_regression else "")
+        if any(comparison[4] for comparison in comparisons):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+VCF_HEADER = "##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+VCF_TEMPLATE = "{}\t{}\t.\tA\tG\t50\tPASS\tDP=10\n"
+
+
+def write_file(dirpath, filename, content):
+    """Write content to a new file and return its path."""
+    filepath = os.path.join(dirpath, filename)
+    with open(filepath, "w") as outfile:
+        outfile.write(content)
+    return filepath
+
+
+def read_positions(filepath):
+    """Return (chrom, pos) tuples for non-header lines in file."""
+    with ca.utils.open_file(filepath) as infile:
+        return [tuple(line.split("\t")[:2]) for line in infile if not line.startswith("#")]
+
+
+class TestMerge(unittest.TestCase):
+    """Test merging sorted files
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.vcf1 = ca.VcfFile.open(write_file(self.tmp_dir, "a.vcf", VCF_HEADER + "".join(
+            VCF_TEMPLATE.format(chrom, pos) for chrom, pos in
+            [("1", 100), ("1", 300), ("2", 50), ("X", 10)])))
+        self.vcf2 = ca.VcfFile.open(write_file(self.tmp_dir, "b.vcf", VCF_HEADER + "".join(
+            VCF_TEMPLATE.format(chrom, pos) for chrom, pos in
+            [("1", 200), ("10", 5), ("X", 5)])))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_merge(self):
+        """Test merging VCF files in karyotypic order"""
+        filepath = os.path.join(self.tmp_dir, "merged.vcf")
+        merged = ca.VcfFile.merge(filepath, [self.vcf1, self.vcf2])
+        self.assertEqual(merged.get_header(), VCF_HEADER)
+        self.assertEqual(read_positions(filepath), [
+            ("1", "100"), ("1", "200"), ("1", "300"), ("2", "50"), ("10", "5"), ("X", "5"),
+            ("X", "10")])
+        self.assertEqual(len(list(merged)), 7)
+
+    def test_merge_unsorted(self):
+        """Test that merging unsorted files raises an exception"""
+        filepath = os.path.join(self.tmp_dir, "merged.vcf")
+        with self.assertRaises(ca.CancerApiException):
+            ca.VcfFile.merge(filepath, [self.vcf1, self.vcf2], chrom_order=["X", "1", "2"])
+        # No partial output is left behind, such that merging can be retried
+        self.assertFalse(os.path.exists(filepath))
+        ca.VcfFile.merge(filepath, [self.vcf1, self.vcf2])
+
+
+class TestSort(unittest.TestCase):
+    """Test sorting files
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.positions = [("X", 10), ("1", 300), ("2", 50), ("1", 100), ("10", 5), ("1", 200),
+                          ("chrUn", 1), ("2", 10)]
+        self.bed = ca.BedFile.open(write_file(self.tmp_dir, "a.bed", "".join(
+            "{}\t{}\t{}\n".format(chrom, pos, pos + 10) for chrom, pos in self.positions)))
+        self.expected = [("1", "100"), ("1", "200"), ("1", "300"), ("2", "10"), ("2", "50"),
+                         ("10", "5"), ("X", "10"), ("chrUn", "1")]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sort_in_memory(self):
+        """Test sorting file that fits in memory"""
+        filepath = os.path.join(self.tmp_dir, "sorted.bed")
+        sorted_bed = self.bed.sort(filepath)
+        self.assertEqual(read_positions(filepath), self.expected)
+        self.assertEqual(len(list(sorted_bed)), len(self.positions))
+
+    def test_sort_external(self):
+        """Test sorting file with compressed runs on disk"""
+        filepath = os.path.join(self.tmp_dir, "sorted.bed.gz")
+        self.bed.sort(filepath, max_buffer_size=20, compress_tmp=True)
+        self.assertEqual(read_positions(filepath), self.expected)
+        # Sorted files can then be merged
+        merged_filepath = os.path.join(self.tmp_dir, "merged.bed")
+        ca.BedFile.merge(merged_filepath, [ca.BedFile.open(filepath)] * 2)
+        self.assertEqual(len(read_positions(merged_filepath)), 2 * len(self.positions))
+
+    def test_sort_stable(self):
+        """Test that lines at the same position keep their order"""
+        names = ["z", "b", "y", "a", "x"]
+        bed = ca.BedFile.open(write_file(self.tmp_dir, "ties.bed", "".join(
+            "1\t100\t110\t{}\n".format(name) for name in names) + "1\t50\t60\tfirst\n"))
+        for max_buffer_size in (100000000, 20, 40):
+            filepath = os.path.join(self.tmp_dir, "sorted_{}.bed".format(max_buffer_size))
+            bed.sort(filepath, max_buffer_size=max_buffer_size)
+            with open(filepath) as infile:
+                sorted_names = [line.rstrip("\n").split("\t")[3] for line in infile]
+            self.assertEqual(sorted_names, ["first"] + names)
+
+    def test_sort_bedpe(self):
+        """Test sorting BEDPE file"""
+        bedpe = ca.BedpeFile.open(write_file(self.tmp_dir, "a.bedpe", ca.BedpeFile.DEFAULT_HEADER +
+            "2\t500\t501\t3\t100\t101\tsv1\t\t+\t-\n"
+            "1\t900\t901\t1\t1000\t1001\tsv2\t\t.\t.\n"))
+        sorted_bedpe = bedpe.sort(os.path.join(self.tmp_dir, "sorted.bedpe"))
+        svs = list(sorted_bedpe)
+        self.assertEqual([(sv.chrom1, sv.pos1) for sv in svs], [("1", 900), ("2", 500)])
+        self.assertEqual((svs[1].strand1, svs[1].strand2), ("+", "-"))
+
+
+class TestFasta(unittest.TestCase):
+    """Test random access to FASTA files
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.sequences = [("1", "ACGTACGTAC" * 5 + "GGG"), ("2", "TTTTCCCCAA")]
+        content = "".join(">{} description\n{}\n".format(
+            name, "\n".join(seq[i:i + 12] for i in range(0, len(seq), 12)))
+            for name, seq in self.sequences)
+        self.filepath = write_file(self.tmp_dir, "ref.fa", content)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_fetch(self):
+        """Test fetching regions across lines and cache blocks"""
+        with ca.FastaFile.open(self.filepath, block_size=7, cache_size=2) as fasta:
+            self.assertEqual(fasta.chroms, ["1", "2"])
+            self.assertEqual(fasta.get_length("1"), 53)
+            seq = self.sequences[0][1]
+            for start, end in [(1, 1), (1, 53), (10, 30), (12, 13), (50, 60), (0, 3)]:
+                self.assertEqual(fasta.fetch("1", start, end), seq[max(start, 1) - 1:end])
+            self.assertEqual(fasta.fetch("2", 4, 6), "TCC")
+            # Nearby regions are fetched from the cache
+            fasta.fetch("2", 5, 6)
+            self.assertTrue(fasta.cache.hits > 0)
+            with self.assertRaises(ca.CancerApiException):
+                fasta.fetch("3", 1, 2)
+        with open(self.filepath + ".fai") as infile:
+            self.assertEqual(infile.readline(), "1\t53\t15\t12\t13\n")
+
+    def test_stale_index(self):
+        """Test that indexes older than the file are rebuilt"""
+        ca.FastaFile.open(self.filepath).close()
+        write_file(self.tmp_dir, "ref.fa", ">1\nGATTACA\n")
+        os.utime(self.filepath + ".fai", (0, 0))
+        with ca.FastaFile.open(self.filepath) as fasta:
+            self.assertEqual((fasta.chroms, fasta.fetch("1", 1, 7)), (["1"], "GATTACA"))
+
+    def test_empty_sequences(self):
+        """Test indexing sequences without bases and empty files"""
+        filepath = write_file(self.tmp_dir, "empty_seq.fa", ">a\n>b\nACGT\n")
+        with ca.FastaFile.open(filepath) as fasta:
+            self.assertEqual((fasta.get_length("a"), fasta.fetch("a", 1, 2)), (0, ""))
+            self.assertEqual(fasta.fetch("b", 2, 3), "CG")
+        filepath = write_file(self.tmp_dir, "empty.fa", "")
+        with ca.FastaFile.open(filepath) as fasta:
+            self.assertEqual(fasta.chroms, [])
+
+    def test_inconsistent_lines(self):
+        """Test that indexing files with uneven lines raises an exception"""
+        filepath = write_file(self.tmp_dir, "bad.fa", ">1\nACGT\nAC\nACGT\n")
+        with self.assertRaises(ca.CancerApiException):
+            ca.FastaFile.open(filepath)
+
+
+class TestFilters(unittest.TestCase):
+    """Test filtering lines before parsing
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        lines = []
+        for chrom in ("1", "2", "X"):
+            for pos in range(1, 11):
+                qual = "." if pos == 10 else str(pos * 10)
+                status = "PASS" if pos % 2 else "LowQual"
+                info = "SVTYPE=DEL;DP=5" if pos < 4 else "DP={}".format(pos)
+                lines.append("\t".join([chrom, str(pos), ".", "A", "G", qual, status, info]))
+        self.filepath = write_file(self.tmp_dir, "a.vcf", VCF_HEADER + "\n".join(lines) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def get_loci(self, filters):
+        return [obj.get_locus() for obj in ca.VcfFile.open(self.filepath, filters=filters)]
+
+    def test_filters(self):
+        """Test declarative filters on raw columns"""
+        self.assertEqual(len(self.get_loci([ca.PassFilter()])), 15)
+        qual_filter = ca.ColumnFilter("qual", min_value=85)
+        self.assertEqual(self.get_loci([ca.ChromFilter(["X"]), qual_filter]), [("X", 9)])
+        self.assertEqual(self.get_loci([ca.ChromFilter(["2"]), ca.InfoFilter("SVTYPE", ["DEL"])]),
+                         [("2", 1), ("2", 2), ("2", 3)])
+        self.assertEqual(len(self.get_loci([ca.InfoFilter("DP", min_value=9)])), 6)
+        # Filters can also be given when iterating
+        vcf_file = ca.VcfFile.open(self.filepath, filters=[ca.ChromFilter(["1", "X"])])
+        lines = list(vcf_file.iterlines(filters=[ca.ColumnFilter(1, ["5"])]))
+        self.assertEqual([line.split("\t")[0] for line in lines], ["1", "X"])
+        with self.assertRaises(ca.CancerApiException):
+            self.get_loci([ca.ColumnFilter("missing", ["1"])])
+
+    def test_chrom_index(self):
+        """Test skipping blocks of other chromosomes"""
+        vcf_file = ca.VcfFile.open(self.filepath, filters=[ca.ChromFilter(["2"])])
+        self.assertIsNone(vcf_file.read_chrom_index())
+        blocks = vcf_file.build_chrom_index()
+        self.assertEqual([block[0] for block in blocks], ["1", "2", "X"])
+        self.assertEqual(blocks[0][1], len(VCF_HEADER))
+        self.assertEqual(vcf_file.read_chrom_index(), blocks)
+        self.assertEqual(self.get_loci([ca.ChromFilter(["2"])]),
+                         [("2", pos) for pos in range(1, 11)])
+        # Only the lines of the selected block are read
+        with open(self.filepath) as infile:
+            raw_lines = list(vcf_file._iterraw(infile, vcf_file._get_line_filter()))
+        self.assertEqual(len(raw_lines), 10)
+        offsets = list(vcf_file.iteroffsets())
+        self.assertEqual(offsets[-1][1], blocks[1][2])
+        self.assertEqual(list(vcf_file.iteroffsets(start_offset=offsets[0][1])), offsets[1:])
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+VCF = ("##fileformat=VCFv4.1\n"
+       "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\tS3\n"
+       "1\t100\t.\tA\tG\t50\tPASS\t.\tGT:AD:DP\t0/1:6,4:10\t1/1:0,8:8\t./.:.:.\n"
+       "1\t200\t.\tC\tT,G\t50\tPASS\t.\tGT:AD:DP\t1|2:1,3,5:9\t0/0:12,0:12\t0/0:7,0\n"
+       "2\t300\t.\tG\tA\t50\tLowQual\t.\tDP:GT\t5:0/0\t7:0/1\t3\n")
+
+
+class TestGenotypes(unittest.TestCase):
+    """Test extracting genotype matrices
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmp_dir, "cohort.vcf")
+        with open(self.filepath, "w") as outfile:
+            outfile.write(VCF)
+        self.vcf_file = ca.VcfFile.open(self.filepath)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_matrices(self):
+        """Test dosages and depths, including missing values"""
+        chunks = list(ca.iter_genotype_chunks(self.vcf_file, chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        chunk = chunks[0]
+        self.assertEqual(list(chunk.dosages), [1, 2, -1, 2, 0, 0])
+        self.assertEqual(list(chunk.get_row("ref_depths", 1)), [1, 12, 7])
+        self.assertEqual(list(chunk.get_row("alt_depths", 1)), [8, 0, 0])
+        self.assertEqual(chunk.get("depths", 1, "S3"), -1)
+        self.assertEqual((chunk.chroms, list(chunk.positions)), (["1", "1"], [100, 200]))
+        # FORMAT fields in another order, with trailing fields dropped
+        self.assertEqual(list(chunks[1].dosages), [0, 1, -1])
+        self.assertEqual(list(chunks[1].depths), [5, 7, 3])
+
+    def test_missing_allele_depths(self):
+        """Test that alternate depths are missing if any allele depth is"""
+        reader = ca.GenotypeReader(self.vcf_file)
+        chunk = ca.GenotypeChunk(reader.samples)
+        reader.add_line(chunk, "1\t100\t.\tA\tG,T\t50\tPASS\t.\tGT:AD\t"
+                               "0/1:5,.,3\t0/1:5,2,3\t0/1:.,.,.\n")
+        self.assertEqual(list(chunk.ref_depths), [5, 5, -1])
+        self.assertEqual(list(chunk.alt_depths), [-1, 5, -1])
+
+    def test_cohort_stats(self):
+        """Test allele frequencies and carrier counts"""
+        chunk = next(ca.iter_genotype_chunks(self.vcf_file, samples=["S3", "S1"]))
+        self.assertEqual(chunk.samples, ["S3", "S1"])
+        self.assertEqual(chunk.get_allele_frequencies(), [0.5, 0.5, 0.0])
+        self.assertEqual(chunk.get_carrier_counts(), [0, 2])
+        self.assertEqual(ca.get_carrier_counts(self.vcf_file, chunk_size=1).items(),
+                         [("S1", 2), ("S2", 2), ("S3", 0)])
+        # Filters apply before extraction
+        vcf_file = ca.VcfFile.open(self.filepath, filters=[ca.PassFilter()])
+        self.assertEqual(ca.get_carrier_counts(vcf_file).values(), [2, 1, 0])
+        with self.assertRaises(ca.CancerApiException):
+            ca.iter_genotype_chunks(self.vcf_file, samples=["S4"])
+
+    def test_pure_python_stats(self):
+        """Test that statistics don't depend on numpy being available"""
+        chunk = next(ca.iter_genotype_chunks(self.vcf_file))
+        expected = (chunk.get_allele_frequencies(), chunk.get_carrier_counts())
+        numpy = ca.genotypes.numpy
+        ca.genotypes.numpy = None
+        try:
+            self.assertEqual((chunk.get_allele_frequencies(), chunk.get_carrier_counts()),
+                             expected)
+        finally:
+            ca.genotypes.numpy = numpy
+        self.assertEqual(expected, ([0.75, 1 / 3.0, 0.25], [2, 2, 0]))
+
+    def test_dosage(self):
+        """Test converting genotypes to dosages"""
+        self.assertEqual([ca.get_dosage(gt) for gt in ["0/1", "2/2", "0|2|1", "1/.", "."]],
+                         [1, 2, 2, -1, -1])
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+class TestAnnotationIndex(unittest.TestCase):
+    """Test annotation index lookups
+    """
+
+    def setUp(self):
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+        self.tmp_dir = tempfile.mkdtemp()
+        # Forward-strand gene with two exons and a long reverse-strand gene
+        gene1 = ca.Gene(gene_ensembl_id="G1", gene_symbol="GENE1", chrom="1", start_pos=100,
+                        end_pos=500)
+        gene2 = ca.Gene(gene_ensembl_id="G2", gene_symbol="GENE2", chrom="1", start_pos=50,
+                        end_pos=5000)
+        gene3 = ca.Gene(gene_ensembl_id="G3", chrom="2", start_pos=1000, end_pos=2000)
+        t1 = ca.Transcript(transcript_ensembl_id="T1", gene=gene1, cds_start_pos=51,
+                           cds_end_pos=200, length=301)
+        t2 = ca.Transcript(transcript_ensembl_id="T2", gene=gene3, length=101)
+        self.session.add_all([gene1, gene2, gene3, t1, t2])
+        self.session.flush()
+        self.session.add_all([
+            ca.Exon(exon_ensembl_id="E2", gene_id=gene1.id, transcript_id=t1.id,
+                    transcript_start_pos=101, transcript_end_pos=301, genome_start_pos=300,
+                    genome_end_pos=500, strand="1", phase="2", end_phase="-1"),
+            ca.Exon(exon_ensembl_id="E1", gene_id=gene1.id, transcript_id=t1.id,
+                    transcript_start_pos=1, transcript_end_pos=100, genome_start_pos=100,
+                    genome_end_pos=199, strand="1", phase="-1", end_phase="2"),
+            ca.Exon(exon_ensembl_id="E3", gene_id=gene3.id, transcript_id=t2.id,
+                    transcript_start_pos=1, transcript_end_pos=101, genome_start_pos=1000,
+                    genome_end_pos=1100, strand="-1", phase="-1", end_phase="-1")])
+        self.session.commit()
+        self.index = ca.AnnotationIndex.from_session(self.session)
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def check_lookups(self, index):
+        """Check lookups that should hold for any copy of the index."""
+        self.assertEqual((index.num_genes, index.num_transcripts, index.num_exons), (3, 2, 3))
+        self.assertEqual([gene.gene_symbol for gene in index.find_genes("1", 150)],
+                         ["GENE2", "GENE1"])
+        # Long genes starting upstream are found as well
+        self.assertEqual([gene.gene_ensembl_id for gene in index.find_genes("1", 4000, 6000)],
+                         ["G2"])
+        self.assertEqual(index.find_genes("3", 150), [])
+        self.assertEqual(index.find_genes("2", 1500)[0].gene_symbol, None)
+        self.assertEqual(index.find_exons("1", 250), [])
+        exons = index.find_exons("1", 150, 350)
+        self.assertEqual([exon.exon_ensembl_id for exon in exons], ["E1", "E2"])
+        self.assertEqual((exons[0].chrom, exons[0].end_phase, exons[0].strand), ("1", 2, 1))
+        transcript = index.get_transcript(exons[0].transcript_index)
+        self.assertEqual(transcript.transcript_ensembl_id, "T1")
+        self.assertEqual([exon.exon_ensembl_id for exon in
+                          index.get_transcript_exons(transcript.index)], ["E1", "E2"])
+        # Coding positions account for the exon's offset in the transcript
+        self.assertEqual(index.find_cds("1", 120), [])
+        self.assertEqual([hit.cds_pos for hit in index.find_cds("1", 150)], [1])
+        self.assertEqual([hit.cds_pos for hit in index.find_cds("1", 300)], [51])
+        self.assertEqual(index.find_cds("1", 450), [])
+        # Non-coding transcripts have no coding hits
+        self.assertEqual(index.find_cds("2", 1050), [])
+        self.assertEqual(index.get_exon(index.find_exons("2", 1050)[0].index).chrom, "2")
+
+    def test_lookups(self):
+        """Test lookups on index built from the database"""
+        self.check_lookups(self.index)
+
+    def test_save_and_load(self):
+        """Test lookups on memory-mapped index file"""
+        filepath = os.path.join(self.tmp_dir, "annotations.idx")
+        self.index.save(filepath)
+        index = ca.AnnotationIndex.load(filepath)
+        self.check_lookups(index)
+        index.close()
+
+    def test_load_invalid(self):
+        """Test that loading another file raises an exception"""
+        filepath = os.path.join(self.tmp_dir, "annotations.idx")
+        with open(filepath, "w") as outfile:
+            outfile.write("not an index" * 10)
+        with self.assertRaises(ca.CancerApiException):
+            ca.AnnotationIndex.load(filepath)
@@ -0,0 +1,121 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import warnings
+import cancer_api as ca
+
+
+VCF_HEADER = "##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+VCF_LINE = "1\t100\t.\tA\tG\t50\tPASS\tDP=10\n"
+
+
+class TestHistogram(unittest.TestCase):
+    """Test histogram summaries
+    """
+
+    def test_percentiles(self):
+        """Test approximate percentiles from power-of-two buckets"""
+        histogram = ca.Histogram()
+        for value in [1, 1, 1, 3, 100]:
+            histogram.observe(value)
+        self.assertEqual((histogram.count, histogram.min, histogram.max), (5, 1, 100))
+        self.assertEqual(histogram.mean, 106 / 5.0)
+        self.assertEqual(histogram.percentile(0.5), 2.0)
+        self.assertEqual(histogram.percentile(0.8), 4.0)
+        # Upper bucket bounds are capped by the maximum
+        self.assertEqual(histogram.percentile(1.0), 100)
+        # Averages of several observations
+        histogram.observe(0, count=5)
+        self.assertEqual((histogram.count, histogram.percentile(0.5)), (10, 0.0))
+
+
+class TestMetrics(unittest.TestCase):
+    """Test instrumentation of reading, writing and loading
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmp_dir, "input.vcf")
+        with open(self.filepath, "w") as outfile:
+            outfile.write(VCF_HEADER + VCF_LINE * 3)
+        ca.metrics.reset()
+
+    def tearDown(self):
+        ca.metrics.disable()
+        ca.metrics.reset()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_disabled(self):
+        """Test that nothing is recorded while disabled"""
+        self.assertEqual(len(list(ca.VcfFile.open(self.filepath))), 3)
+        ca.metrics.count("custom")
+        with ca.metrics.timer("custom.timer"):
+            pass
+        self.assertEqual((ca.metrics.counters, ca.metrics.histograms), ({}, {}))
+
+    def test_chronometer(self):
+        """Test that the deprecated Chronometer records laps as timings"""
+        ca.metrics.enable()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            chrono = ca.utils.Chronometer()
+        self.assertEqual(caught[0].category, DeprecationWarning)
+        for gene in ("GENE1", "GENE2", "GENE3"):
+            chrono.lap(gene)
+        # Laps share one histogram, whatever their labels
+        self.assertEqual(ca.metrics.histograms.keys(), ["chronometer.lap"])
+        self.assertEqual(ca.metrics.histograms["chronometer.lap"].count, 3)
+        self.assertFalse(hasattr(chrono, "laps"))
+
+    def test_read_and_write(self):
+        """Test counts of lines, bytes and records"""
+        ca.metrics.enable()
+        self.assertEqual(len(list(ca.VcfFile.open(self.filepath))), 3)
+        counters = ca.metrics.counters
+        self.assertEqual((counters["read.lines"], counters["parse.records"]), (5, 3))
+        self.assertEqual(counters["read.bytes"], os.path.getsize(self.filepath))
+        self.assertEqual(ca.metrics.histograms["parse.VcfParser"].count, 3)
+        # Converted files read the source and write its records
+        outfilepath = os.path.join(self.tmp_dir, "output.vcf")
+        ca.VcfFile.convert(outfilepath, ca.VcfFile.open(self.filepath)).write()
+        self.assertEqual((counters["read.lines"], counters["write.records"]), (10, 3))
+        self.assertEqual(ca.metrics.histograms["write"].count, 1)
+
+    def test_loader(self):
+        """Test flush latency and row counts of bulk loaders"""
+        session = ca.Session(ca.SqliteConnection())
+        session.create_tables()
+        ca.metrics.enable()
+        loader = ca.BulkLoader(session, ca.Gene, batch_size=2)
+        for i in range(3):
+            loader.add({"gene_ensembl_id": "G{}".format(i), "chrom": "1"})
+        loader.close()
+        session.close()
+        self.assertEqual(ca.metrics.counters["loader.rows"], 3)
+        self.assertEqual(ca.metrics.counters["loader.gene.rows"], 3)
+        self.assertEqual(ca.metrics.histograms["loader.flush"].count, 2)
+        self.assertEqual(ca.metrics.snapshot()["histograms"]["loader.flush"]["count"], 2)
+
+    def test_report(self):
+        """Test that reports are logged once the interval elapsed"""
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        logger = logging.getLogger()
+        logger.addHandler(handler)
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        try:
+            ca.metrics.enable(report_interval=3600)
+            ca.metrics.count("records", 10)
+            ca.metrics.maybe_report()
+            self.assertEqual(messages, [])
+            ca.metrics.enable(report_interval=0)
+            ca.metrics.maybe_report()
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+        self.assertEqual(len(messages), 1)
+        self.assertIn("records=10", messages[0])
@@ -0,0 +1,414 @@
+import imp
+import os
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+def gtf_line(chrom, feature, start, end, strand, frame, attributes):
+    """Return GTF line with the given attributes (list of pairs)."""
+    attributes = " ".join('{} "{}";'.format(key, value) for key, value in attributes)
+    return "\t".join([chrom, "test", feature, str(start), str(end), ".", strand, frame,
+                      attributes]) + "\n"
+
+
+GTF = "#!genome-build GRCh37\n" + "".join([
+    gtf_line("1", "gene", 100, 500, "+", ".", [("gene_id", "G1"), ("gene_name", "GENE1"),
+                                                ("gene_biotype", "protein_coding")]),
+    gtf_line("1", "transcript", 100, 500, "+", ".", [("gene_id", "G1"), ("transcript_id", "T1")]),
+    gtf_line("1", "exon", 100, 199, "+", ".", [("gene_id", "G1"), ("transcript_id", "T1"),
+                                               ("exon_id", "E1")]),
+    gtf_line("1", "CDS", 150, 199, "+", "0", [("gene_id", "G1"), ("transcript_id", "T1"),
+                                              ("protein_id", "P1")]),
+    gtf_line("1", "five_prime_utr", 100, 149, "+", ".", [("gene_id", "G1"),
+                                                         ("transcript_id", "T1")]),
+    gtf_line("1", "exon", 300, 500, "+", ".", [("gene_id", "G1"), ("transcript_id", "T1"),
+                                               ("exon_id", "E2")]),
+    gtf_line("1", "CDS", 300, 396, "+", "1", [("gene_id", "G1"), ("transcript_id", "T1"),
+                                              ("protein_id", "P1")]),
+    gtf_line("1", "stop_codon", 397, 399, "+", "0", [("gene_id", "G1"),
+                                                     ("transcript_id", "T1")]),
+    gtf_line("1", "transcript", 300, 500, "+", ".", [("gene_id", "G1"), ("transcript_id", "T2")]),
+    gtf_line("1", "exon", 300, 500, "+", ".", [("gene_id", "G1"), ("transcript_id", "T2"),
+                                               ("exon_id", "E2")]),
+    gtf_line("2", "gene", 1000, 2000, "-", ".", [("gene_id", "G2"), ("gene_name", "GENE2"),
+                                                 ("gene_biotype", "protein_coding")]),
+    gtf_line("2", "transcript", 1000, 2000, "-", ".", [("gene_id", "G2"),
+                                                       ("transcript_id", "T3")]),
+    gtf_line("2", "exon", 1800, 2000, "-", ".", [("gene_id", "G2"), ("transcript_id", "T3"),
+                                                 ("exon_id", "E3")]),
+    gtf_line("2", "CDS", 1800, 1900, "-", "0", [("gene_id", "G2"), ("transcript_id", "T3"),
+                                                ("protein_id", "P3")]),
+    gtf_line("2", "exon", 1000, 1100, "-", ".", [("gene_id", "G2"), ("transcript_id", "T3"),
+                                                 ("exon_id", "E4")]),
+    gtf_line("2", "CDS", 1050, 1100, "-", "1", [("gene_id", "G2"), ("transcript_id", "T3"),
+                                                ("protein_id", "P3")])])
+
+GFF3 = "##gff-version 3\n" + "".join("\t".join(fields) + "\n" for fields in [
+    ["1", "test", "gene", "100", "500", ".", "+", ".",
+     "ID=gene:G1;Name=GENE1;biotype=protein_coding"],
+    ["1", "test", "mRNA", "100", "500", ".", "+", ".", "ID=transcript:T1;Parent=gene:G1"],
+    ["1", "test", "exon", "100", "199", ".", "+", ".", "Parent=transcript:T1;exon_id=E1"],
+    ["1", "test", "CDS", "150", "199", ".", "+", "0",
+     "ID=CDS:P1;Parent=transcript:T1;protein_id=P1"],
+    ["1", "test", "exon", "300", "500", ".", "+", ".", "Parent=transcript:T1;exon_id=E2"],
+    ["1", "test", "CDS", "300", "399", ".", "+", "1",
+     "ID=CDS:P1;Parent=transcript:T1;protein_id=P1"]])
+
+
+class TestBulkLoader(unittest.TestCase):
+    """Test loading rows in bulk
+    """
+
+    def setUp(self):
+        """Create a separate in-memory database."""
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+        self.gene_rows = [
+            {"gene_ensembl_id": "ENSG{:011d}".format(i), "gene_symbol": "GENE{}".format(i),
+             "chrom": "1", "start_pos": i * 1000, "end_pos": i * 1000 + 500, "length": 501}
+            for i in range(1, 26)]
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_load_genes(self):
+        """Test loading rows in batches"""
+        loader = ca.BulkLoader(self.session, ca.Gene, batch_size=10)
+        for row in self.gene_rows:
+            loader.add(row)
+        # Only full batches are inserted until the loader is closed
+        self.assertEqual(self.session.query(ca.Gene).count(), 20)
+        loader.close()
+        self.assertEqual(self.session.query(ca.Gene).count(), 25)
+        gene = self.session.query(ca.Gene).filter_by(gene_symbol="GENE3").one()
+        self.assertEqual(gene.start_pos, 3000)
+
+    def test_validate_values(self):
+        """Test converting values with the column validators"""
+        loader = ca.BulkLoader(self.session, ca.Gene)
+        loader.add({"gene_ensembl_id": "ENSG1", "chrom": "1", "start_pos": "1000",
+                    "end_pos": "1500", "length": "501"})
+        with self.assertRaises(ValueError):
+            loader.add({"gene_ensembl_id": "ENSG2", "start_pos": "unknown"})
+        loader.close()
+        gene = self.session.query(ca.Gene).one()
+        self.assertEqual((gene.start_pos, gene.end_pos, gene.length), (1000, 1500, 501))
+        self.assertIsInstance(gene.start_pos, int)
+
+    def test_skip_existing(self):
+        """Test skipping rows that are already loaded"""
+        loader = ca.BulkLoader(self.session, ca.Gene)
+        for row in self.gene_rows[:10]:
+            loader.add(row)
+        loader.close()
+        loader = ca.BulkLoader(self.session, ca.Gene, skip_existing=True)
+        for row in self.gene_rows + self.gene_rows[-5:]:
+            loader.add(row)
+        loader.close()
+        self.assertEqual(loader.num_rows, 15)
+        self.assertEqual(loader.num_skipped, 15)
+        self.assertEqual(self.session.query(ca.Gene).count(), 25)
+
+    def test_load_inherited(self):
+        """Test loading rows for models with joined table inheritance"""
+        patient = ca.Patient(patient_name="patient_001")
+        sample = ca.Sample(sample_name="sample_001", sample_type="primary", patient=patient)
+        library = ca.Library(library_name="library_001", library_type="genome", sample=sample)
+        self.session.add(library)
+        self.session.commit()
+        loader = ca.BulkLoader(self.session, ca.SingleNucleotideVariant, batch_size=3)
+        for pos in range(1000, 1010):
+            loader.add({"library_id": library.id, "status": "somatic", "chrom": "1",
+                        "pos": pos, "ref_allele": "A", "alt_allele": "G"})
+        loader.close()
+        snvs = self.session.query(ca.SingleNucleotideVariant).all()
+        self.assertEqual(len(snvs), 10)
+        self.assertEqual(len(set(snv.id for snv in snvs)), 10)
+        self.assertEqual(len(library.mutations), 10)
+        self.assertTrue(all(snv.mutation_type == "snv" for snv in snvs))
+
+    def test_mixed_orm_inserts(self):
+        """Test assigning primary keys around rows inserted with the ORM"""
+        patient = ca.Patient(patient_name="patient_001")
+        sample = ca.Sample(sample_name="sample_001", sample_type="primary", patient=patient)
+        library = ca.Library(library_name="library_001", library_type="genome", sample=sample)
+        self.session.add(library)
+        self.session.commit()
+        loader = ca.BulkLoader(self.session, ca.SingleNucleotideVariant, batch_size=2)
+        snv_row = {"library_id": library.id, "status": "somatic", "chrom": "1",
+                   "ref_allele": "A", "alt_allele": "G"}
+        for pos in range(1000, 1004):
+            loader.add(dict(snv_row, pos=pos))
+            # Insert rows with the ORM between batches
+            if pos % 2:
+                self.session.add(ca.SingleNucleotideVariant(pos=pos + 100, **snv_row))
+                self.session.commit()
+        loader.close()
+        snvs = self.session.query(ca.SingleNucleotideVariant).all()
+        self.assertEqual(len(snvs), 6)
+        self.assertEqual(len(set(snv.id for snv in snvs)), 6)
+
+
+class TestLoadAnnotationFile(unittest.TestCase):
+    """Test loading annotations from GTF and GFF3 files
+    """
+
+    def setUp(self):
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def open_file(self, file_cls, filename, content):
+        """Write content to a new file and open it."""
+        filepath = os.path.join(self.tmp_dir, filename)
+        with ca.utils.open_file(filepath, "w") as outfile:
+            outfile.write(content)
+        return file_cls.open(filepath)
+
+    def get_exon(self, exon_ensembl_id):
+        return self.session.query(ca.Exon).filter_by(exon_ensembl_id=exon_ensembl_id).one()
+
+    def test_parse_gtf(self):
+        """Test parsing GTF lines into annotation objects"""
+        gtf_file = self.open_file(ca.GtfFile, "test.gtf", GTF)
+        objs = list(gtf_file)
+        self.assertEqual(len(objs), 10)
+        self.assertEqual(objs[0].gene_symbol, "GENE1")
+        self.assertEqual(objs[0].biotype, "protein_coding")
+        self.assertEqual(objs[1].transcript_ensembl_id, "T1")
+        self.assertEqual(objs[-1].exon_ensembl_id, "E4")
+        self.assertEqual(objs[-1].strand, "-1")
+
+    def test_load_gtf(self):
+        """Test loading genes, transcripts, exons and proteins from GTF file"""
+        gtf_file = self.open_file(ca.GtfFile, "test.gtf.gz", GTF)
+        loaders = ca.load_annotation_file(self.session, gtf_file, batch_size=2)
+        self.assertEqual([loader.num_rows for loader in loaders], [2, 3, 4, 2])
+        # Exons shared between transcripts are only loaded once
+        self.assertEqual(loaders[2].num_skipped, 1)
+        t1 = self.session.query(ca.Transcript).filter_by(transcript_ensembl_id="T1").one()
+        self.assertEqual(t1.gene.gene_symbol, "GENE1")
+        self.assertEqual((t1.cds_start_pos, t1.cds_end_pos, t1.length), (51, 200, 301))
+        e1, e2 = self.get_exon("E1"), self.get_exon("E2")
+        self.assertEqual((e1.transcript_id, e1.phase, e1.end_phase), (t1.id, "-1", "2"))
+        self.assertEqual((e2.transcript_start_pos, e2.phase, e2.end_phase), (101, "2", "-1"))
+        protein = self.session.query(ca.Protein).filter_by(protein_ensembl_id="P1").one()
+        self.assertEqual((protein.cds_length, protein.transcript_id), (150, t1.id))
+        # Coordinates follow the direction of transcription on the reverse strand
+        t3 = self.session.query(ca.Transcript).filter_by(transcript_ensembl_id="T3").one()
+        self.assertEqual((t3.cds_start_pos, t3.cds_end_pos, t3.length), (101, 252, 302))
+        e3, e4 = self.get_exon("E3"), self.get_exon("E4")
+        self.assertEqual((e3.transcript_start_pos, e3.phase, e3.end_phase), (1, "-1", "2"))
+        self.assertEqual((e4.transcript_start_pos, e4.phase, e4.strand), (202, "2", "-1"))
+        # Reloading the file skips existing rows
+        loaders = ca.load_annotation_file(self.session, gtf_file, skip_existing=True)
+        self.assertEqual([loader.num_rows for loader in loaders], [0, 0, 0, 0])
+        self.assertEqual(self.session.query(ca.Exon).count(), 4)
+
+    def test_load_gff3(self):
+        """Test loading annotations from Ensembl-style GFF3 file"""
+        gff3_file = self.open_file(ca.Gff3File, "test.gff3", GFF3)
+        ca.load_annotation_file(self.session, gff3_file)
+        t1 = self.session.query(ca.Transcript).filter_by(transcript_ensembl_id="T1").one()
+        self.assertEqual(t1.gene.gene_ensembl_id, "G1")
+        self.assertEqual((t1.cds_start_pos, t1.cds_end_pos), (51, 200))
+        self.assertEqual(self.get_exon("E2").phase, "2")
+
+
+class TestLoadBiomartExons(unittest.TestCase):
+    """Test loading exons from BioMart data (see bin/load_annotations.py)
+    """
+
+    def setUp(self):
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+        self.tmp_dir = tempfile.mkdtemp()
+        script_path = os.path.join(os.path.dirname(__file__), "..", "bin", "load_annotations.py")
+        self.script = imp.load_source("load_annotations", script_path)
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def write_cache(self, rows):
+        """Write BioMart rows to a cache file and return its path."""
+        cache_filename = os.path.join(self.tmp_dir, "exons.tsv")
+        with open(cache_filename, "w") as cache_file:
+            cache_file.write("".join("\t".join(row) + "\n" for row in rows))
+        return cache_filename
+
+    def test_shared_exon(self):
+        """Test loading an exon shared by two transcripts"""
+        gene = ca.Gene(gene_ensembl_id="G1")
+        t1 = ca.Transcript(transcript_ensembl_id="T1", gene=gene)
+        t2 = ca.Transcript(transcript_ensembl_id="T2", gene=gene)
+        self.session.add_all([t1, t2])
+        self.session.commit()
+        # One row per exon and transcript, as returned by BioMart
+        rows = [["E1", "T1", "G1", "1", "0", "", "", "1", "100", "", "", "1", "100", "101",
+                 "200", "101", "200"],
+                ["E1", "T2", "G1", "1", "0", "", "", "1", "100", "", "", "1", "100", "101",
+                 "200", "101", "200"]]
+        cache_filename = self.write_cache(rows)
+        loader = self.script.load_exons(self.session, cache_filename, {"G1": gene.id},
+                                        {"T1": t1.id, "T2": t2.id})
+        self.assertEqual((loader.num_rows, loader.num_skipped), (1, 1))
+        exon = self.session.query(ca.Exon).one()
+        self.assertEqual((exon.transcript_id, exon.phase, exon.end_phase), (t1.id, "0", "1"))
+
+
+    def test_utr_only_exon(self):
+        """Test that transcript lengths include exons that only contain UTRs"""
+        rows = [["E1", "T1", "G1", "1", "-1", "1001", "1050", "", "", "", "", "", "", "", "",
+                 "1001", "1050"],
+                ["E2", "T1", "G1", "1", "-1", "2001", "2010", "61", "150", "", "", "1", "90",
+                 "2011", "2100", "2001", "2100"],
+                ["E3", "T1", "G1", "1", "0", "", "", "151", "250", "", "", "91", "190", "3001",
+                 "3100", "3001", "3100"],
+                ["E4", "T2", "G1", "1", "-1", "5001", "5050", "", "", "", "", "", "", "", "",
+                 "5001", "5050"]]
+        cache_filename = self.write_cache(rows)
+        # Transcripts without a coding region are ignored
+        transcripts = self.script.aggregate_transcripts(cache_filename)
+        self.assertEqual(transcripts, {"T1": ["G1", 61, 250, 250]})
+        gene = ca.Gene(gene_ensembl_id="G1")
+        t1 = ca.Transcript(transcript_ensembl_id="T1", gene=gene, length=250)
+        self.session.add(t1)
+        self.session.commit()
+        self.script.load_exons(self.session, cache_filename, {"G1": gene.id}, {"T1": t1.id})
+        exons = self.session.query(ca.Exon).order_by(ca.Exon.transcript_start_pos).all()
+        self.assertEqual([(exon.transcript_start_pos, exon.transcript_end_pos) for exon in exons],
+                         [(51, 150), (151, 250)])
+        self.assertEqual(exons[-1].transcript_end_pos, transcripts["T1"][3])
+
+
+class TestCheckpoints(unittest.TestCase):
+    """Test resuming loads from checkpoints
+    """
+
+    def setUp(self):
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def write_file(self, filename, content):
+        filepath = os.path.join(self.tmp_dir, filename)
+        with ca.utils.open_file(filepath, "w") as outfile:
+            outfile.write(content)
+        return filepath
+
+    def get_checkpoint(self, name):
+        return self.session.query(ca.LoadCheckpoint).filter_by(name=name).one()
+
+    def test_resume_load(self):
+        """Test resuming a load that failed on an invalid line"""
+        patient = ca.Patient(patient_name="patient_001")
+        sample = ca.Sample(sample_name="sample_001", sample_type="primary", patient=patient)
+        library = ca.Library(library_name="library_001", library_type="genome", sample=sample)
+        self.session.add(library)
+        self.session.commit()
+        lines = ["1\t{}\t.\tA\tG\t50\tPASS\tDP=10\n".format(pos) for pos in range(100, 200)]
+        vcf = "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+        # The position of the 55th line is invalid (with the same length)
+        filepath = self.write_file("input.vcf.gz", vcf + "".join(lines[:54]) +
+                                   lines[54].replace("154", "15x") + "".join(lines[55:]))
+        load_kwargs = {"library": library, "defaults": {"status": "somatic"},
+                       "batch_size": 20, "processes": 0, "chunk_size": 10,
+                       "checkpoint_name": "input"}
+        with self.assertRaises(ValueError):
+            ca.load_file(self.session, ca.VcfFile.open(filepath), **load_kwargs)
+        self.session.rollback()
+        checkpoint = self.get_checkpoint("input")
+        self.assertEqual((checkpoint.num_rows, checkpoint.is_complete), (40, False))
+        self.assertEqual(checkpoint.offset, len(vcf) + len("".join(lines[:40])))
+        self.assertEqual(self.session.query(ca.Mutation).count(), 40)
+        # Once fixed, the load resumes after the last checkpoint
+        self.write_file("input.vcf.gz", vcf + "".join(lines))
+        loaders = ca.load_file(self.session, ca.VcfFile.open(filepath), **load_kwargs)
+        self.assertEqual(loaders[ca.SingleNucleotideVariant].num_rows, 60)
+        positions = sorted(pos for pos, in self.session.query(ca.SingleNucleotideVariant.pos))
+        self.assertEqual(positions, range(100, 200))
+        checkpoint = self.get_checkpoint("input")
+        self.assertEqual((checkpoint.num_rows, checkpoint.is_complete), (100, True))
+        # Complete loads are skipped
+        self.assertEqual(ca.load_file(self.session, ca.VcfFile.open(filepath), **load_kwargs),
+                         {})
+        with self.assertRaises(ca.CancerApiException):
+            ca.load_file(self.session, ca.VcfFile.open(filepath + ".copy"), **load_kwargs)
+
+    def test_resume_annotation_load(self):
+        """Test resuming a load of annotations between transcripts"""
+        invalid_gtf = GTF.replace("1800\t2000", "18x0\t2000")
+        filepath = self.write_file("test.gtf", invalid_gtf)
+        with self.assertRaises(ValueError):
+            ca.load_annotation_file(self.session, ca.GtfFile.open(filepath), batch_size=1,
+                                    checkpoint_name="gtf")
+        self.session.rollback()
+        self.assertEqual(self.session.query(ca.Transcript).count(), 2)
+        self.assertLess(self.get_checkpoint("gtf").offset, invalid_gtf.index("18x0"))
+        self.write_file("test.gtf", GTF)
+        ca.load_annotation_file(self.session, ca.GtfFile.open(filepath), batch_size=1,
+                                checkpoint_name="gtf")
+        counts = [self.session.query(model_cls).count()
+                  for model_cls in (ca.Gene, ca.Transcript, ca.Exon, ca.Protein)]
+        self.assertEqual(counts, [2, 3, 4, 2])
+        t3 = self.session.query(ca.Transcript).filter_by(transcript_ensembl_id="T3").one()
+        self.assertEqual(t3.gene.gene_ensembl_id, "G2")
+        self.assertTrue(self.get_checkpoint("gtf").is_complete)
+
+
+class TestMutationSummary(unittest.TestCase):
+    """Test maintaining the mutation summary table
+    """
+
+    def setUp(self):
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+        patient = ca.Patient(patient_name="patient_001")
+        sample = ca.Sample(sample_name="sample_001", sample_type="primary", patient=patient)
+        self.library = ca.Library(library_name="library_001", library_type="genome",
+                                  sample=sample)
+        self.session.add(self.library)
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_bulk_loader_updates(self):
+        """Test that bulk loaders update the summary with every batch"""
+        loader = ca.BulkLoader(self.session, ca.SingleNucleotideVariant, batch_size=3)
+        for pos in range(1000, 1005):
+            loader.add({"library_id": self.library.id, "status": "somatic", "chrom": "1",
+                        "pos": pos, "ref_allele": "A", "alt_allele": "G"})
+        loader.close()
+        loader = ca.BulkLoader(self.session, ca.StructuralVariation)
+        for sv_type in ("deletion", "deletion", "inversion"):
+            loader.add({"library_id": self.library.id, "status": "somatic", "chrom1": "1",
+                        "pos1": 100, "chrom2": "1", "pos2": 200, "sv_type": sv_type})
+        loader.close()
+        loader = ca.BulkLoader(self.session, ca.CopyNumberVariation)
+        loader.add({"library_id": self.library.id, "status": "somatic", "chrom": "1",
+                    "start_pos": 1, "end_pos": 1000, "copy_state": 3})
+        loader.close()
+        expected = {("snv", ""): 5, ("sv", "deletion"): 2, ("sv", "inversion"): 1,
+                    ("cnv", "3"): 1}
+        summary = ca.get_mutation_summary(self.session)
+        self.assertEqual(summary, {self.library.id: expected})
+        # Recomputing the summary yields the same counts
+        self.session.add(ca.Indel(library=self.library, status="somatic", chrom="1", pos=5,
+                                  ref_allele="AT", alt_allele="A"))
+        self.session.commit()
+        self.assertEqual(ca.refresh_mutation_summary(self.session), 5)
+        expected[("indel", "")] = 1
+        self.assertEqual(ca.get_mutation_summary(self.session, [self.library.id]),
+                         {self.library.id: expected})
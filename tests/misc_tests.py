@@ -64,3 +64,38 @@ class TestGenomicInterval(unittest.TestCase):
         # Check that start position is less than end position
         self.assertTrue(self.gi13.is_overlap(self.gi10))
         self.assertTrue(self.gi13.is_overlap(self.gi11))
+
+
+class TestChromosomeOrder(unittest.TestCase):
+    """Test chromosome ordering
+    """
+
+    def test_karyotypic_order(self):
+        """Test default karyotypic order"""
+        chroms = ["chrX", "chr10", "GL000192.1", "chr2", "chrM", "chr1", "chrY"]
+        chrom_order = ca.ChromosomeOrder()
+        self.assertEqual(sorted(chroms, key=chrom_order.key),
+                         ["chr1", "chr2", "chr10", "chrX", "chrY", "chrM", "GL000192.1"])
+
+    def test_custom_order(self):
+        """Test order given by a list of chromosomes"""
+        chrom_order = ca.ChromosomeOrder(["2", "1"])
+        self.assertEqual(sorted(["1", "3", "2", "X"], key=chrom_order.key),
+                         ["2", "1", "3", "X"])
+
+
+class TestLruCache(unittest.TestCase):
+    """Test least recently used cache
+    """
+
+    def test_eviction(self):
+        """Test that the least recently used item is discarded"""
+        cache = ca.utils.LruCache(max_size=2)
+        cache["a"] = 1
+        cache["b"] = 2
+        self.assertEqual(cache.get("a"), 1)
+        cache["c"] = 3
+        self.assertTrue("a" in cache and "c" in cache)
+        self.assertFalse("b" in cache)
+        self.assertEqual(cache.get("b", 0), 0)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 1, 2))
@@ -36,6 +36,15 @@ class TestSingleNucleotideVariant(unittest.TestCase):
         # Check if db is populated
         self.assertEqual(session.query(ca.SingleNucleotideVariant).count(), 4)
 
+    def test_get_key(self):
+        """Test equality and hashing based on keys"""
+        snv5 = ca.SingleNucleotideVariant(chrom="1", pos="1000", ref_allele="A",
+                                          alt_allele="G")
+        self.assertEqual(self.snv1, snv5)
+        self.assertNotEqual(self.snv1, self.snv2)
+        self.assertEqual(hash(self.snv1), hash(snv5))
+        self.assertEqual(len({self.snv1, self.snv2, snv5}), 2)
+
     def test_is_overlap(self):
         """Test is_overlap method"""
         # Test overlap without margin
@@ -80,6 +89,20 @@ class TestStructuralVariation(unittest.TestCase):
         # Check if db is populated
         self.assertEqual(session.query(ca.StructuralVariation).count(), 2)
 
+    def test_get_key(self):
+        """Test that SV keys don't depend on breakpoint order"""
+        sv3 = ca.StructuralVariation(chrom1="2", pos1=2000, strand1="-",
+                                     chrom2="1", pos2=1000, strand2="+",
+                                     sv_type="translocation")
+        sv4 = ca.StructuralVariation(chrom1="2", pos1=2000, strand1="+",
+                                     chrom2="1", pos2=1000, strand2="-",
+                                     sv_type="translocation")
+        self.assertEqual(self.sv1.get_key(), sv3.get_key())
+        self.assertEqual(self.sv1, sv3)
+        self.assertEqual(hash(self.sv1), hash(sv3))
+        self.assertNotEqual(self.sv1, sv4)
+        self.assertEqual(len({self.sv1, sv3, sv4}), 2)
+
     def test_predict_effects(self):
         """Testing effect prediction for SVs
         """
@@ -0,0 +1,233 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+DELLY_HEADER = "##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+DELLY_TEMPLATE = "{}\t{}\t.\tN\t<{}>\t.\tPASS\tSVTYPE={};CHR2={};END={};CT={}\n"
+
+
+def write_file(dirpath, filename, content):
+    """Write content to a new file and return its path."""
+    filepath = os.path.join(dirpath, filename)
+    with open(filepath, "w") as outfile:
+        outfile.write(content)
+    return filepath
+
+
+class TestIterUnique(unittest.TestCase):
+    """Test de-duplication of objects across files
+    """
+
+    def setUp(self):
+        """Create DELLY VCF files with overlapping calls.
+        """
+        self.tmp_dir = tempfile.mkdtemp()
+        sv1 = DELLY_TEMPLATE.format("1", 1000, "DEL", "DEL", "1", 2000, "3to5")
+        sv2 = DELLY_TEMPLATE.format("1", 5000, "DUP", "DUP", "1", 6000, "5to3")
+        sv3 = DELLY_TEMPLATE.format("2", 1000, "TRA", "TRA", "3", 3000, "3to3")
+        # Same translocation as sv3, but reported from the other breakpoint
+        sv4 = DELLY_TEMPLATE.format("3", 3000, "TRA", "TRA", "2", 1000, "3to3")
+        self.files = [
+            ca.VcfFile.open(write_file(self.tmp_dir, "a.vcf", DELLY_HEADER + sv1 + sv2),
+                            parser_cls=ca.DellyVcfParser),
+            ca.VcfFile.open(write_file(self.tmp_dir, "b.vcf", DELLY_HEADER + sv1 + sv3),
+                            parser_cls=ca.DellyVcfParser),
+            ca.VcfFile.open(write_file(self.tmp_dir, "c.vcf", DELLY_HEADER + sv1 + sv4),
+                            parser_cls=ca.DellyVcfParser)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_iter_unique(self):
+        """Test in-memory de-duplication"""
+        results = list(ca.iter_unique(self.files))
+        self.assertEqual(len(results), 3)
+        supports = {(obj.chrom1, obj.pos1): support for obj, support in results}
+        self.assertEqual(supports[("1", 1000)], [0, 1, 2])
+        self.assertEqual(supports[("1", 5000)], [0])
+        self.assertEqual(supports[("2", 1000)], [1, 2])
+
+    def test_iter_unique_partitioned(self):
+        """Test hash-partitioned de-duplication"""
+        in_memory = {obj.get_key(): support for obj, support in ca.iter_unique(self.files)}
+        partitioned = {obj.get_key(): support for obj, support in
+                       ca.iter_unique(self.files, num_partitions=4)}
+        self.assertEqual(in_memory, partitioned)
+        consensus = list(ca.iter_unique(self.files, num_partitions=4, min_support=2))
+        self.assertEqual(len(consensus), 2)
+
+
+class TestSvClustering(unittest.TestCase):
+    """Test clustering of SVs across files
+    """
+
+    def setUp(self):
+        """Create DELLY and PavFinder VCF files with nearby calls.
+        """
+        self.tmp_dir = tempfile.mkdtemp()
+        delly_svs = (DELLY_TEMPLATE.format("1", 1000, "DEL", "DEL", "1", 2000, "3to5") +
+                     DELLY_TEMPLATE.format("1", 1004, "DEL", "DEL", "1", 1998, "3to5") +
+                     DELLY_TEMPLATE.format("1", 1500, "INV", "INV", "1", 3000, "3to3"))
+        pavfinder_svs = (
+            "1\t1003\t.\tN\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=2005\n"
+            "1\t1100\t.\tN\t<DEL>\t.\tPASS\tSVTYPE=DEL;END=2005\n")
+        self.files = [
+            ca.VcfFile.open(write_file(self.tmp_dir, "delly.vcf", DELLY_HEADER + delly_svs),
+                            parser_cls=ca.DellyVcfParser),
+            ca.VcfFile.open(write_file(self.tmp_dir, "pavfinder.vcf",
+                                       DELLY_HEADER + pavfinder_svs),
+                            parser_cls=ca.PavfinderVcfParser)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_iter_sv_clusters(self):
+        """Test clustering SVs with a margin"""
+        clusters = sorted(ca.iter_sv_clusters(self.files, margin=10), key=lambda c: c.pos1)
+        self.assertEqual([c.support for c in clusters], [3, 1, 1])
+        self.assertEqual((clusters[0].pos1, clusters[0].pos2), (1003, 2000))
+        self.assertEqual(clusters[0].sources, [0, 1])
+        self.assertEqual((clusters[0].strand1, clusters[0].strand2), ("-", "+"))
+        # Without a margin, nothing is clustered
+        clusters = list(ca.iter_sv_clusters(self.files, margin=0))
+        self.assertEqual(len(clusters), 5)
+
+    def test_cluster_drift(self):
+        """Test that chains of nearby calls don't merge into one cluster"""
+        svs = "".join(DELLY_TEMPLATE.format("1", pos, "DEL", "DEL", "1", pos + 1000, "3to5")
+                      for pos in (100, 108, 116, 124))
+        vcf_file = ca.VcfFile.open(write_file(self.tmp_dir, "drift.vcf", DELLY_HEADER + svs),
+                                   parser_cls=ca.DellyVcfParser)
+        clusters = list(ca.iter_sv_clusters([vcf_file], margin=10))
+        self.assertEqual([(c.pos1, c.support) for c in clusters], [(100, 2), (116, 2)])
+
+    def test_external_sort(self):
+        """Test clustering with calls spilled to sorted runs on disk"""
+        clusters = list(ca.iter_sv_clusters(self.files, margin=10, buffer_size=2))
+        expected = list(ca.iter_sv_clusters(self.files, margin=10))
+        self.assertEqual([(c.pos1, c.pos2, c.strand1, c.support, c.sources) for c in clusters],
+                         [(c.pos1, c.pos2, c.strand1, c.support, c.sources) for c in expected])
+        self.assertEqual(len(clusters), 3)
+
+    def test_merge_svs(self):
+        """Test writing clusters to a BEDPE file"""
+        filepath = os.path.join(self.tmp_dir, "merged.bedpe")
+        ca.merge_svs(filepath, self.files, margin=10)
+        with open(filepath) as infile:
+            lines = [line for line in infile if not line.startswith("#")]
+        self.assertEqual(len(lines), 3)
+        self.assertIn("1\t1003\t1004\t1\t2000\t2001\t1_1003_1_2000\t3\t-\t+\n", lines)
+
+
+class TestIntervalOperations(unittest.TestCase):
+    """Test interval operations between files
+    """
+
+    def setUp(self):
+        """Create sorted BED files.
+        """
+        self.tmp_dir = tempfile.mkdtemp()
+        a_intervals = [("1", 100, 200), ("1", 500, 600), ("1", 1000, 1100), ("2", 100, 200),
+                       ("3", 100, 200)]
+        b_intervals = [("1", 50, 120), ("1", 150, 160), ("1", 610, 700), ("1", 5000, 6000),
+                       ("2", 300, 400)]
+        self.a_file = ca.BedFile.open(write_file(self.tmp_dir, "a.bed", "".join(
+            "{}\t{}\t{}\n".format(*interval) for interval in a_intervals)))
+        self.b_file = ca.BedFile.open(write_file(self.tmp_dir, "b.bed", "".join(
+            "{}\t{}\t{}\n".format(*interval) for interval in b_intervals)))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def assert_both_modes(self, operation, expected, **kwargs):
+        """Check results for both sorted and unsorted modes."""
+        for is_sorted in (True, False):
+            results = operation(self.a_file, self.b_file, is_sorted=is_sorted, **kwargs)
+            self.assertEqual(list(results), expected)
+
+    def test_intersect(self):
+        """Test intersect and subtract"""
+        gi = ca.GenomicInterval
+        self.assert_both_modes(ca.intersect, [gi("1", 100, 200)])
+        self.assert_both_modes(ca.intersect, [gi("1", 100, 200), gi("1", 500, 600)], margin=10)
+        self.assert_both_modes(ca.subtract, [gi("1", 500, 600), gi("1", 1000, 1100),
+                                             gi("2", 100, 200), gi("3", 100, 200)])
+
+    def test_window(self):
+        """Test window"""
+        gi = ca.GenomicInterval
+        self.assert_both_modes(ca.window, [
+            (gi("1", 100, 200), gi("1", 50, 120)), (gi("1", 100, 200), gi("1", 150, 160)),
+            (gi("1", 500, 600), gi("1", 610, 700)), (gi("2", 100, 200), gi("2", 300, 400))],
+            window_size=100)
+
+    def test_closest(self):
+        """Test closest"""
+        gi = ca.GenomicInterval
+        self.assert_both_modes(ca.closest, [
+            (gi("1", 100, 200), gi("1", 50, 120), 0), (gi("1", 500, 600), gi("1", 610, 700), 10),
+            (gi("1", 1000, 1100), gi("1", 610, 700), 300),
+            (gi("2", 100, 200), gi("2", 300, 400), 100), (gi("3", 100, 200), None, None)])
+
+    def test_write_results(self):
+        """Test writing results to a file"""
+        filepath = os.path.join(self.tmp_dir, "out.bedpe")
+        svs = ca.VcfFile.open(write_file(self.tmp_dir, "svs.vcf", DELLY_HEADER +
+                              DELLY_TEMPLATE.format("1", 110, "DEL", "DEL", "1", 140, "3to5") +
+                              DELLY_TEMPLATE.format("2", 10, "DEL", "DEL", "2", 20, "3to5")),
+                              parser_cls=ca.DellyVcfParser)
+        outfile = ca.BedpeFile.new(filepath)
+        num_objs = ca.write_results(outfile, ca.intersect(svs, self.a_file, is_sorted=True))
+        self.assertEqual(num_objs, 1)
+        self.assertEqual(len(list(ca.BedpeFile.open(filepath))), 1)
+
+
+class TestNormalization(unittest.TestCase):
+    """Test variant normalization
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.reference = ca.FastaFile.open(write_file(self.tmp_dir, "ref.fa", ">1\nGCACACAT\n"))
+
+    def tearDown(self):
+        self.reference.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def normalize(self, pos, ref_allele, alt_allele, reference=None):
+        """Return (class name, pos, ref, alt) tuples for normalized indel."""
+        indel = ca.Indel(chrom="1", pos=pos, ref_allele=ref_allele, alt_allele=alt_allele)
+        return [(type(mutation).__name__, mutation.pos, mutation.ref_allele,
+                 mutation.alt_allele) for mutation in ca.normalize(indel, reference)]
+
+    def test_split_and_trim(self):
+        """Test splitting multi-allelic records and trimming shared bases"""
+        self.assertEqual(self.normalize(10, "ACGT", "ACTT,ACGTGT,A"), [
+            ("SingleNucleotideVariant", 12, "G", "T"), ("Indel", 11, "C", "CGT"),
+            ("Indel", 10, "ACGT", "A")])
+        # Indels are left as is without a reference
+        self.assertEqual(self.normalize(3, "ACA", "A"), [("Indel", 3, "ACA", "A")])
+
+    def test_left_align(self):
+        """Test left-aligning indels in repeats"""
+        self.assertEqual(self.normalize(3, "ACA", "A", self.reference),
+                         [("Indel", 1, "GCA", "G")])
+        self.assertEqual(self.normalize(7, "A", "ACA", self.reference),
+                         [("Indel", 1, "G", "GCA")])
+        self.assertEqual(self.normalize(7, "a", "<DEL>", self.reference),
+                         [("Indel", 7, "a", "<DEL>")])
+
+    def test_iter_normalized(self):
+        """Test normalizing objects parsed from a file"""
+        vcf = ca.VcfFile.open(write_file(self.tmp_dir, "a.vcf", DELLY_HEADER +
+                                         "1\t3\t.\tACA\tA,G\t50\tPASS\tDP=10\n"
+                                         "1\t5\t.\tA\tG\t50\tPASS\tDP=10\n"))
+        mutations = list(ca.iter_normalized(vcf, self.reference))
+        self.assertEqual([(m.pos, m.ref_allele, m.alt_allele) for m in mutations],
+                         [(1, "GCA", "G"), (3, "ACA", "G"), (5, "A", "G")])
+        # Equivalent representations are now equal
+        self.assertEqual(mutations[0], ca.IndelRecord(chrom="1", pos=1, ref_allele="GCA",
+                                                      alt_allele="G"))
@@ -0,0 +1,50 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+STRELKA_HEADER = ("##fileformat=VCFv4.1\n##source=strelka\n"
+                  "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tNORMAL\tTUMOR\n")
+STRELKA_SNV = ("1\t100\t.\tA\tG\t.\tPASS\tSOMATIC;QSS=50\tDP:FDP:SDP:SUBDP:AU:CU:GU:TU\t"
+               "30:0:0:0:29,30:0,0:1,1:0,0\t40:0:0:0:25,26:0,0:15,16:0,0\n")
+STRELKA_INDEL = ("1\t200\t.\tAT\tA\t.\tPASS\tSOMATIC;QSI=40\tDP:DP2:TAR:TIR:TOR:DP50\t"
+                 "35:35:33,34:0,0:2,2:34.5\t50:50:30,31:18,19:2,2:49.1\n")
+
+
+class TestStrelkaVcfParser(unittest.TestCase):
+    """Test parsing Strelka somatic calls
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        filepath = os.path.join(self.tmp_dir, "strelka.vcf")
+        with open(filepath, "w") as outfile:
+            outfile.write(STRELKA_HEADER + STRELKA_SNV + STRELKA_INDEL)
+        self.vcf_file = ca.VcfFile.open(filepath, parser_cls=ca.StrelkaVcfParser)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_parse(self):
+        """Test tumour counts from tier 1 counts"""
+        snv, indel = list(self.vcf_file)
+        self.assertIsInstance(snv, ca.SingleNucleotideVariantRecord)
+        self.assertEqual((snv.pos, snv.ref_count, snv.alt_count, snv.status),
+                         (100, 25, 15, "somatic"))
+        self.assertIsInstance(indel, ca.IndelRecord)
+        self.assertEqual((indel.ref_count, indel.alt_count), (30, 18))
+
+    def test_parse_counts(self):
+        """Test parsing counts in bulk"""
+        columns = self.vcf_file.parser.parse_counts(self.vcf_file.iterlines())
+        self.assertEqual(columns.keys(), ["chrom", "pos", "t_ref_count", "t_alt_count",
+                                          "n_ref_count", "n_alt_count"])
+        self.assertEqual(list(columns["n_ref_count"]), [29, 33])
+        self.assertEqual(list(columns["n_alt_count"]), [1, 0])
+        # Missing samples or FORMAT keys yield -1
+        line = "1\t300\t.\tC\tT\t.\tPASS\t.\tDP:AU:CU:GU\t10:0,0:10,10:0,0\t9:0,0:5,5:0,0\n"
+        columns = self.vcf_file.parser.parse_counts([line])
+        self.assertEqual([columns[name][0] for name in ca.StrelkaVcfParser.COUNT_COLUMNS],
+                         [5, -1, 10, -1])
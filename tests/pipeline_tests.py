@@ -0,0 +1,69 @@
+import os
+import gzip
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+VCF_HEADER = "##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+
+class TestPipeline(unittest.TestCase):
+    """Test reading and parsing concurrently
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmp_dir, "input.vcf.gz")
+        with gzip.open(self.filepath, "wb") as outfile:
+            outfile.write(VCF_HEADER)
+            for pos in range(1, 251):
+                alt_allele = "G" if pos % 5 else "GT"
+                outfile.write("1\t{}\t.\tA\t{}\t50\tPASS\tDP=10\n".format(pos, alt_allele))
+        self.vcf_file = ca.VcfFile.open(self.filepath)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_order(self):
+        """Test that objects are parsed in order, with or without processes"""
+        expected = list(self.vcf_file)
+        for processes in (0, 2):
+            pipeline = ca.Pipeline(self.vcf_file, processes=processes, chunk_size=7,
+                                   max_chunks=2)
+            self.assertEqual(list(pipeline), expected)
+            self.assertEqual((pipeline.num_lines, pipeline.num_objs), (250, 250))
+
+    def test_early_stop(self):
+        """Test stopping the iteration before the end of the file"""
+        pipeline = ca.Pipeline(self.vcf_file, processes=1, chunk_size=10, max_chunks=2)
+        chunks = pipeline.iterchunks()
+        self.assertEqual(len(next(chunks)), 10)
+        chunks.close()
+        self.assertLess(pipeline.num_lines, 250)
+
+    def test_reader_error(self):
+        """Test that errors in the reader thread are re-raised"""
+        missing_file = ca.VcfFile.open(os.path.join(self.tmp_dir, "missing.vcf"))
+        with self.assertRaises(IOError):
+            list(ca.iter_pipelined(missing_file, processes=0))
+
+    def test_load_file(self):
+        """Test loading records with bulk loaders"""
+        session = ca.Session(ca.SqliteConnection())
+        session.create_tables()
+        patient = ca.Patient(patient_name="patient_001")
+        sample = ca.Sample(sample_name="sample_001", sample_type="primary", patient=patient)
+        library = ca.Library(library_name="library_001", library_type="genome", sample=sample)
+        session.add(library)
+        session.commit()
+        loaders = ca.load_file(session, self.vcf_file, library=library,
+                               defaults={"status": "somatic"}, batch_size=30, processes=2,
+                               chunk_size=20)
+        self.assertEqual(loaders[ca.SingleNucleotideVariant].num_rows, 200)
+        self.assertEqual(session.query(ca.Indel).count(), 50)
+        mutation_ids = [mutation_id for mutation_id, in session.query(ca.Mutation.id)]
+        self.assertEqual(len(set(mutation_ids)), 250)
+        self.assertEqual(len(library.mutations), 250)
+        session.close()
@@ -0,0 +1,187 @@
+import unittest
+from collections import namedtuple
+import cancer_api as ca
+
+
+class Reference(object):
+    """Reference genome stored in memory."""
+
+    def __init__(self, sequences):
+        self.sequences = sequences
+
+    def fetch(self, chrom, start, end):
+        return self.sequences[chrom][start - 1:end]
+
+
+def build_reference():
+    """Return reference with a coding sequence spanning two exons,
+    i.e. ATG AAA T|GG CCC GGG TTT TAA at 104-110 and 201-214.
+    """
+    sequence = ["N"] * 300
+    for pos, base in zip(range(104, 111) + range(201, 215), "ATGAAAT" + "GGCCCGGGTTTTAA"):
+        sequence[pos - 1] = base
+    return Reference({"1": "".join(sequence)})
+
+
+class TestProteinEffectPredictor(unittest.TestCase):
+    """Test protein effect predictions
+    """
+
+    def setUp(self):
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+        gene = ca.Gene(gene_ensembl_id="G1", gene_symbol="GENE1", chrom="1", start_pos=101,
+                       end_pos=220)
+        transcript = ca.Transcript(transcript_ensembl_id="T1", gene=gene, cds_start_pos=4,
+                                   cds_end_pos=24, length=30)
+        self.session.add_all([gene, transcript])
+        self.session.flush()
+        self.session.add_all([
+            ca.Exon(exon_ensembl_id="E1", gene_id=gene.id, transcript_id=transcript.id,
+                    transcript_start_pos=1, transcript_end_pos=10, genome_start_pos=101,
+                    genome_end_pos=110, strand="1", phase="-1", end_phase="1"),
+            ca.Exon(exon_ensembl_id="E2", gene_id=gene.id, transcript_id=transcript.id,
+                    transcript_start_pos=11, transcript_end_pos=30, genome_start_pos=201,
+                    genome_end_pos=220, strand="1", phase="1", end_phase="-1")])
+        self.session.commit()
+        self.gene = gene
+        self.index = ca.AnnotationIndex.from_session(self.session)
+        self.predictor = ca.ProteinEffectPredictor(self.index, build_reference())
+
+    def tearDown(self):
+        self.session.close()
+
+    def predict(self, pos, ref_allele, alt_allele, predictor=None):
+        """Return effect types predicted for a mutation."""
+        predictor = predictor or self.predictor
+        return [effect_type for _, effect_type in
+                predictor.predict("1", pos, ref_allele, alt_allele)]
+
+    def test_snvs(self):
+        """Test predicting SNV effects from codon changes"""
+        self.assertEqual(self.predict(108, "A", "T"), ["missense"])
+        # Codon spanning the exon boundary
+        self.assertEqual(self.predict(201, "G", "A"), ["nonsense"])
+        self.assertEqual(self.predict(213, "A", "C"), ["nonstop"])
+        # Synonymous and untranslated changes
+        self.assertEqual(self.predict(208, "G", "A"), [])
+        self.assertEqual(self.predict(102, "N", "A"), [])
+        # Reference mismatches are skipped
+        self.assertEqual(self.predict(108, "C", "T"), [])
+        self.assertEqual(self.predictor.num_mismatches, 1)
+
+    def test_shared_exons(self):
+        """Test counting codons spanning into exons linked to another transcript"""
+        gene = self.session.query(ca.Gene).one()
+        other = ca.Transcript(transcript_ensembl_id="T0", gene=gene, cds_start_pos=1,
+                              cds_end_pos=20, length=20)
+        self.session.add(other)
+        self.session.flush()
+        exon = self.session.query(ca.Exon).filter_by(exon_ensembl_id="E2").one()
+        exon.transcript_id = other.id
+        self.session.commit()
+        index = ca.AnnotationIndex.from_session(self.session)
+        predictor = ca.ProteinEffectPredictor(index, build_reference())
+        self.assertEqual(self.predict(108, "A", "T", predictor), ["missense"])
+        self.assertEqual(self.predict(110, "T", "A", predictor), [])
+        self.assertEqual((predictor.num_unresolved, predictor.num_mismatches), (1, 0))
+
+    def test_indels(self):
+        """Test predicting frameshifts while ignoring in-frame indels"""
+        self.assertEqual(self.predict(204, "CCG", "C"), ["frameshift"])
+        self.assertEqual(self.predict(203, "CCCG", "C"), [])
+        self.assertEqual(self.predict(206, "-", "T"), ["frameshift"])
+        self.assertEqual(self.predict(216, "N", "NT"), [])
+
+    def test_splice_sites(self):
+        """Test predicting splice-site effects without reference"""
+        predictor = ca.ProteinEffectPredictor(self.index)
+        self.assertEqual(self.predict(111, "N", "A", predictor), ["splice-site"])
+        self.assertEqual(self.predict(199, "NN", "N", predictor), ["splice-site"])
+        self.assertEqual(self.predict(108, "A", "T", predictor), [])
+        # Transcripts don't have splice sites at their ends
+        self.assertEqual(self.predict(100, "N", "A", predictor), [])
+
+    def test_load_effects(self):
+        """Test loading predicted effects for mutations in the database"""
+        patient = ca.Patient(patient_name="patient_001")
+        sample = ca.Sample(sample_name="sample_001", sample_type="primary", patient=patient)
+        library = ca.Library(library_name="library_001", library_type="exome", sample=sample)
+        mutation_attrs = {"library": library, "status": "somatic", "chrom": "1"}
+        self.session.add_all([
+            ca.SingleNucleotideVariant(pos=108, ref_allele="A", alt_allele="T",
+                                       **mutation_attrs),
+            ca.SingleNucleotideVariant(pos=208, ref_allele="G", alt_allele="A",
+                                       **mutation_attrs),
+            ca.Indel(pos=204, ref_allele="CCG", alt_allele="C", **mutation_attrs)])
+        self.session.commit()
+        loader = ca.predict_protein_effects(self.session, self.index, build_reference(),
+                                            library_ids=[library.id])
+        self.assertEqual(loader.num_rows, 2)
+        effects = self.session.query(ca.ProteinEffect).all()
+        self.assertEqual(sorted(effect.type for effect in effects), ["frameshift", "missense"])
+        self.assertTrue(all(effect.gene_id == self.gene.id for effect in effects))
+        self.assertEqual(sorted(effect.mutation.mutation_type for effect in effects),
+                         ["indel", "snv"])
+
+
+Segment = namedtuple("Segment", ["id", "library_id", "chrom", "start_pos", "end_pos",
+                                 "copy_state"])
+GeneInterval = namedtuple("GeneInterval", ["id", "chrom", "start_pos", "end_pos"])
+
+
+class TestCopyNumberEffects(unittest.TestCase):
+    """Test copy number effects from CNV segments
+    """
+
+    def setUp(self):
+        self.genes = [GeneInterval(1, "1", 100, 199), GeneInterval(2, "1", 150, 400),
+                      GeneInterval(3, "2", 100, 199), GeneInterval(4, "X", 100, 199)]
+
+    def get_effects(self, segments, **kwargs):
+        """Return (segment id, gene id, cn_type) tuples."""
+        return [(segment.id, gene.id, cn_type) for segment, gene, cn_type in
+                ca.iter_copy_number_effects(segments, self.genes, **kwargs)]
+
+    def test_sweep(self):
+        """Test joining sorted segments and genes"""
+        segments = [Segment(1, 1, "1", 1, 180, 3), Segment(2, 2, "1", 120, 500, 1),
+                    Segment(3, 1, "1", 181, 1000, 2), Segment(4, 1, "2", 50, 120, 0),
+                    Segment(5, 1, "X", 1, 1000, 2)]
+        self.assertEqual(self.get_effects(segments), [
+            (1, 1, "gain"), (2, 1, "loss"), (2, 2, "loss")])
+        # Copy-neutral LOH states and a lower overlap threshold
+        self.assertEqual(self.get_effects(segments, loh_states=[2], min_fraction=0.2), [
+            (1, 1, "gain"), (2, 1, "loss"), (3, 2, "loh"), (2, 2, "loss"), (4, 3, "loss"),
+            (5, 4, "loh")])
+
+    def test_unsorted(self):
+        """Test that unsorted segments raise an exception"""
+        segments = [Segment(1, 1, "2", 1, 180, 3), Segment(2, 1, "1", 120, 500, 1)]
+        with self.assertRaises(ca.CancerApiException):
+            self.get_effects(segments)
+
+    def test_load_effects(self):
+        """Test loading copy number effects for CNVs in the database"""
+        session = ca.Session(ca.SqliteConnection())
+        session.create_tables()
+        for gene in self.genes:
+            session.add(ca.Gene(gene_ensembl_id="G{}".format(gene.id), chrom=gene.chrom,
+                                start_pos=gene.start_pos, end_pos=gene.end_pos))
+        patient = ca.Patient(patient_name="patient_001")
+        sample = ca.Sample(sample_name="sample_001", sample_type="primary", patient=patient)
+        library = ca.Library(library_name="library_001", library_type="genome", sample=sample)
+        for chrom, start_pos, end_pos, copy_state in [("X", 1, 1000, 4), ("1", 1, 180, 3),
+                                                      ("1", 181, 1000, 2)]:
+            session.add(ca.CopyNumberVariation(library=library, status="somatic", chrom=chrom,
+                                               start_pos=start_pos, end_pos=end_pos,
+                                               copy_state=copy_state))
+        session.commit()
+        index = ca.AnnotationIndex.from_session(session)
+        loader = ca.predict_copy_number_effects(session, index)
+        self.assertEqual(loader.num_rows, 2)
+        effects = session.query(ca.CopyNumberEffect).order_by(ca.CopyNumberEffect.gene_id).all()
+        self.assertEqual([(effect.gene_id, effect.cn_type, effect.num_copies)
+                          for effect in effects], [(1, "gain", 3), (4, "gain", 4)])
+        self.assertTrue(all(effect.mutation.library is library for effect in effects))
+        session.close()
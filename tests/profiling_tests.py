@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+VCF_HEADER = "##fileformat=VCFv4.1\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+VCF_LINE = "1\t100\t.\tA\tG\t50\tPASS\tDP=10\n"
+
+
+class TestProfiler(unittest.TestCase):
+    """Test profiling hooks
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmp_dir, "input.vcf")
+        with open(self.filepath, "w") as outfile:
+            outfile.write(VCF_HEADER + VCF_LINE * 3)
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def load(self):
+        """Parse file, convert it and load genes."""
+        self.assertEqual(len(list(ca.VcfFile.open(self.filepath))), 3)
+        ca.VcfFile.convert(os.path.join(self.tmp_dir, "output.vcf"),
+                           ca.VcfFile.open(self.filepath))
+        for i in range(2):
+            ca.Gene.get_or_create(self.session, gene_ensembl_id="G1", chrom="1", start_pos=i)
+            self.session.commit()
+
+    def test_breakdown(self):
+        """Test stages and slowest statements"""
+        with ca.Profiler(num_statements=2) as profiler:
+            self.load()
+        stages = dict((stage, calls) for stage, calls, seconds, fraction in
+                      profiler.get_breakdown())
+        # The file is parsed twice (i.e. once for the conversion)
+        self.assertEqual(stages["parse.VcfParser"], 6)
+        self.assertEqual(stages["format.VcfFile"], 3)
+        self.assertEqual((stages["init.Gene"], stages["flush"]), (1, 1))
+        self.assertIn("validate", stages)
+        self.assertGreater(stages["sql"], 2)
+        statements = profiler.get_slowest_statements()
+        self.assertEqual(len(statements), 2)
+        self.assertGreaterEqual(statements[0][0], statements[1][0])
+        fractions = [fraction for stage, calls, seconds, fraction in profiler.get_breakdown()]
+        self.assertTrue(all(0 <= fraction <= 1 for fraction in fractions))
+
+    def test_stop(self):
+        """Test that hooks are removed once stopped"""
+        parse = ca.VcfParser.__dict__["parse"]
+        validators = dict(ca.base.validators)
+        profiler = ca.Profiler()
+        profiler.start()
+        self.assertIsNot(ca.VcfParser.__dict__["parse"], parse)
+        profiler.stop()
+        self.assertIs(ca.VcfParser.__dict__["parse"], parse)
+        self.assertEqual(ca.base.validators, validators)
+        self.load()
+        self.assertEqual(profiler.get_breakdown(), [])
+
+    def test_cprofile(self):
+        """Test that cProfile statistics are dumped"""
+        filepath = os.path.join(self.tmp_dir, "load.prof")
+        self.assertEqual(ca.run_cprofile(filepath, sum, [1, 2]), 3)
+        self.assertTrue(os.path.getsize(filepath) > 0)
@@ -0,0 +1,68 @@
+import unittest
+import cancer_api as ca
+from sqlalchemy import event
+
+
+class TestCohortQueries(unittest.TestCase):
+    """Test cohort query helpers
+    """
+
+    def setUp(self):
+        self.session = ca.Session(ca.SqliteConnection())
+        self.session.create_tables()
+        for i in range(3):
+            patient = ca.Patient(patient_name="patient_{}".format(i))
+            for sample_type in ("normal", "primary"):
+                sample = ca.Sample(sample_name="{}_{}".format(sample_type, i),
+                                   sample_type=sample_type, patient=patient)
+                library = ca.Library(library_name="library_{}_{}".format(sample_type, i),
+                                     library_type="genome", sample=sample)
+                for pos in range(5):
+                    self.session.add(ca.SingleNucleotideVariant(
+                        library=library, status="somatic", chrom="1", pos=pos + 1,
+                        ref_allele="A", alt_allele="G"))
+                self.session.add(ca.StructuralVariation(
+                    library=library, status="somatic", chrom1="1", pos1=10, chrom2="2",
+                    pos2=20, sv_type="translocation"))
+        self.session.commit()
+        self.session.expunge_all()
+        self.statements = []
+        event.listen(self.session.engine, "before_cursor_execute", self.count_statement)
+
+    def tearDown(self):
+        event.remove(self.session.engine, "before_cursor_execute", self.count_statement)
+        self.session.close()
+
+    def count_statement(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def test_cohort_libraries(self):
+        """Test loading patients, samples and libraries in three queries"""
+        libraries = ca.get_cohort_libraries(self.session)
+        self.assertEqual(len(libraries), 6)
+        self.assertEqual(libraries[1][1].sample_type, "primary")
+        self.assertEqual(len(self.statements), 3)
+
+    def test_cohort_mutations(self):
+        """Test streaming cohort mutations without a query per mutation"""
+        rows = list(ca.iter_cohort_mutations(self.session, patient_ids=[1, 2]))
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(len([row for row in rows if row[3].mutation_type == "sv"]), 4)
+        # Subclass attributes are already loaded
+        self.assertEqual(sorted(set(row[3].chrom for row in rows if row[3].mutation_type ==
+                                    "snv")), ["1"])
+        self.assertEqual(rows[-1][2].library_name, "library_primary_1")
+        self.assertEqual(len(self.statements), 4)
+
+    def test_load_by_ids(self):
+        """Test loading instances in batches"""
+        samples = ca.load_by_ids(self.session, ca.Sample, range(1, 7), batch_size=4)
+        self.assertEqual(sorted(samples), range(1, 7))
+        self.assertEqual(len(self.statements), 2)
+
+    def test_mutation_counts(self):
+        """Test counting mutations by library and type"""
+        counts = ca.get_mutation_counts(self.session)
+        self.assertEqual(len(counts), 6)
+        self.assertEqual(counts[1], {"snv": 5, "sv": 1})
+        self.assertEqual(len(self.statements), 1)
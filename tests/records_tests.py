@@ -0,0 +1,130 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+import cancer_api as ca
+
+
+class TestRecords(unittest.TestCase):
+    """Test detached records
+    """
+
+    def test_fields(self):
+        """Test default values and integer conversion"""
+        snv = ca.SingleNucleotideVariantRecord(chrom="1", pos="1000", ref_allele="A",
+                                               alt_allele="G")
+        self.assertEqual((snv.pos, snv.ref_count, snv.mutation_type), (1000, None, "snv"))
+        self.assertEqual(snv.get_locus(), ("1", 1000))
+        self.assertTrue(snv.is_overlap("1", 999, 1001))
+        with self.assertRaises(TypeError):
+            ca.IndelRecord(chrom="1", position=1000)
+
+    def test_shared_methods(self):
+        """Test that records and models share keys and intervals"""
+        sv_attrs = {"chrom1": "2", "pos1": 500, "strand1": "+", "chrom2": "1", "pos2": 100,
+                    "strand2": "-", "sv_type": "translocation"}
+        sv_record = ca.StructuralVariationRecord(**sv_attrs)
+        sv_model = ca.StructuralVariation(**sv_attrs)
+        self.assertEqual(sv_record.get_key(), sv_model.get_key())
+        self.assertEqual(sv_record.get_interval(), sv_model.get_interval())
+        self.assertTrue(sv_record.is_overlap("1", 100))
+
+    def test_sv_key(self):
+        """Test that SV keys don't depend on the order of the breakpoints"""
+        sv_attrs = {"chrom1": "1", "pos1": 100, "strand1": "+", "chrom2": "1", "pos2": 100,
+                    "strand2": "-", "sv_type": "inversion"}
+        sv = ca.StructuralVariationRecord(**sv_attrs)
+        swapped = ca.StructuralVariationRecord(
+            chrom1="1", pos1=100, strand1="-", chrom2="1", pos2=100, strand2="+",
+            sv_type="inversion")
+        self.assertEqual(sv.get_key(), swapped.get_key())
+        self.assertEqual(sv.get_key(), ("sv", "1", 100, "+", "1", 100, "-", "inversion"))
+        # Missing strands are ordered before known ones
+        sv_attrs["strand1"] = None
+        self.assertEqual(ca.StructuralVariationRecord(**sv_attrs).get_key()[1:7],
+                         ("1", 100, "", "1", 100, "-"))
+
+    def test_to_model(self):
+        """Test conversion into models"""
+        indel = ca.IndelRecord(chrom="1", pos=10, ref_allele="A", alt_allele="AT",
+                               status="somatic")
+        model = indel.to_model()
+        self.assertIsInstance(model, ca.Indel)
+        self.assertEqual(model.get_key(), indel.get_key())
+        self.assertEqual(model.status, "somatic")
+        self.assertIsInstance(ca.GeneFeature(gene_ensembl_id="G1").to_model(), ca.Gene)
+
+
+class TestLazyImport(unittest.TestCase):
+    """Test that file-only workloads don't import SQLAlchemy
+    """
+
+    SCRIPT = ("import sys, cancer_api; "
+              "print len(list(cancer_api.VcfFile.open(sys.argv[1]))), "
+              "'sqlalchemy' in sys.modules; "
+              "cancer_api.Session; "
+              "print 'sqlalchemy' in sys.modules")
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmp_dir, "a.vcf")
+        with open(self.filepath, "w") as outfile:
+            outfile.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+                          "1\t100\t.\tA\tG\t50\tPASS\tDP=10\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_script(self, script, *args):
+        """Return the output of a script run in a new interpreter."""
+        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return subprocess.check_output([sys.executable, "-c", script] + list(args),
+                                       cwd=root_dir, stderr=subprocess.STDOUT)
+
+    def test_lazy_import(self):
+        """Test that SQLAlchemy is only imported on first use"""
+        output = self.run_script(self.SCRIPT, self.filepath)
+        self.assertEqual(output.split(), ["1", "False", "True"])
+
+    def test_probe_names(self):
+        """Test that probing for other names doesn't import SQLAlchemy"""
+        output = self.run_script("import sys, cancer_api; "
+                                 "print hasattr(cancer_api, 'VcfFlie'), "
+                                 "'sqlalchemy' in sys.modules")
+        self.assertEqual(output.split(), ["False", "False"])
+
+    def test_star_import(self):
+        """Test that star imports include the database layer"""
+        output = self.run_script("from cancer_api import *; "
+                                 "print Session.__name__, Gene.__name__, VcfFile.__name__, "
+                                 "mutations.__name__, 'sys' in dir(), 'LazyPackage' in dir()")
+        self.assertEqual(output.split(), ["Session", "Gene", "VcfFile", "cancer_api.mutations",
+                                          "False", "False"])
+
+    def test_submodules(self):
+        """Test that submodules of the database layer are package attributes"""
+        output = self.run_script("import cancer_api; "
+                                 "print cancer_api.mutations.__name__, "
+                                 "cancer_api.annotations.Gene is cancer_api.Gene")
+        self.assertEqual(output.split(), ["cancer_api.mutations", "True"])
+
+    def test_failed_import(self):
+        """Test that failures to import the database layer are raised again"""
+        output = self.run_script("import sys, cancer_api; "
+                                 "sys.modules['sqlalchemy'] = None\n"
+                                 "for attempt in range(2):\n"
+                                 "    try: cancer_api.Session\n"
+                                 "    except Exception as e: print type(e).__name__")
+        self.assertEqual(output.split(), ["ImportError", "ImportError"])
+
+    def test_orm_names(self):
+        """Test that every public class and function of the database layer is exported"""
+        ca.load_orm()
+        for module_name, names in ca._ORM_MODULES[1:]:
+            module = sys.modules["cancer_api." + module_name]
+            defined = [name for name, value in vars(module).items()
+                       if not name.startswith("_") and
+                       getattr(value, "__module__", None) == module.__name__]
+            self.assertEqual(sorted(defined), sorted(names))
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+import cancer_api as ca
+
+
+VCF_COLUMNS = "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+DELLY_HEADER = ("##fileformat=VCFv4.1\n"
+                "##INFO=<ID=CHR2,Number=1,Type=String,Description=\"Chromosome\">\n"
+                "##INFO=<ID=CT,Number=1,Type=String,Description=\"Connection type\">\n")
+
+
+class TestParserRegistry(unittest.TestCase):
+    """Test detecting file types and parsers
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def write_file(self, filename, content):
+        filepath = os.path.join(self.tmp_dir, filename)
+        with ca.utils.open_file(filepath, "w") as outfile:
+            outfile.write(content)
+        return filepath
+
+    def test_sniff(self):
+        """Test detection from extensions and headers"""
+        expected = [
+            ("strelka.vcf.gz", "##fileformat=VCFv4.1\n##source=strelka\n",
+             ca.VcfFile, ca.StrelkaVcfParser),
+            ("indels.vcf", "##INFO=<ID=QSI,Number=1,Type=Integer>\n",
+             ca.VcfFile, ca.StrelkaVcfParser),
+            ("delly.vcf", DELLY_HEADER, ca.VcfFile, ca.DellyVcfParser),
+            ("pavfinder.vcf", "##source=PAVFinder_v0.3\n", ca.VcfFile, ca.PavfinderVcfParser),
+            ("other.vcf", "##source=other\n##INFO=<ID=CT,Number=1>\n", ca.VcfFile,
+             ca.VcfParser),
+            ("sample.fusions.txt", "", ca.FacteraFile, ca.FacteraParser),
+            ("genes.gff3", "", ca.Gff3File, ca.Gff3Parser)]
+        for filename, header, file_cls, parser_cls in expected:
+            filepath = self.write_file(filename, header + VCF_COLUMNS)
+            self.assertEqual(ca.sniff(filepath), (file_cls, parser_cls))
+        with self.assertRaises(ca.CancerApiException):
+            ca.sniff(self.write_file("unknown.xyz", ""))
+
+    def test_detect(self):
+        """Test detecting the parser of a given file type along with the header"""
+        header = DELLY_HEADER + VCF_COLUMNS
+        filepath = self.write_file("delly.txt", header)
+        self.assertEqual(ca.default_registry.detect(filepath, ca.VcfFile),
+                         (ca.VcfFile, ca.DellyVcfParser, header))
+        self.assertEqual(ca.default_registry.detect(filepath, ca.VcfFile, ca.VcfParser)[1],
+                         ca.VcfParser)
+
+    def test_open_auto(self):
+        """Test opening files with the detected parser"""
+        filepath = self.write_file("delly.vcf", DELLY_HEADER + VCF_COLUMNS + "\t".join([
+            "1", "100", ".", "N", "<DEL>", ".", "PASS",
+            "SVTYPE=DEL;CHR2=1;END=500;CT=3to5"]) + "\n")
+        delly_file = ca.open_auto(filepath, filters=[ca.PassFilter()])
+        self.assertIsInstance(delly_file.parser, ca.DellyVcfParser)
+        sv, = list(delly_file)
+        self.assertEqual((sv.sv_type, sv.pos2), ("deletion", 500))
+        self.assertEqual(delly_file.col_names[0], "CHROM")